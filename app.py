@@ -1,15 +1,43 @@
 import os
+import io
 import json
-import math
 import textwrap
+import time
+from concurrent.futures import wait
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 import streamlit as st
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.engine import Engine
 
+from utils.cache import cached, get_disk_cache, get_result_cache
+from utils.db import (
+    arrow_to_pandas,
+    connect_kwargs_from_url,
+    copy_query_arrow,
+    copy_query_df,
+    iter_connection_chunks,
+    prepared_query_arrow,
+    prepared_query_df,
+    prepared_statement_stats,
+    table_watermark,
+)
+from utils.eda import reservoir_sample_chunked
+from utils.executor import get_executor, get_interactive_executor, wait_interruptibly
+from utils.fulltext import MAX_RANKED_MATCHES, build_tsquery, fulltext_index_ddl, has_fulltext_index, highlight_html, match_sql, search_page_sql
+from utils.governor import ConcurrencyLimitExceeded, get_governor
+from utils.indexes import advise
+from utils.inflight import get_inflight, query_scope
+from utils.mirror import get_mirror, mirror_available
+from utils.profile import fill_sampled, profile_sources, profile_table
+from utils.ngram import MIN_TRIGRAM_TERM, contains_pattern, has_trigram_index, trigram_index_ddl
+from utils.routing import create_routed_engine, get_router
+from utils.sampling import SAMPLING_METHODS, plan_sample
+
 # =============================
 # App Config
 # =============================
@@ -57,45 +85,284 @@ def build_conn_url() -> str:
 
 @st.cache_resource(show_spinner=False)
 def get_engine(conn_url: str) -> Engine:
-    return create_engine(conn_url, pool_pre_ping=True)
+    # The explorer only reads, so connections come from replicas when configured
+    return create_routed_engine(conn_url)
+
 
+def engine_router(engine: Engine):
+    """The replica router behind a routed engine; its ``primary`` pool sees every write in pg_stat_*."""
+    return get_router(connect_kwargs_from_url(engine.url.render_as_string(hide_password=False)))
 
-@st.cache_data(show_spinner=False)
+
+@cached()
 def get_now(engine: Engine) -> datetime:
     with engine.begin() as conn:
         return conn.execute(text("SELECT NOW()")) .scalar_one()
 
 
-@st.cache_data(show_spinner=False)
-def fetch_dataframe(engine: Engine, sql: str, params: Optional[dict] = None, limit_preview: Optional[int] = None) -> pd.DataFrame:
-    with engine.begin() as conn:
-        df = pd.read_sql(text(sql), conn, params=params)
+@cached()
+def fetch_dataframe(engine: Engine, sql: str, params: Optional[dict] = None, limit_preview: Optional[int] = None, method: str = "read_sql") -> pd.DataFrame:
+    if method == "arrow":
+        df = arrow_to_pandas(fetch_arrow(engine, sql, params))
+    elif method == "copy":
+        # COPY ... TO STDOUT bulk path; binds are inlined client-side
+        raw = engine.raw_connection()
+        try:
+            df = copy_query_df(raw, str(text(sql).compile(dialect=engine.dialect)), params)
+        finally:
+            raw.close()
+    else:
+        with engine.begin() as conn:
+            df = pd.read_sql(text(sql), conn, params=params)
     if limit_preview is not None and len(df) > limit_preview:
         return df.head(limit_preview).copy()
     return df
 
 
-@st.cache_data(show_spinner=False)
+@cached()
+def fetch_arrow(engine: Engine, sql: str, params: Optional[dict] = None) -> pa.Table:
+    """Typed Arrow result via COPY; render with st.dataframe, convert with arrow_to_pandas."""
+    bound_sql = str(text(sql).compile(dialect=engine.dialect))
+    # Served from the on-disk Parquet cache while the tables are unchanged. Read on the
+    # primary: its change counters only describe its own data, not a lagging replica's
+    with engine_router(engine).primary.connection() as conn:
+        return get_disk_cache().fetch(conn, bound_sql, lambda: copy_query_arrow(conn, bound_sql, params), params)
+
+
+@cached()
+def fetch_prepared(engine: Engine, sql: str, params: Optional[dict] = None, arrow: bool = True):
+    """Hot parameterized query as a server-side prepared statement (parsed once per pooled connection)."""
+    bound_sql = str(text(sql).compile(dialect=engine.dialect))
+    raw = engine.raw_connection()
+    try:
+        if arrow:
+            return prepared_query_arrow(raw, bound_sql, params)
+        return prepared_query_df(raw, bound_sql, params)
+    finally:
+        raw.close()
+
+
+@cached()
+def fetch_reservoir_sample(engine: Engine, sql: str, n: int, seed: int) -> pd.DataFrame:
+    """Uniform n-row sample of a query, streamed through a server-side cursor in one pass."""
+    raw = engine.raw_connection()
+    try:
+        return reservoir_sample_chunked(iter_connection_chunks(raw, sql), n, seed)
+    finally:
+        raw.close()
+
+
+@cached()
 def get_columns(engine: Engine, table: str, schema: str = DEFAULT_SCHEMA) -> pd.DataFrame:
-    sql = text(
-        """
+    sql = """
         SELECT column_name, data_type, is_nullable, column_default
         FROM information_schema.columns
         WHERE table_schema = :schema AND table_name = :table
         ORDER BY ordinal_position
         """
-    )
-    with engine.begin() as conn:
-        return pd.read_sql(sql, conn, params={"schema": schema, "table": table})
+    return fetch_prepared(engine, sql, {"schema": schema, "table": table}, arrow=False)
 
 
-@st.cache_data(show_spinner=False)
+@cached()
 def get_rowcount(engine: Engine, table: str, schema: str = DEFAULT_SCHEMA) -> int:
+    """Exact COUNT(*) – a full scan; prefer get_rowcount_estimate for display."""
     sql = text(f'SELECT COUNT(*) FROM "{schema}"."{table}"')
     with engine.begin() as conn:
         return int(conn.execute(sql).scalar_one())
 
 
+@cached(ttl=60)
+def get_rowcount_estimate(engine: Engine, table: str, schema: str = DEFAULT_SCHEMA) -> Optional[int]:
+    """Planner/statistics row estimate: n_live_tup, else pg_class.reltuples. None if never analyzed."""
+    sql = text(
+        """
+        SELECT s.n_live_tup, c.reltuples
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE n.nspname = :schema AND c.relname = :table
+        """
+    )
+    with engine.begin() as conn:
+        row = conn.execute(sql, {"schema": schema, "table": table}).first()
+    if row is None:
+        return None
+    live, reltuples = row
+    if live:
+        return int(live)
+    if reltuples is not None and reltuples >= 0:
+        return int(reltuples)
+    return None
+
+
+def request_exact_rowcount(engine: Engine, table: str, schema: str = DEFAULT_SCHEMA) -> None:
+    """Start an exact count in the background; the result lands in get_rowcount's cache."""
+    jobs = st.session_state.setdefault("_exact_rowcount_jobs", {})
+    job = jobs.get((schema, table))
+    if job is None or (job.done() and job.exception() is not None):
+        jobs[(schema, table)] = get_executor().submit(get_rowcount, engine, table, schema)
+
+
+def exact_rowcount_job(table: str, schema: str = DEFAULT_SCHEMA):
+    """The session's exact-count job for a table, if any. Call from the script thread: it reports failures."""
+    jobs = st.session_state.get("_exact_rowcount_jobs", {})
+    job = jobs.get((schema, table))
+    if job is not None and job.done() and job.exception() is not None:
+        # Drop the failed job so the exact-count button can start a new one
+        jobs.pop((schema, table), None)
+        st.error(f"Exact row count for {schema}.{table} failed: {job.exception()}")
+        return None
+    return job
+
+
+def rowcount_status(engine: Engine, table: str, schema: str = DEFAULT_SCHEMA, job=None):
+    """Return (count, is_exact, is_counting) for display; ``job`` is from exact_rowcount_job.
+
+    Touches neither session state nor the page, so it can run on a worker thread.
+    """
+    if job is not None and job.done() and job.exception() is None:
+        return job.result(), True, False
+    return get_rowcount_estimate(engine, table, schema), False, job is not None and not job.done()
+
+
+def format_rowcount(count: Optional[int], exact: bool) -> str:
+    if count is None:
+        return "unknown"
+    return f"{count:,}" if exact else f"~{count:,}"
+
+
+@cached(ttl=60)
+def estimate_query_rows(engine: Engine, sql: str, params: Optional[dict] = None) -> Optional[int]:
+    """Planner row estimate for a query via EXPLAIN (no execution)."""
+    with engine.begin() as conn:
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params or {}).scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    try:
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except (IndexError, KeyError, TypeError):
+        return None
+
+
+@cached()
+def count_query_rows(engine: Engine, sql: str, params: Optional[dict] = None) -> int:
+    """Exact COUNT(*) over a query; cached per SQL + parameters."""
+    counted = fetch_prepared(engine, f"SELECT COUNT(*) AS n FROM ({sql}) AS _q", params, arrow=False)
+    return int(counted["n"].iloc[0])
+
+
+@cached(ttl=60)
+def get_table_watermark(engine: Engine, table: str, schema: str = DEFAULT_SCHEMA) -> Optional[str]:
+    """Change marker of a table, read on the primary (a standby's pg_stat_user_tables does not count writes)."""
+    with engine_router(engine).primary.connection() as conn:
+        return table_watermark(conn, ((schema, table),))
+
+
+@cached(ttl=3600)
+def get_column_profile(engine: Engine, table: str, schema: str, watermark: Optional[str], exact_distinct: bool = False) -> pd.DataFrame:
+    """Full-table column profile in one SQL scan; cached per table and change watermark."""
+    cols = get_columns(engine, table, schema)
+    raw = engine.raw_connection()
+    try:
+        return profile_table(raw, schema, table, list(zip(cols["column_name"], cols["data_type"])), exact_distinct)
+    finally:
+        raw.close()
+
+
+def request_column_profile(engine: Engine, table: str, schema: str, watermark: Optional[str], exact_distinct: bool) -> None:
+    """Start a full-table profile in the background; the newest request per table replaces older ones."""
+    jobs = st.session_state.setdefault("_column_profile_jobs", {})
+    jobs[(schema, table, exact_distinct)] = (
+        watermark, get_executor().submit(get_column_profile, engine, table, schema, watermark, exact_distinct)
+    )
+
+
+# Placeholders to refresh once their background query finishes (see end of script)
+_deferred_updates: List[tuple] = []
+DEFERRED_WAIT_SECONDS = 30
+
+
+MESSAGE_COLUMNS = "id, session_id, message_type, content, timestamp, message_metadata"
+
+
+def fetch_message_page(engine: Engine, schema: str, where_sql: str, params: dict, page_size: int, anchor: dict):
+    """Keyset page of chat_messages ordered by (timestamp, id) DESC.
+
+    ``anchor`` is {"mode": "first"}, {"mode": "older"|"newer", "ts", "id"} or
+    {"mode": "date", "ts"}. Each page seeks straight to its position on the
+    (timestamp, id) order, so cost does not grow with depth the way OFFSET does.
+    Returns (table, has_more_in_direction).
+    """
+    mode = anchor.get("mode", "first")
+    conds = [where_sql]
+    page_params = dict(params)
+    order = "DESC"
+    if mode == "older":
+        conds.append("(timestamp, id) < (:k_ts, :k_id)")
+        page_params.update({"k_ts": anchor["ts"], "k_id": anchor["id"]})
+    elif mode == "newer":
+        conds.append("(timestamp, id) > (:k_ts, :k_id)")
+        page_params.update({"k_ts": anchor["ts"], "k_id": anchor["id"]})
+        order = "ASC"
+    elif mode == "date":
+        conds.append("timestamp < :k_ts")
+        page_params["k_ts"] = anchor["ts"]
+    page_params["limit"] = int(page_size) + 1
+
+    sql = f"""
+        SELECT {MESSAGE_COLUMNS}
+        FROM "{schema}"."chat_messages"
+        WHERE {" AND ".join(conds)}
+        ORDER BY timestamp {order}, id {order}
+        LIMIT :limit
+        """
+    tbl = fetch_prepared(engine, sql, page_params)
+    has_more = tbl.num_rows > page_size
+    tbl = tbl.slice(0, page_size)
+    if order == "ASC":
+        tbl = tbl.take(list(range(tbl.num_rows - 1, -1, -1)))
+    return tbl, has_more
+
+
+def fetch_search_page(engine: Engine, schema: str, where_sql: str, params: dict, page_size: int, anchor: dict):
+    """Full-text matches ranked by relevance, keyset-paged on (rank, id) DESC.
+
+    See utils.fulltext.search_page_sql for ``where_sql``/``anchor``; returns
+    (table, has_more_in_direction) like fetch_message_page.
+    """
+    sql, page_params, order = search_page_sql(schema, where_sql, params, page_size, anchor)
+    tbl = fetch_prepared(engine, sql, page_params)
+    has_more = tbl.num_rows > page_size
+    tbl = tbl.slice(0, page_size)
+    if order == "ASC":
+        tbl = tbl.take(list(range(tbl.num_rows - 1, -1, -1)))
+    return tbl, has_more
+
+
+@cached(ttl=300)
+def fulltext_index_ready(engine: Engine, schema: str) -> bool:
+    raw = engine.raw_connection()
+    try:
+        return has_fulltext_index(raw, schema)
+    finally:
+        raw.close()
+
+
+@cached(ttl=300)
+def trigram_index_ready(engine: Engine, schema: str, table: str, column: str) -> bool:
+    raw = engine.raw_connection()
+    try:
+        return has_trigram_index(raw, schema, table, column)
+    finally:
+        raw.close()
+
+
+def _keyset_edge(tbl: pa.Table, index: int, key: str = "timestamp") -> dict:
+    if key == "rank":
+        return {"rank": tbl.column("rank")[index].as_py(), "id": tbl.column("id")[index].as_py()}
+    return {"ts": tbl.column("timestamp")[index].as_py(), "id": tbl.column("id")[index].as_py()}
+
+
 def _maybe_json_normalize(series: pd.Series) -> pd.DataFrame:
     """Quick glance of JSON/JSONB column keys frequency (top-level only)."""
     keys_freq: Dict[str, int] = {}
@@ -116,24 +383,37 @@ def _maybe_json_normalize(series: pd.Series) -> pd.DataFrame:
     return df
 
 
-def table_eda(engine: Engine, table: str, schema: str = DEFAULT_SCHEMA, sample_n: int = 5000):
+def table_eda(engine: Engine, table: str, schema: str = DEFAULT_SCHEMA, sample_n: int = 5000,
+              sample_method: str = "system", seed: int = 0):
     st.subheader(f"📊 {table}")
     cols_df = get_columns(engine, table, schema)
-    rowcount = get_rowcount(engine, table, schema)
+    rowcount, exact, counting = rowcount_status(engine, table, schema, exact_rowcount_job(table, schema))
 
     c1, c2, c3 = st.columns([1, 1, 1])
-    c1.metric("Rows", f"{rowcount:,}")
+    c1.metric("Rows" if exact else "Rows (approx.)", format_rowcount(rowcount, exact))
     c2.metric("Columns", f"{len(cols_df):,}")
+    if counting:
+        c3.caption("Exact count running in the background…")
+    elif not exact and c3.button("Count exactly", key=f"exact_{schema}_{table}"):
+        request_exact_rowcount(engine, table, schema)
+        st.rerun()
 
     with st.expander("Schema (information_schema)", expanded=False):
         st.dataframe(cols_df, use_container_width=True, hide_index=True)
 
-    # Sampling strategy for EDA
-    limit = min(sample_n, max(1, rowcount))
+    # Sampling strategy for EDA: cost follows the sample size, not the table (see utils.sampling)
+    method, sql, described = plan_sample(schema, table, sample_method, sample_n, rowcount, seed, exact)
     with st.spinner("Loading sample for EDA..."):
-        df = fetch_dataframe(engine, f'SELECT * FROM "{schema}"."{table}" ORDER BY 1 DESC LIMIT {limit}')
+        try:
+            if method == "reservoir":
+                df = fetch_reservoir_sample(engine, sql, sample_n, seed)
+            else:
+                df = fetch_dataframe(engine, sql)
+        except Exception as e:
+            st.error(f"Sampling {table} failed: {e}")
+            return
 
-    st.caption(f"Sampled {len(df):,} rows out of {rowcount:,} for quick EDA.")
+    st.caption(f"Sampled {len(df):,} rows out of {format_rowcount(rowcount, exact)} using {described} for quick EDA.")
 
     if len(df) == 0:
         st.info("No data in table.")
@@ -144,14 +424,36 @@ def table_eda(engine: Engine, table: str, schema: str = DEFAULT_SCHEMA, sample_n
         st.dataframe(df, use_container_width=True)
 
     with st.expander("Data types & null counts", expanded=False):
-        info_df = pd.DataFrame({
-            "column": df.columns,
-            "dtype": [str(t) for t in df.dtypes.values],
-            "nulls": [int(df[c].isna().sum()) for c in df.columns],
-            "null_rate": [float(df[c].isna().mean()) for c in df.columns],
-            "unique": [int(df[c].nunique(dropna=True)) for c in df.columns],
-        })
-        st.dataframe(info_df.sort_values(["null_rate", "column"], ascending=[False, True]), use_container_width=True)
+        p1, p2 = st.columns([1, 2])
+        exact_distinct = p2.checkbox("Exact distinct counts (sorts every column)", key=f"exact_distinct_{schema}_{table}")
+        watermark = get_table_watermark(engine, table, schema)
+        profiled_at, job = st.session_state.get("_column_profile_jobs", {}).get((schema, table, exact_distinct), (None, None))
+        running = job is not None and not job.done()
+        if running:
+            p1.caption("Full-table profile running in the background…")
+        elif p1.button("Re-profile" if job is not None else "Profile full table in SQL", key=f"profile_{schema}_{table}"):
+            request_column_profile(engine, table, schema, watermark, exact_distinct)
+            st.rerun()
+
+        if job is not None and job.done() and job.exception() is None:
+            profile = fill_sampled(job.result(), df)
+            st.caption(profile_sources(profile))
+            if watermark is None or profiled_at != watermark:
+                st.caption("The table may have changed since this profile was taken; re-profile for current figures.")
+            st.dataframe(profile.sort_values(["null_rate", "column"], ascending=[False, True]),
+                         use_container_width=True, hide_index=True)
+        else:
+            if job is not None and job.done():
+                st.error(f"Column profile failed: {job.exception()}")
+            st.caption(f"Sampled: every statistic below comes from the {len(df):,} EDA rows only.")
+            info_df = pd.DataFrame({
+                "column": df.columns,
+                "dtype": [str(t) for t in df.dtypes.values],
+                "nulls": [int(df[c].isna().sum()) for c in df.columns],
+                "null_rate": [float(df[c].isna().mean()) for c in df.columns],
+                "unique": [int(df[c].nunique(dropna=True)) for c in df.columns],
+            })
+            st.dataframe(info_df.sort_values(["null_rate", "column"], ascending=[False, True]), use_container_width=True)
 
     # Numeric description
     numeric_cols = df.select_dtypes(include=["number", "datetime64[ns]"]).columns.tolist()
@@ -211,6 +513,24 @@ with st.sidebar:
     if st.button("Connect", type="primary"):
         st.session_state["_conn_url"] = build_conn_url()
 
+    with st.expander("Result cache", expanded=False):
+        st.json(get_result_cache().stats())
+        st.caption("On-disk (Parquet)")
+        st.json(get_disk_cache().stats())
+        if st.button("Clear result cache"):
+            get_result_cache().clear()
+            get_disk_cache().clear()
+
+    with st.expander("Connection pool", expanded=False):
+        try:
+            st.json(get_router(connect_kwargs_from_url(st.session_state.get("_conn_url") or build_conn_url())).stats())
+        except Exception as e:
+            st.caption(f"Pool unavailable: {e}")
+        st.caption("Superseded-query cancellation")
+        st.json(get_inflight().stats())
+        st.caption("Prepared statements")
+        st.json(prepared_statement_stats())
+
 # If no connection yet, try from env
 conn_url = st.session_state.get("_conn_url") or build_conn_url()
 
@@ -248,13 +568,25 @@ tab_overview, tab_tables, tab_messages, tab_sql, tab_exports = st.tabs([
 # -----------------------------
 with tab_overview:
     st.subheader("Database Overview")
+    b1, b2 = st.columns([1, 3])
+    if b1.button("Count rows exactly"):
+        for t in KNOWN_TABLES:
+            request_exact_rowcount(engine, t, schema)
+    b2.caption("Counts prefixed with ~ are statistics-based estimates. Exact counts run in the background; rerun to pick them up.")
+
     cols = st.columns(4)
-    for i, t in enumerate(KNOWN_TABLES):
-        try:
-            rc = get_rowcount(engine, t, schema)
-            cols[i % 4].metric(t, f"{rc:,} rows")
-        except Exception as e:
-            cols[i % 4].metric(t, "—")
+    slots = {t: cols[i % 4].empty() for i, t in enumerate(KNOWN_TABLES)}
+    for t, slot in slots.items():
+        slot.metric(t, "…")
+    # Lookups run concurrently; each metric fills in as its query finishes
+    # Jobs are looked up (and failures reported) here; the workers only return the status
+    tasks = {t: (rowcount_status, engine, t, schema, exact_rowcount_job(t, schema)) for t in KNOWN_TABLES}
+    for t, status, err in get_executor().as_completed(tasks):
+        if err is not None:
+            slots[t].metric(t, "—")
+            continue
+        rc, exact, counting = status
+        slots[t].metric(t, f"{format_rowcount(rc, exact)} rows", "counting…" if counting else None, delta_color="off")
 
     st.markdown("---")
     st.markdown("### Quick Links")
@@ -262,6 +594,40 @@ with tab_overview:
     st.markdown("• Go to **Messages Viewer** to browse all messages with filters, full‑text search, and pagination.")
     st.markdown("• Use **SQL Runner** for ad‑hoc queries.")
 
+    st.markdown("---")
+    st.markdown("### Index Advisor")
+    st.caption(
+        "Checks the indexes behind the Messages Viewer and dashboard filters against pg_indexes and "
+        "pg_stat_user_tables on the primary (where indexes are created and the chatbot's own scans are counted)."
+    )
+    if st.button("Check indexes"):
+        try:
+            with get_router(connect_kwargs_from_url(conn_url)).primary.connection() as conn:
+                st.session_state["_index_report"] = advise(conn, schema)
+        except Exception as e:
+            st.error(f"Index advisor failed: {e}")
+    report = st.session_state.get("_index_report")
+    if report is not None and report.schema == schema:
+        recs = report.recommendations
+        missing = report.missing()
+        i1, i2, i3 = st.columns(3)
+        i1.metric("Predicates checked", len(recs))
+        i2.metric("Missing or partial", len(missing))
+        i3.metric("Never-scanned indexes", len(report.unused))
+        st.dataframe(recs, use_container_width=True, hide_index=True)
+        if not report.unused.empty:
+            st.markdown("**Indexes with no scans since statistics were reset**")
+            st.dataframe(report.unused, use_container_width=True, hide_index=True)
+        migration = report.migration_sql()
+        with st.expander("Migration SQL", expanded=not missing.empty):
+            st.code(migration, language="sql")
+        st.download_button(
+            "Download migration",
+            data=migration,
+            file_name=f"index_migration_{datetime.now().strftime('%Y%m%d_%H%M')}.sql",
+            mime="text/sql",
+        )
+
 
 # -----------------------------
 # Table EDA
@@ -274,11 +640,21 @@ with tab_tables:
         options=KNOWN_TABLES,
         default=KNOWN_TABLES,
     )
-    sample_n = st.slider("Rows per table to sample for EDA", 500, 50000, 5000, step=500)
+    s1, s2, s3 = st.columns([2, 2, 1])
+    sample_n = s1.slider("Rows per table to sample for EDA", 500, 50000, 5000, step=500)
+    sample_method = s2.selectbox(
+        "Sampling method",
+        list(SAMPLING_METHODS),
+        format_func=SAMPLING_METHODS.get,
+        help="TABLESAMPLE reads only a fraction of each table; reservoir sampling streams it once; "
+             "'most recent' sorts the whole table on its first column.",
+    )
+    seed = int(s3.number_input("Seed", min_value=0, max_value=2_147_483_647, value=0, step=1,
+                               help="Same seed, same sample; change it to draw another"))
 
     for t in target_tables:
         with st.container(border=True):
-            table_eda(engine, t, schema=schema, sample_n=sample_n)
+            table_eda(engine, t, schema=schema, sample_n=sample_n, sample_method=sample_method, seed=seed)
 
 
 # -----------------------------
@@ -295,21 +671,45 @@ with tab_messages:
         date_from = c3.date_input("From (date)", value=None)
         c4, c5, c6 = st.columns([1, 1, 2])
         date_to = c4.date_input("To (date)", value=None)
-        search = c5.text_input("Full‑text search in content (ILIKE)")
+        search = c5.text_input(
+            "Search in content",
+            help='Full-text: words are ANDed, "exact phrase", prefix*, -exclude, a OR b. Substring: plain ILIKE match.',
+        )
         page_size = c6.select_slider("Page size", options=[25, 50, 100, 200, 500], value=100)
+        search_mode = st.radio(
+            "Search mode",
+            ["Full-text (ranked)", "Substring (ILIKE)"],
+            horizontal=True,
+            help="Full-text search uses the GIN index on to_tsvector(content); substring search scans every message.",
+        )
 
     where = ["1=1"]
     params: Dict[str, object] = {}
 
     if session_id:
+        # Served by a pg_trgm GIN index on session_id once the term has 3+ characters
         where.append("session_id ILIKE :sid")
-        params["sid"] = f"%{session_id}%"
+        params["sid"] = contains_pattern(session_id)
+        if len(session_id) < MIN_TRIGRAM_TERM:
+            st.caption(f"Session ID searches shorter than {MIN_TRIGRAM_TERM} characters cannot use the trigram index.")
+        elif not trigram_index_ready(engine, schema, "chat_messages", "session_id"):
+            st.caption("No trigram index on session_id yet; partial-ID searches scan the table until this is applied:")
+            st.code(trigram_index_ddl(schema, "chat_messages", "session_id"), language="sql")
     if msg_type and msg_type != "(any)":
         where.append("message_type = :mtype")
         params["mtype"] = msg_type
-    if search:
+    ranked = False
+    if search and search_mode.startswith("Full-text"):
+        tsq = build_tsquery(search)
+        if tsq:
+            where.append(match_sql())
+            params["tsq"] = tsq
+            ranked = True
+        else:
+            st.warning("Nothing searchable in the full-text query; use substring mode for punctuation.")
+    elif search:
         where.append("content ILIKE :q")
-        params["q"] = f"%{search}%"
+        params["q"] = contains_pattern(search)
     if date_from:
         where.append("timestamp >= :dfrom")
         params["dfrom"] = datetime.combine(date_from, datetime.min.time())
@@ -319,40 +719,94 @@ with tab_messages:
 
     where_sql = " AND ".join(where)
 
-    # Count query
-    count_sql = f'SELECT COUNT(*) FROM "{schema}"."chat_messages" WHERE {where_sql}'
+    # Counts: planner estimate now, exact COUNT(*) in the background
+    count_base_sql = f'SELECT 1 FROM "{schema}"."chat_messages" WHERE {where_sql}'
     try:
-        total = fetch_dataframe(engine, count_sql, params).iloc[0, 0]
-    except Exception as e:
-        st.error("Failed to count messages. Check connection and permissions.")
-        st.exception(e)
-        total = 0
-
-    # Pagination
-    total_pages = max(1, math.ceil(total / page_size))
-    page = st.number_input("Page", min_value=1, max_value=max(1, total_pages), value=1)
-    offset = (page - 1) * page_size
-
-    # Data query
-    data_sql = text(
-        f"""
-        SELECT id, session_id, message_type, content, timestamp, message_metadata
-        FROM "{schema}"."chat_messages"
-        WHERE {where_sql}
-        ORDER BY timestamp DESC
-        LIMIT :limit OFFSET :offset
-        """
-    )
-    params_page = dict(params)
-    params_page.update({"limit": int(page_size), "offset": int(offset)})
+        total_estimate = estimate_query_rows(engine, count_base_sql, params)
+    except Exception:
+        total_estimate = None
+    count_key = (schema, where_sql, tuple(sorted((k, str(v)) for k, v in params.items())))
+    # Entering a scope with new filters cancels the count still running for the old ones
+    with query_scope("message_count", count_key):
+        count_job = st.session_state.get("_msg_count_jobs", {}).get(count_key)
+        if count_job is None or (count_job.done() and count_job.exception() is not None):
+            count_job = get_executor().submit(count_query_rows, engine, count_base_sql, params)
+    # Only the current filters' job is kept; finished counts for earlier filters
+    # stay in count_query_rows' cache
+    st.session_state["_msg_count_jobs"] = {count_key: count_job}
+
+    # Keyset pagination state; any filter change starts again from the newest page
+    filter_key = (session_id, msg_type, date_from, date_to, search, search_mode, page_size, schema)
+    if st.session_state.get("_msg_filter_key") != filter_key:
+        st.session_state["_msg_filter_key"] = filter_key
+        st.session_state["_msg_anchor"] = {"mode": "first"}
+        st.session_state["_msg_page_no"] = 1
+    anchor = st.session_state["_msg_anchor"]
 
     try:
-        df_msg = fetch_dataframe(engine, str(data_sql), params_page)
-        st.caption(f"Showing {len(df_msg):,} of {total:,} messages | page {page:,} / {total_pages:,}")
-        st.dataframe(df_msg, use_container_width=True)
+        with query_scope("message_page", (filter_key, tuple(sorted(anchor.items())))):
+            fetch_page = fetch_search_page if ranked else fetch_message_page
+            page_job = get_interactive_executor().submit(fetch_page, engine, schema, where_sql, params, page_size, anchor)
+        tbl_msg, has_more = wait_interruptibly(page_job, st.empty(), "Loading messages…")
     except Exception as e:
         st.error("Failed to fetch messages.")
         st.exception(e)
+        tbl_msg, has_more = None, False
+
+    if tbl_msg is not None:
+        # "older" pages know whether more follow; "newer" pages whether more precede
+        has_newer = anchor["mode"] in ("older", "date") or (anchor["mode"] == "newer" and has_more)
+        has_older = (anchor["mode"] != "newer" and has_more) or anchor["mode"] == "newer"
+        page_no = st.session_state["_msg_page_no"]
+        count_slot = st.empty()
+
+        def _count_caption(job=count_job, shown=tbl_msg.num_rows, page_no=page_no):
+            if job.done() and job.exception() is None:
+                return f"Showing {shown:,} of {job.result():,} messages | page {page_no:,}"
+            if job.done():
+                return f"Showing {shown:,} of {format_rowcount(total_estimate, False)} messages (estimate; exact count failed) | page {page_no:,}"
+            return f"Showing {shown:,} of {format_rowcount(total_estimate, False)} messages (estimate; counting…) | page {page_no:,}"
+
+        count_slot.caption(_count_caption())
+        if not count_job.done():
+            _deferred_updates.append((count_job, count_slot, _count_caption))
+        if ranked:
+            if not fulltext_index_ready(engine, schema):
+                st.caption("No full-text index yet; searches scan the table until this is applied:")
+                st.code(fulltext_index_ddl(schema), language="sql")
+            st.caption(f"Ranked by relevance among the newest {MAX_RANKED_MATCHES:,} matches.")
+            st.dataframe(tbl_msg.drop_columns(["snippet"]), use_container_width=True)
+            for row in tbl_msg.to_pylist():
+                st.markdown(
+                    f"**{row['message_type']}** · {row['timestamp']} · `{row['session_id']}` · rank {row['rank']:.3f}<br>"
+                    f"<span class='small-note'>{highlight_html(row['snippet'])}</span>",
+                    unsafe_allow_html=True,
+                )
+        else:
+            st.dataframe(tbl_msg, use_container_width=True)
+        edge_key = "rank" if ranked else "timestamp"
+
+        n1, n2, n3, n4, n5 = st.columns([1, 1, 1, 1, 2])
+        if n1.button("⏮ Best matches" if ranked else "⏮ Newest", disabled=anchor["mode"] == "first"):
+            st.session_state["_msg_anchor"] = {"mode": "first"}
+            st.session_state["_msg_page_no"] = 1
+            st.rerun()
+        if n2.button("◀ Better" if ranked else "◀ Newer", disabled=not has_newer or tbl_msg.num_rows == 0):
+            st.session_state["_msg_anchor"] = {"mode": "newer", **_keyset_edge(tbl_msg, 0, edge_key)}
+            st.session_state["_msg_page_no"] = max(1, page_no - 1)
+            st.rerun()
+        if n3.button("Weaker ▶" if ranked else "Older ▶", disabled=not has_older or tbl_msg.num_rows == 0):
+            st.session_state["_msg_anchor"] = {"mode": "older", **_keyset_edge(tbl_msg, tbl_msg.num_rows - 1, edge_key)}
+            st.session_state["_msg_page_no"] = page_no + 1
+            st.rerun()
+        jump_date = n5.date_input("Jump to date", value=None, key="msg_jump_date", disabled=ranked)
+        if n4.button("Go to date", disabled=jump_date is None or ranked):
+            st.session_state["_msg_anchor"] = {
+                "mode": "date",
+                "ts": datetime.combine(jump_date + timedelta(days=1), datetime.min.time()),
+            }
+            st.session_state["_msg_page_no"] = 1
+            st.rerun()
 
     # Conversation preview by Session ID
     with st.expander("View conversation by Session ID", expanded=False):
@@ -360,7 +814,7 @@ with tab_messages:
         max_messages = st.slider("Max messages to pull", 50, 2000, 200)
         if sid_exact:
             try:
-                convo_df = fetch_dataframe(
+                convo_tbl = fetch_prepared(
                     engine,
                     f"""
                     SELECT message_type, content, timestamp
@@ -371,7 +825,7 @@ with tab_messages:
                     """,
                     params={"s": sid_exact, "lim": int(max_messages)},
                 )
-                for _, row in convo_df.iterrows():
+                for row in convo_tbl.to_pylist():
                     role = row["message_type"].upper()
                     st.markdown(f"**{role}** · {row['timestamp']}")
                     st.markdown(
@@ -404,16 +858,80 @@ with tab_sql:
             """
         ).strip(),
         height=180,
-        help="Only SELECT statements are recommended. Use at your own risk.",
+        help="Postgres queries run one statement at a time in a read-only transaction, with a statement "
+        "timeout and row/size budget. Only a read-only database role rules out writes.",
+    )
+    target = "Postgres"
+    if mirror_available():
+        target = st.radio(
+            "Run against",
+            ["Postgres", "DuckDB mirror"],
+            horizontal=True,
+            help="The mirror is a local columnar copy of the chatbot tables, synced incrementally; use it for heavy aggregations.",
+        )
+    governor = get_governor()
+    st.caption(
+        f"Postgres limits: {governor.statement_timeout:.0f}s timeout, {governor.max_rows:,} rows, "
+        f"{governor.max_bytes / 1024 ** 2:,.0f} MB, {governor.max_per_user} concurrent queries per session. "
+        "The mirror runs single SELECT statements under the same timeout and row limit."
     )
     if st.button("Execute", type="primary"):
         try:
-            df_sql = fetch_dataframe(engine, sql_input)
-            st.dataframe(df_sql, use_container_width=True)
+            if target == "DuckDB mirror":
+                old_job = st.session_state.pop("_sql_job", None)
+                if old_job is not None:
+                    governor.cancel(old_job)
+                mirror = get_mirror(connect_kwargs_from_url(conn_url), schema)
+                # Sync runs on the shared executor; queries see the last completed copy
+                mirror.refresh_in_background(get_router(connect_kwargs_from_url(conn_url)).primary)
+                if not mirror.loaded:
+                    st.info("The mirror is being loaded in the background; run the query again shortly.")
+                else:
+                    started = time.perf_counter()
+                    tbl_sql, truncated = mirror.query_arrow(sql_input, governor.max_rows, governor.statement_timeout)
+                    st.caption(f"{tbl_sql.num_rows:,} rows from the DuckDB mirror in {time.perf_counter() - started:.2f}s")
+                    if truncated:
+                        st.warning(f"Stopped reading at the {truncated}. Add a LIMIT or aggregate to see everything.")
+                    st.dataframe(tbl_sql, use_container_width=True)
+            else:
+                # Governed: read-only, statement_timeout, row/byte budget, cancellable
+                pool = get_router(connect_kwargs_from_url(conn_url)).pick()
+                old_job = st.session_state.pop("_sql_job", None)
+                if old_job is not None:
+                    governor.cancel(old_job)
+                st.session_state["_sql_job"] = governor.submit(pool, sql_input)
+        except ConcurrencyLimitExceeded as e:
+            st.warning(str(e))
         except Exception as e:
             st.error("Query failed.")
             st.exception(e)
 
+    job = st.session_state.get("_sql_job")
+    if job is not None and not job.done():
+        status_slot = st.empty()
+        # Clicking reruns the script, which interrupts the wait loop below
+        if st.button("Cancel query"):
+            governor.cancel(job)
+        while not job.done():
+            status_slot.caption(f"Running… {job.elapsed:.1f}s, {job.rows:,} rows fetched")
+            job.wait(0.5)
+        status_slot.empty()
+    if job is not None and job.done():
+        if job.status == "finished":
+            if job.result is None:
+                st.caption(f"Statement executed in {job.elapsed:.2f}s (no result set)")
+            else:
+                st.caption(f"{job.rows:,} rows in {job.elapsed:.2f}s")
+                if job.truncated:
+                    st.warning(f"Stopped reading at the {job.truncated}. Add a LIMIT or aggregate to see everything.")
+                st.dataframe(job.result, use_container_width=True)
+        elif job.status == "cancelled":
+            st.warning("Query cancelled.")
+        elif job.status == "timed_out":
+            st.error(f"Query exceeded the {governor.statement_timeout:.0f}s statement timeout.")
+        else:
+            st.error(f"Query failed: {job.error}")
+
 
 # -----------------------------
 # Exports
@@ -424,10 +942,12 @@ with tab_exports:
     sample_for_export = st.number_input("Max rows to export", min_value=100, max_value=1_000_000, value=50_000, step=100)
     if st.button("Prepare Download"):
         try:
-            df_exp = fetch_dataframe(engine, f'SELECT * FROM "{schema}"."{pick_table}" LIMIT :n', {"n": int(sample_for_export)})
+            tbl_exp = fetch_arrow(engine, f'SELECT * FROM "{schema}"."{pick_table}" LIMIT :n', {"n": int(sample_for_export)})
+            csv_buf = io.BytesIO()
+            pacsv.write_csv(tbl_exp, csv_buf)
             st.download_button(
                 label=f"Download {pick_table}.csv",
-                data=df_exp.to_csv(index=False).encode("utf-8"),
+                data=csv_buf.getvalue(),
                 file_name=f"{pick_table}.csv",
                 mime="text/csv",
             )
@@ -443,3 +963,13 @@ st.markdown("---")
 st.caption(
     "Built for detailed EDA across all tables in the updated schema. This app retains core explorer components and adds rich filtering, schema introspection, JSON key summaries, and time‑trend views."
 )
+
+
+# Swap in background results (e.g. exact message counts) once they finish.
+# The short waits keep the script interruptible by a newer rerun.
+_deadline = time.monotonic() + DEFERRED_WAIT_SECONDS
+for _job, _slot, _render in _deferred_updates:
+    while not _job.done() and time.monotonic() < _deadline:
+        wait([_job], timeout=0.5)
+        _slot.caption(_render())
+    _slot.caption(_render())
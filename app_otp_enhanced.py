@@ -9,19 +9,38 @@ Original file is located at
 
 import streamlit as st
 import pandas as pd
-import psycopg2
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from pandas.api.types import is_datetime64_any_dtype
 import warnings
 from datetime import datetime, timedelta
 import time
 import os
-from typing import Dict, Optional, Tuple, List
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple, List
+
+from psycopg2.errors import QueryCanceled
+
+from utils.aggregate import (Aggregate, comment_stats, daily_counts, feedback_summary, hourly_ratings, null_counts,
+                             otp_daily_usage, otp_status_counts, otp_summary, rating_counts, run_aggregate, top_values,
+                             value_lengths)
+from utils.cache import cached, date_bounds, get_disk_cache, get_range_cache, get_result_cache
+from utils.db import (DEFAULT_FETCH_SIZE, arrow_to_pandas, copy_query_arrow, copy_query_df,
+                      iter_query_chunks, prepared_statement_stats)
+from utils.eda import daily_usage_chunked, value_counts_chunked
+from utils.executor import get_executor, get_interactive_executor, wait_interruptibly
+from utils.governor import ConcurrencyLimitExceeded, get_governor
+from utils.inflight import get_inflight, query_scope
+from utils.incremental import get_incremental_table, reset_incremental_tables
+from utils.mirror import DuckDBMirror, get_mirror, mirror_available
+from utils.ngram import NgramIndex
+from utils.plans import (HOT_TIME_SHARE, MISESTIMATE_FACTOR, compare_nodes, explain_statement,
+                         get_plan_history, parse_plan, plan_nodes, plan_shape, plan_summary, runs_frame)
+from utils.rollups import ROLLUPS, RollupManager, feedback_trend, get_rollups, otp_trend
+from utils.routing import get_router, replica_configs_from_env
 
 warnings.filterwarnings('ignore')
 
@@ -151,53 +170,321 @@ class DatabaseConfig:
             "database": os.getenv("DB_NAME", "miva_ai_db")
         }
 
+    @staticmethod
+    def get_replica_configs(primary: Dict[str, str]) -> List[Dict[str, str]]:
+        """Read-replica configurations (``replicas`` host list in secrets, else DB_REPLICA_HOSTS)"""
+        try:
+            if hasattr(st, 'secrets') and 'database' in st.secrets and 'replicas' in st.secrets["database"]:
+                return replica_configs_from_env(primary, ",".join(st.secrets["database"]["replicas"]))
+        except:
+            pass
+        return replica_configs_from_env(primary)
+
 class DatabaseManager:
     """Database connection and query management"""
 
     def __init__(self):
         self.config = DatabaseConfig.get_config()
+        # Every query here is a read, so they go through the replica router
+        # (a drop-in for the pool that falls back to the primary)
+        self.pool = get_router(self.config, DatabaseConfig.get_replica_configs(self.config))
 
-    @st.cache_data(ttl=300)
+    @cached(ttl=300)
     def test_connection(_self) -> Tuple[bool, str]:
         """Test database connection"""
         try:
-            conn = psycopg2.connect(**_self.config)
-            cursor = conn.cursor()
-            cursor.execute("SELECT version();")
-            version = cursor.fetchone()
-            cursor.close()
-            conn.close()
+            with _self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT version();")
+                    version = cursor.fetchone()
             return True, version[0] if version else "Unknown"
         except Exception as e:
             return False, str(e)
 
-    @st.cache_data(ttl=300)
+    @cached(ttl=300)
     def run_query(_self, query: str) -> List:
         """Execute a query and return results"""
         try:
-            conn = psycopg2.connect(**_self.config)
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            cursor.close()
-            conn.close()
+            with _self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query)
+                    rows = cursor.fetchall()
             return rows
         except Exception as e:
             st.error(f"Query error: {e}")
             return []
 
-    @st.cache_data(ttl=300)
-    def query_df(_self, query: str) -> pd.DataFrame:
-        """Run a SQL query and return result as Pandas DataFrame"""
+    @cached(ttl=300)
+    def query_df(_self, query: str, method: str = "read_sql") -> pd.DataFrame:
+        """Run a SQL query and return result as Pandas DataFrame
+
+        ``method="copy"`` bulk-loads the result with COPY ... TO STDOUT,
+        which is much faster for full-table reads.
+        """
         try:
-            conn = psycopg2.connect(**_self.config)
-            df = pd.read_sql(query, conn)
-            conn.close()
+            with _self.pool.connection() as conn:
+                if method == "copy":
+                    df = copy_query_df(conn, query)
+                else:
+                    df = pd.read_sql(query, conn)
             return df
         except Exception as e:
             st.error(f"DataFrame query error: {e}")
             return pd.DataFrame()
 
+    @cached(ttl=300)
+    def query_arrow(_self, query: str):
+        """Run a SQL query and return result as a typed pyarrow Table
+
+        Text columns stay in Arrow buffers; convert with ``arrow_to_pandas``
+        only where pandas analysis is needed. ``st.dataframe`` renders the
+        table directly.
+        """
+        try:
+            # Served from the on-disk Parquet cache while the tables are unchanged. Read on the
+            # primary: its change counters only describe its own data, not a lagging replica's
+            with _self.pool.primary.connection() as conn:
+                return get_disk_cache().fetch(conn, query, lambda: copy_query_arrow(conn, query))
+        except Exception as e:
+            st.error(f"Arrow query error: {e}")
+            return None
+
+    def query_df_arrow(self, query: str) -> pd.DataFrame:
+        """Arrow-backed DataFrame view of ``query_arrow`` for pandas analysis"""
+        table = self.query_arrow(query)
+        return arrow_to_pandas(table) if table is not None else pd.DataFrame()
+
+    def query_table_incremental(self, table: str) -> pd.DataFrame:
+        """Whole-table DataFrame kept current by incremental id/created_at sync"""
+        try:
+            mirror = get_incremental_table(self.pool, table)
+            # Synced from the primary, where the delete counter and the rows agree
+            with self.pool.primary.connection() as conn:
+                return arrow_to_pandas(mirror.refresh(conn))
+        except Exception as e:
+            st.error(f"Incremental load error: {e}")
+            return pd.DataFrame()
+
+    def query_table_range(self, table: str, date_range, ts_col: str = 'created_at') -> pd.DataFrame:
+        """Rows of ``table`` inside an inclusive date range, filtered in SQL
+
+        A narrower range is sliced from a cached wider one without a new
+        query. Until both ends of the range are picked the whole table is
+        loaded incrementally.
+        """
+        if len(date_range) != 2:
+            return self.query_table_incremental(table)
+
+        def load(lo, hi):
+            query = f'SELECT * FROM "{table}" WHERE "{ts_col}" >= %(from)s AND "{ts_col}" < %(to)s'
+            with self.pool.connection() as conn:
+                return arrow_to_pandas(copy_query_arrow(conn, query, {"from": lo, "to": hi}))
+
+        try:
+            lo, hi = date_bounds(*date_range)
+            return get_range_cache().fetch((self.pool, table, ts_col), lo, hi, load, ts_col)
+        except Exception as e:
+            if not get_inflight().superseded():
+                st.error(f"Range query error: {e}")
+            return pd.DataFrame()
+
+    @cached(ttl=300)
+    def query_aggregate(_self, spec: Aggregate, date_range: tuple = ()) -> pd.DataFrame:
+        """Grouped chart data computed by a GROUP BY in Postgres (see utils.aggregate)"""
+        start, end = date_bounds(*date_range) if len(date_range) == 2 else (None, None)
+        with _self.pool.connection() as conn:
+            return run_aggregate(conn, spec, start, end)
+
+    def aggregate(self, spec: Aggregate, date_range: tuple = ()) -> pd.DataFrame:
+        """``query_aggregate`` for charts: a failure is shown and returns an empty frame
+
+        Exceptions are not cached, so the next rerun queries again instead of
+        serving the empty frame for the cache's TTL.
+        """
+        try:
+            return self.query_aggregate(spec, date_range)
+        except Exception as e:
+            st.error(f"Aggregation query error: {e}")
+            return pd.DataFrame()
+
+    @cached(ttl=300)
+    def column_types(_self, table: str) -> Dict[str, str]:
+        """Column name -> data type of ``table``, in column order"""
+        query = ("SELECT column_name, data_type FROM information_schema.columns "
+                 "WHERE table_schema = 'public' AND table_name = %(table)s ORDER BY ordinal_position")
+        with _self.pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, {"table": table})
+                return dict(cursor.fetchall())
+
+    @cached(ttl=300)
+    def query_rating_comments(_self, rating: int, date_range: tuple = (), table: str = 'chat_feedback',
+                              comment_col: str = 'comment') -> Tuple[pd.DataFrame, NgramIndex]:
+        """Raw commented rows for one rating and a trigram index over them, for the rating drill-down
+
+        The index is built here so it always matches the frame it is cached with.
+        """
+        query = (f'SELECT * FROM "{table}" WHERE rating = %(rating)s '
+                 f'AND "{comment_col}" IS NOT NULL AND btrim("{comment_col}"::text) <> \'\'')
+        params = {"rating": int(rating)}
+        if len(date_range) == 2:
+            query += " AND created_at >= %(from)s AND created_at < %(to)s"
+            params["from"], params["to"] = date_bounds(*date_range)
+        query += " ORDER BY created_at DESC"
+        try:
+            with _self.pool.connection() as conn:
+                comments = arrow_to_pandas(copy_query_arrow(conn, query, params))
+        except Exception as e:
+            st.error(f"Comment query error: {e}")
+            comments = pd.DataFrame()
+        return comments, NgramIndex(comments.get(comment_col, pd.Series(dtype=object)), comments.index)
+
+    @cached(ttl=300)
+    def query_recent_comments(_self, date_range: tuple = (), limit: int = 5, table: str = 'chat_feedback',
+                              comment_col: str = 'comment') -> pd.DataFrame:
+        """The latest ``limit`` commented rows, for the comments preview"""
+        query = f'SELECT * FROM "{table}" WHERE "{comment_col}" IS NOT NULL'
+        params = {"limit": int(limit)}
+        if len(date_range) == 2:
+            query += " AND created_at >= %(from)s AND created_at < %(to)s"
+            params["from"], params["to"] = date_bounds(*date_range)
+        query += " ORDER BY created_at DESC LIMIT %(limit)s"
+        try:
+            with _self.pool.connection() as conn:
+                return arrow_to_pandas(copy_query_arrow(conn, query, params))
+        except Exception as e:
+            st.error(f"Comment query error: {e}")
+            return pd.DataFrame()
+
+    def iter_query_df(self, query: str, params: Optional[dict] = None, chunksize: int = DEFAULT_FETCH_SIZE):
+        """Stream a query as DataFrame chunks through a named server-side cursor
+
+        ``chunksize`` rows are fetched per round trip (``DB_FETCH_SIZE`` by default).
+        """
+        return iter_query_chunks(self.pool, query, params, chunksize)
+
+    @cached(ttl=300)
+    def stream_value_counts(_self, query: str, column: str, params: Optional[dict] = None,
+                            chunksize: int = DEFAULT_FETCH_SIZE) -> pd.Series:
+        """Value counts of one column, computed chunk by chunk without loading the full result"""
+        return value_counts_chunked(_self.iter_query_df(query, params, chunksize), column)
+
+    def rating_distribution(self, date_range: tuple = ()) -> pd.DataFrame:
+        """Per-rating ``count`` / ``comment_count`` rows for the rating charts
+
+        Grouped in Postgres. If that GROUP BY runs into ``statement_timeout``,
+        the ratings are streamed through a server-side cursor instead (each
+        FETCH is its own statement) and counted chunk by chunk.
+        """
+        try:
+            return self.query_aggregate(rating_counts(), date_range)
+        except QueryCanceled as e:
+            if get_inflight().superseded():
+                return pd.DataFrame()
+            st.info(f"Rating aggregate timed out ({e}); counting from a streamed scan instead.")
+        except Exception as e:
+            st.error(f"Aggregation query error: {e}")
+            return pd.DataFrame()
+
+        query = "SELECT rating FROM chat_feedback WHERE rating IS NOT NULL"
+        params = {}
+        if len(date_range) == 2:
+            query += " AND created_at >= %(from)s AND created_at < %(to)s"
+            params["from"], params["to"] = date_bounds(*date_range)
+        try:
+            counts = self.stream_value_counts(query, 'rating', params)
+            commented = self.stream_value_counts(
+                query + " AND comment IS NOT NULL AND btrim(comment::text) <> ''", 'rating', params)
+        except Exception as e:
+            st.error(f"Streaming query error: {e}")
+            return pd.DataFrame()
+        return pd.DataFrame({
+            'rating': counts.index,
+            'count': counts.values,
+            'comment_count': commented.reindex(counts.index, fill_value=0).values,
+        })
+
+    @cached(ttl=300)
+    def stream_daily_usage(_self, query: str, ts_col: str = 'created_at', flag_col: str = 'is_used',
+                           params: Optional[dict] = None, chunksize: int = DEFAULT_FETCH_SIZE) -> pd.DataFrame:
+        """Daily used/total counts, computed chunk by chunk without loading the full result"""
+        return daily_usage_chunked(_self.iter_query_df(query, params, chunksize), ts_col, flag_col)
+
+    def otp_usage_by_day(self, date_range: tuple = ()) -> pd.DataFrame:
+        """Generated vs used OTPs per UTC day (``otp_daily_usage`` columns)
+
+        Grouped in Postgres, with the same streamed fallback as ``rating_distribution``.
+        """
+        try:
+            return self.query_aggregate(otp_daily_usage(), date_range)
+        except QueryCanceled as e:
+            if get_inflight().superseded():
+                return pd.DataFrame()
+            st.info(f"OTP usage aggregate timed out ({e}); counting from a streamed scan instead.")
+        except Exception as e:
+            st.error(f"Aggregation query error: {e}")
+            return pd.DataFrame()
+
+        query = "SELECT created_at, is_used FROM otps WHERE created_at IS NOT NULL"
+        params = {}
+        if len(date_range) == 2:
+            query += " AND created_at >= %(from)s AND created_at < %(to)s"
+            params["from"], params["to"] = date_bounds(*date_range)
+        try:
+            return self.stream_daily_usage(query, params=params)
+        except Exception as e:
+            st.error(f"Streaming query error: {e}")
+            return pd.DataFrame()
+
+    def daily_trends(self, table: str, date_range: tuple = (), rollup: Optional[Aggregate] = None) -> Dict[str, pd.DataFrame]:
+        """``bucket`` / ``count`` rows per UTC day for each timestamp column of ``table``
+
+        ``rollup`` (a rollup trend spec) stands in for the raw GROUP BY on ``created_at``.
+        """
+        trends = {}
+        for col, dtype in self.column_types(table).items():
+            if dtype.startswith(("timestamp", "date")):
+                spec = rollup if col == 'created_at' and rollup is not None else daily_counts(table, col)
+                trend = self.aggregate(spec, date_range)
+                trends[col] = trend.rename(columns={'date': 'bucket', 'total_count': 'count'})
+        return trends
+
+    def rollups(self) -> RollupManager:
+        """Hourly trend rollups, built and refreshed on the primary in the background when ROLLUPS_ENABLED"""
+        return get_rollups(self.pool.primary, rollups=ROLLUPS)
+
+    def mirror(self) -> DuckDBMirror:
+        """The local DuckDB mirror of this database"""
+        return get_mirror(self.pool.primary.connect_kwargs)
+
+    def refresh_mirror(self, force: bool = False) -> Future:
+        """Sync the local DuckDB mirror from the primary in the background (incremental unless ``force``)"""
+        return self.mirror().refresh_in_background(self.pool.primary, force=force)
+
+    def query_mirror_df(self, query: str) -> pd.DataFrame:
+        """Run one SELECT against the DuckDB mirror under the SQL Runner's timeout and row limit
+
+        The frame's ``attrs["truncated"]`` names the limit that cut the result short, if any.
+        """
+        try:
+            self.refresh_mirror()
+            mirror = self.mirror()
+            if not mirror.loaded:
+                st.info("The mirror is being loaded in the background; run the query again shortly.")
+                return pd.DataFrame()
+            governor = get_governor()
+            table, truncated = mirror.query_arrow(query, governor.max_rows, governor.statement_timeout)
+            df = arrow_to_pandas(table)
+            df.attrs["truncated"] = truncated
+            return df
+        except Exception as e:
+            st.error(f"Mirror query error: {e}")
+            return pd.DataFrame()
+
+    def pool_stats(self) -> Dict[str, float]:
+        """Replica routing, connection pool usage and wait statistics"""
+        return self.pool.stats()
+
 class DataProcessor:
     """Data processing utilities"""
 
@@ -343,9 +630,8 @@ class Visualizer:
     MIVA_ASH = "#64748b"
 
     @staticmethod
-    def plot_missing_values(df: pd.DataFrame, title: str):
-        """Create interactive missing values plot"""
-        na_counts = df.isna().sum()
+    def plot_missing_values(na_counts: pd.Series, title: str):
+        """Create interactive missing values plot from per-column missing counts"""
         na_counts = na_counts[na_counts > 0].sort_values(ascending=False)
 
         if na_counts.empty:
@@ -365,18 +651,23 @@ class Visualizer:
         st.plotly_chart(fig, use_container_width=True)
 
     @staticmethod
-    def plot_interactive_rating_distribution(df: pd.DataFrame, col: str, title: str, comment_col: str = 'comment'):
-        """Create interactive rating histogram with click functionality"""
-        data = df[col].dropna()
-        if data.empty:
+    def plot_interactive_rating_distribution(counts: pd.DataFrame, col: str, title: str,
+                                             load_comments: Optional[Callable[[int], Tuple[pd.DataFrame, NgramIndex]]] = None,
+                                             comment_col: str = 'comment'):
+        """Create interactive rating bar chart from per-rating counts with click functionality
+
+        ``counts`` holds one row per rating (``col``, ``count`` and optionally
+        ``comment_count``); raw comments are loaded only for the selected rating,
+        together with the index used by the comment search.
+        """
+        if counts.empty or col not in counts.columns:
             st.warning(f"No data in {col}")
             return
 
-        # Create rating distribution
-        rating_counts = data.value_counts().sort_index()
+        rating_counts = counts.set_index(col)['count'].sort_index()
 
         # Check if comments exist
-        has_comments = comment_col in df.columns and not df[comment_col].isna().all()
+        has_comments = load_comments is not None and counts.get('comment_count', pd.Series(dtype='int64')).sum() > 0
 
         if has_comments:
             st.markdown("#### 📊 Interactive Rating Distribution")
@@ -400,9 +691,9 @@ class Visualizer:
                         st.session_state.selected_rating = rating
 
         # Plot the distribution
-        fig = px.histogram(
-            x=data,
-            nbins=5,
+        fig = px.bar(
+            x=rating_counts.index,
+            y=rating_counts.values,
             title=f"{title}: Rating Distribution",
             labels={'x': col, 'y': 'Frequency'},
             color_discrete_sequence=[Visualizer.MIVA_BLUE]
@@ -427,12 +718,13 @@ class Visualizer:
 
         # Show comments for selected rating
         if has_comments and st.session_state.selected_rating is not None:
-            Visualizer._display_comments_for_rating(
-                df, st.session_state.selected_rating, comment_col, title
-            )
+            selected = st.session_state.selected_rating
+            comments, comment_index = load_comments(selected)
+            Visualizer._display_comments_for_rating(comments, selected, comment_col, title, comment_index)
 
     @staticmethod
-    def _display_comments_for_rating(df: pd.DataFrame, rating: int, comment_col: str, title: str):
+    def _display_comments_for_rating(df: pd.DataFrame, rating: int, comment_col: str, title: str,
+                                     comment_index: Optional[NgramIndex] = None):
         """Display comments for a specific rating"""
         comment_analyzer = CommentAnalyzer()
 
@@ -488,9 +780,16 @@ class Visualizer:
 
         # Filter comments based on search
         display_comments = filtered_comments
-        if search_term:
-            mask = display_comments[comment_col].astype(str).str.contains(search_term, case=False, na=False)
+        if search_term and comment_index is not None:
+            # Trigram lookup touches only candidate rows; re-check them against the frame in hand
+            matches = [label for label in comment_index.search(search_term) if label in display_comments.index]
+            display_comments = display_comments.loc[matches]
+            mask = display_comments[comment_col].astype(str).str.contains(search_term, case=False, na=False, regex=False)
+            display_comments = display_comments[mask]
+        elif search_term:
+            mask = display_comments[comment_col].astype(str).str.contains(search_term, case=False, na=False, regex=False)
             display_comments = display_comments[mask]
+        if search_term:
             st.info(f"Found {len(display_comments)} comments matching '{search_term}'")
 
         # Pagination
@@ -541,10 +840,9 @@ class Visualizer:
             st.rerun()
 
     @staticmethod
-    def plot_rating_distribution(df: pd.DataFrame, col: str, title: str):
-        """Create interactive rating histogram"""
-        data = df[col].dropna()
-        if data.empty:
+    def plot_rating_distribution(counts: pd.DataFrame, col: str, title: str):
+        """Create rating bar chart and average gauge from per-rating counts"""
+        if counts.empty or col not in counts.columns:
             st.warning(f"No data in {col}")
             return
 
@@ -557,12 +855,12 @@ class Visualizer:
 
         # Histogram
         fig.add_trace(
-            go.Histogram(x=data, nbinsx=5, name="Ratings", marker_color=Visualizer.MIVA_BLUE),
+            go.Bar(x=counts[col], y=counts['count'], name="Ratings", marker_color=Visualizer.MIVA_BLUE),
             row=1, col=1
         )
 
         # Statistics
-        avg_rating = data.mean()
+        avg_rating = (counts[col] * counts['count']).sum() / counts['count'].sum()
         fig.add_trace(
             go.Indicator(
                 mode="gauge+number+delta",
@@ -595,13 +893,13 @@ class Visualizer:
         st.plotly_chart(fig, use_container_width=True)
 
     @staticmethod
-    def plot_top_categories(df: pd.DataFrame, col: str, title: str, top_n: int = 20):
-        """Create interactive top categories plot"""
-        if col not in df.columns:
+    def plot_top_categories(counts: pd.DataFrame, col: str, title: str, top_n: int = 20):
+        """Create interactive top categories plot from per-value ``col`` / ``count`` rows"""
+        if col not in counts.columns:
             st.warning(f"Column '{col}' not found in {title}")
             return
 
-        vc = df[col].astype("object").fillna("(Missing)").value_counts().head(top_n)
+        vc = counts.set_index(col)['count'].head(top_n)
         if vc.empty:
             st.warning(f"No data in '{col}' for {title}")
             return
@@ -642,57 +940,119 @@ class Visualizer:
         st.plotly_chart(fig, use_container_width=True)
 
     @staticmethod
-    def plot_time_trends(df: pd.DataFrame, title: str, freq: str = "D"):
-        """Create interactive time trends plot"""
-        time_cols = [c for c in df.columns if is_datetime64_any_dtype(df[c])]
-        if not time_cols:
-            st.warning(f"No datetime columns detected in {title}")
+    def plot_bucket_trend(trend: pd.DataFrame, title: str, col: str, freq: str = "D"):
+        """Time trends plot from pre-aggregated ``bucket`` / ``count`` rows"""
+        if trend.empty:
             return
+        counts = trend.set_index(pd.to_datetime(trend["bucket"]))["count"]
+        Visualizer._plot_counts(counts, title, col, freq)
 
-        for col in time_cols:
-            s = pd.to_datetime(df[col], errors="coerce", utc=True).dropna()
-            if s.empty:
-                continue
+    @staticmethod
+    def _plot_counts(counts: pd.Series, title: str, col: str, freq: str):
+        if counts.empty:
+            return
 
-            s = s.dt.tz_convert(None)
-            stamped = s.dt.floor(freq)
-            counts = stamped.value_counts().sort_index()
+        # Create line plot with moving average
+        fig = go.Figure()
+
+        fig.add_trace(go.Scatter(
+            x=counts.index,
+            y=counts.values,
+            mode='lines+markers',
+            name='Daily Count',
+            line=dict(color=Visualizer.MIVA_BLUE, width=2),
+            marker=dict(size=4)
+        ))
+
+        # Add 7-day moving average if enough data
+        if len(counts) >= 7:
+            ma_7 = counts.rolling(window=7, center=True).mean()
+            fig.add_trace(go.Scatter(
+                x=ma_7.index,
+                y=ma_7.values,
+                mode='lines',
+                name='7-day Moving Average',
+                line=dict(color=Visualizer.MIVA_RED, width=2, dash='dash')
+            ))
 
-            if counts.empty:
-                continue
+        fig.update_layout(
+            title=f"{title}: Trends by {col} ({freq})",
+            xaxis_title="Time",
+            yaxis_title="Count",
+            hovermode='x unified',
+            showlegend=True
+        )
 
-            # Create line plot with moving average
-            fig = go.Figure()
+        st.plotly_chart(fig, use_container_width=True)
 
-            fig.add_trace(go.Scatter(
-                x=counts.index,
-                y=counts.values,
-                mode='lines+markers',
-                name='Daily Count',
-                line=dict(color=Visualizer.MIVA_BLUE, width=2),
-                marker=dict(size=4)
-            ))
+    @staticmethod
+    def plot_query_plan(plan: dict, runs: List[dict]):
+        """Render an EXPLAIN ANALYZE plan tree and compare it with earlier runs of the query"""
+        summary = plan_summary(plan)
+        nodes = plan_nodes(plan)
+        previous = runs[-2] if len(runs) >= 2 else None
+
+        c1, c2, c3, c4 = st.columns(4)
+        delta = None
+        if previous is not None:
+            delta = f"{summary['execution_ms'] - previous['summary']['execution_ms']:+.1f} ms vs last run"
+        c1.metric("Execution", f"{summary['execution_ms']:.1f} ms", delta, delta_color="inverse")
+        c2.metric("Planning", f"{summary['planning_ms']:.1f} ms")
+        c3.metric("Rows", f"{summary['rows']:,}")
+        c4.metric("Buffer hit ratio", f"{summary['hit_ratio']:.1%}",
+                  help=f"{summary['shared_hit']:,} blocks from shared buffers, {summary['shared_read']:,} read")
+
+        # Plan tree, with the nodes that dominate time and bad row estimates highlighted
+        table = pd.DataFrame({
+            "node": ["    " * d + ("→ " if d else "") + n for d, n in zip(nodes["depth"], nodes["node"])],
+            "self ms": nodes["self_ms"].round(2),
+            "time %": (nodes["time_share"] * 100).round(1),
+            "actual rows": nodes["actual_rows"],
+            "est. rows": nodes["est_rows"],
+            "actual/est.": nodes["misestimate"].round(2),
+            "loops": nodes["loops"],
+            "buffer hits": nodes["self_shared_hit"],
+            "buffer reads": nodes["self_shared_read"],
+            "temp written": nodes["self_temp_written"],
+        })
+
+        def highlight(row):
+            hot = nodes.loc[row.name, "time_share"] >= HOT_TIME_SHARE
+            off = nodes.loc[row.name, "misestimate"]
+            skewed = off >= MISESTIMATE_FACTOR or off <= 1 / MISESTIMATE_FACTOR
+            styles = ["background-color: #fee2e2" if hot else ""] * len(row)
+            if skewed:
+                styles[table.columns.get_loc("actual/est.")] = "background-color: #fef3c7"
+            return styles
+
+        st.dataframe(table.style.apply(highlight, axis=1), use_container_width=True, hide_index=True)
+        st.caption(
+            f"Red rows take at least {HOT_TIME_SHARE:.0%} of execution time; amber estimates are off by "
+            f"{MISESTIMATE_FACTOR:.0f}x or more. Times and buffers are exclusive of child nodes."
+        )
 
-            # Add 7-day moving average if enough data
-            if len(counts) >= 7:
-                ma_7 = counts.rolling(window=7, center=True).mean()
-                fig.add_trace(go.Scatter(
-                    x=ma_7.index,
-                    y=ma_7.values,
-                    mode='lines',
-                    name='7-day Moving Average',
-                    line=dict(color=Visualizer.MIVA_RED, width=2, dash='dash')
-                ))
-
-            fig.update_layout(
-                title=f"{title}: Trends by {col} ({freq})",
-                xaxis_title="Time",
-                yaxis_title="Count",
-                hovermode='x unified',
-                showlegend=True
-            )
+        top = nodes.nlargest(min(10, len(nodes)), "self_ms")
+        fig = px.bar(
+            top, x="self_ms", y=top["id"].astype(str) + ": " + top["node"], orientation='h',
+            labels={'self_ms': 'Self time (ms)', 'y': 'Node'}, title="Where the time went",
+            color_discrete_sequence=[Visualizer.MIVA_BLUE]
+        )
+        fig.update_layout(height=max(300, 40 * len(top)), yaxis={'categoryorder': 'total ascending'})
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Regressions between runs of the same statement
+        if previous is not None:
+            st.markdown("#### 🕒 Earlier Runs")
+            if previous["shape"] != plan_shape(plan):
+                st.warning("⚠️ The planner chose a different plan than on the previous run.")
+            else:
+                changes = compare_nodes(previous["plan"], plan)
+                changes = changes.reindex(changes["self_ms_change"].abs().sort_values(ascending=False).index)
+                st.dataframe(changes.head(10), use_container_width=True, hide_index=True)
+            st.dataframe(runs_frame(runs), use_container_width=True, hide_index=True)
 
-            st.plotly_chart(fig, use_container_width=True)
+        with st.expander("Raw plan (JSON)"):
+            st.json(plan)
 
 ### MODIFICATION START ###
 def login_page():
@@ -755,12 +1115,56 @@ def create_dashboard():
                     st.error(f"❌ Connection failed")
                     st.error(f"Error: {info}")
 
+        with st.expander("Connection Pool"):
+            st.json(db_manager.pool_stats())
+            st.markdown("**Superseded-query cancellation**")
+            st.json(get_inflight().stats())
+            st.markdown("**Prepared statements**")
+            st.json(prepared_statement_stats())
+
+        with st.expander("Result Cache"):
+            st.json(get_result_cache().stats())
+            st.markdown("**Date ranges**")
+            st.json(get_range_cache().stats())
+            st.markdown("**On-disk (Parquet)**")
+            st.json(get_disk_cache().stats())
+
+        with st.expander("Trend Rollups"):
+            rollups = db_manager.rollups()
+            if not rollups.enabled:
+                st.caption("Off: trends are grouped from the raw tables. Set ROLLUPS_ENABLED=true to build "
+                           "hourly rollup tables on the primary.")
+            elif st.button("Rebuild rollups"):
+                with st.spinner("Rebuilding rollups..."):
+                    try:
+                        rollups.refresh(force=True)
+                    except Exception as e:
+                        st.error(f"Rollup rebuild failed: {e}")
+            st.json(rollups.status())
+
+        use_mirror = False
+        if mirror_available():
+            with st.expander("Analytical Mirror"):
+                use_mirror = st.checkbox(
+                    "Run analytics on DuckDB mirror", False,
+                    help="Answer custom and cross-table SQL from a local DuckDB copy instead of Postgres"
+                )
+                if st.button("Full resync"):
+                    db_manager.refresh_mirror(force=True)
+                    st.info("Full resync started in the background.")
+                status = db_manager.mirror().status()
+                if status:
+                    st.dataframe(pd.DataFrame(status), use_container_width=True)
+
         # Data management
         st.markdown("#### Data Management")
         col1, col2 = st.columns(2)
         with col1:
             if st.button("🔄 Refresh"):
                 st.cache_data.clear()
+                get_result_cache().clear()
+                get_disk_cache().clear()
+                reset_incremental_tables()
                 st.success("Cache cleared!")
                 st.rerun()
 
@@ -855,74 +1259,85 @@ def create_dashboard():
         st.markdown("### 💬 Chat Feedback Analysis")
 
         with st.spinner("Loading chat feedback data..."):
-            df_chat = db_manager.query_df("SELECT * FROM chat_feedback;")
-
-            if not df_chat.empty:
-                df_chat = processor.try_parse_datetimes(df_chat)
-
-                # Apply date filter
-                if len(date_range) == 2 and 'created_at' in df_chat.columns:
-                    mask = (df_chat['created_at'].dt.date >= date_range[0]) & (df_chat['created_at'].dt.date <= date_range[1])
-                    df_chat = df_chat.loc[mask]
+            # Every panel below is a GROUP BY in Postgres over the date range;
+            # raw rows are fetched only for the preview/export drill-down
+            try:
+                chat_columns = db_manager.column_types("chat_feedback")
+            except Exception as e:
+                st.error(f"Schema query error: {e}")
+                chat_columns = {}
+            summary = db_manager.aggregate(feedback_summary(list(chat_columns)), tuple(date_range)) if chat_columns else pd.DataFrame()
+            chat_stats = summary.iloc[0] if not summary.empty else None
 
+            if chat_stats is not None and chat_stats['rows'] > 0:
                 # Metrics dashboard
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    st.metric("📊 Total Records", f"{len(df_chat):,}")
+                    st.metric("📊 Total Records", f"{chat_stats['rows']:,}")
                 with col2:
-                    if 'rating' in df_chat.columns:
-                        avg_rating = df_chat['rating'].mean()
-                        st.metric("⭐ Average Rating", f"{avg_rating:.2f}")
+                    if 'avg_rating' in chat_stats:
+                        st.metric("⭐ Average Rating", f"{chat_stats['avg_rating']:.2f}")
                 with col3:
-                    if 'created_at' in df_chat.columns:
-                        latest = df_chat['created_at'].max()
+                    if 'latest' in chat_stats:
+                        latest = chat_stats['latest']
                         st.metric("📅 Latest Entry", latest.strftime("%Y-%m-%d") if pd.notna(latest) else "N/A")
                 with col4:
-                    unique_users = df_chat['email'].nunique() if 'email' in df_chat.columns else 0
-                    st.metric("👥 Unique Users", f"{unique_users:,}")
+                    st.metric("👥 Unique Users", f"{chat_stats.get('unique_users', 0):,}")
 
                 # Analysis sections
                 if show_missing:
                     with st.expander("🔍 Missing Values Analysis", expanded=True):
-                        viz.plot_missing_values(df_chat, "Chat Feedback")
+                        na_counts = db_manager.aggregate(null_counts("chat_feedback", list(chat_columns)), tuple(date_range))
+                        viz.plot_missing_values(na_counts.iloc[0] if not na_counts.empty else pd.Series(dtype='int64'),
+                                                "Chat Feedback")
 
                 if show_distributions:
                     with st.expander("📊 Data Distributions", expanded=True):
                         # Interactive Rating Distribution with Comments
-                        if 'rating' in df_chat.columns:
-                            viz.plot_interactive_rating_distribution(df_chat, 'rating', 'Chat Feedback', 'comment')
+                        if 'rating' in chat_columns:
+                            viz.plot_interactive_rating_distribution(
+                                db_manager.rating_distribution(tuple(date_range)), 'rating', 'Chat Feedback',
+                                lambda r: db_manager.query_rating_comments(r, tuple(date_range)), 'comment'
+                            )
 
                         col1, col2 = st.columns(2)
                         with col1:
-                            if 'user_agent' in df_chat.columns:
-                                viz.plot_top_categories(df_chat, 'user_agent', 'Chat Feedback', 10)
+                            if 'user_agent' in chat_columns:
+                                viz.plot_top_categories(
+                                    db_manager.aggregate(top_values("chat_feedback", 'user_agent', 10), tuple(date_range)),
+                                    'user_agent', 'Chat Feedback', 10)
                         with col2:
-                            if 'ip_address' in df_chat.columns:
-                                viz.plot_top_categories(df_chat, 'ip_address', 'Chat Feedback', 10)
+                            if 'ip_address' in chat_columns:
+                                viz.plot_top_categories(
+                                    db_manager.aggregate(top_values("chat_feedback", 'ip_address', 10), tuple(date_range)),
+                                    'ip_address', 'Chat Feedback', 10)
 
                 # Comments Analysis Section
-                if 'comment' in df_chat.columns and not df_chat['comment'].isna().all():
+                if chat_stats.get('comments', 0) > 0:
                     with st.expander("💬 Comments Analysis", expanded=False):
                         st.markdown("#### 📊 Comment Overview")
 
                         # Comment statistics
-                        comment_stats = comment_analyzer.get_comment_statistics(df_chat, 'comment')
-                        if comment_stats:
+                        comment_summary = db_manager.aggregate(comment_stats(), tuple(date_range))
+                        if not comment_summary.empty:
+                            stats = comment_summary.iloc[0]
                             col1, col2, col3, col4 = st.columns(4)
 
                             with col1:
-                                st.metric("📝 Total Comments", f"{comment_stats['total_comments']:,}")
+                                st.metric("📝 Total Comments", f"{stats['total_comments']:,}")
                             with col2:
-                                st.metric("📏 Avg Length", f"{comment_stats['avg_length']:.0f} chars")
+                                st.metric("📏 Avg Length", f"{stats['avg_length']:.0f} chars")
                             with col3:
-                                st.metric("📖 Avg Words", f"{comment_stats['avg_words']:.1f}")
+                                st.metric("📖 Avg Words", f"{stats['avg_words']:.1f}")
                             with col4:
-                                st.metric("📋 Longest", f"{comment_stats['longest_comment']} chars")
+                                st.metric("📋 Longest", f"{stats['longest_comment']} chars")
 
                         # Comments by rating breakdown
                         st.markdown("#### 📈 Comments by Rating")
-                        comments_by_rating = df_chat.groupby('rating')['comment'].count().reset_index()
-                        comments_by_rating.columns = ['Rating', 'Comment Count']
+                        comments_by_rating = db_manager.rating_distribution(tuple(date_range))
+                        comments_by_rating = comments_by_rating.rename(
+                            columns={'rating': 'Rating', 'comment_count': 'Comment Count'}
+                        ).reindex(columns=['Rating', 'Comment Count'])
 
                         fig = px.bar(
                             comments_by_rating,
@@ -936,7 +1351,7 @@ def create_dashboard():
 
                         # Recent comments preview
                         st.markdown("#### 🕒 Recent Comments Preview")
-                        recent_comments = df_chat[df_chat['comment'].notna()].nlargest(5, 'created_at') if 'created_at' in df_chat.columns else df_chat[df_chat['comment'].notna()].tail(5)
+                        recent_comments = db_manager.query_recent_comments(tuple(date_range))
 
                         for idx, row in recent_comments.iterrows():
                             with st.container():
@@ -950,18 +1365,20 @@ def create_dashboard():
 
                 if show_trends:
                     with st.expander("📈 Time Trends Analysis", expanded=True):
-                        viz.plot_time_trends(df_chat, "Chat Feedback")
+                        # created_at comes from the hourly rollup once it is built
+                        rollup = feedback_trend() if db_manager.rollups().ready else None
+                        for col, trend in db_manager.daily_trends("chat_feedback", tuple(date_range), rollup).items():
+                            viz.plot_bucket_trend(trend, "Chat Feedback", col)
 
                 if show_advanced:
                     with st.expander("🔬 Advanced Analytics", expanded=False):
                         # Rating correlation analysis
-                        if 'rating' in df_chat.columns:
+                        if 'rating' in chat_columns:
                             st.markdown("#### Rating Analysis")
 
                             # Rating distribution by time of day
-                            if 'created_at' in df_chat.columns:
-                                df_chat['hour'] = df_chat['created_at'].dt.hour
-                                hourly_ratings = df_chat.groupby('hour')['rating'].agg(['mean', 'count']).reset_index()
+                            if 'created_at' in chat_columns:
+                                hourly = db_manager.aggregate(hourly_ratings(), tuple(date_range))
 
                                 fig = make_subplots(
                                     rows=1, cols=2,
@@ -969,12 +1386,12 @@ def create_dashboard():
                                 )
 
                                 fig.add_trace(
-                                    go.Bar(x=hourly_ratings['hour'], y=hourly_ratings['mean'], name='Avg Rating', marker_color=viz.MIVA_BLUE),
+                                    go.Bar(x=hourly['hour'], y=hourly['mean'], name='Avg Rating', marker_color=viz.MIVA_BLUE),
                                     row=1, col=1
                                 )
 
                                 fig.add_trace(
-                                    go.Scatter(x=hourly_ratings['hour'], y=hourly_ratings['count'],
+                                    go.Scatter(x=hourly['hour'], y=hourly['count'],
                                              mode='lines+markers', name='Count', line=dict(color=viz.MIVA_RED)),
                                     row=1, col=2
                                 )
@@ -984,31 +1401,38 @@ def create_dashboard():
 
                 # Data export and preview
                 with st.expander("📋 Data Preview & Export", expanded=False):
-                    st.dataframe(df_chat.head(100), use_container_width=True)
+                    # The one view that needs the raw rows of the whole date range
+                    if st.checkbox("Load rows for preview and export", key="chat_feedback_rows"):
+                        # A newer range cancels this load
+                        with query_scope("chat_feedback_range", tuple(date_range)):
+                            load = get_interactive_executor().submit(db_manager.query_table_range, "chat_feedback", date_range)
+                        df_chat = processor.try_parse_datetimes(wait_interruptibly(load, st.empty(), "Loading chat feedback data..."))
 
-                    # Export options
-                    col1, col2, col3 = st.columns(3)
+                        st.dataframe(df_chat.head(100), use_container_width=True)
 
-                    with col1:
-                        csv = df_chat.to_csv(index=False)
-                        st.download_button(
-                            label="📥 Download CSV",
-                            data=csv,
-                            file_name=f"chat_feedback_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                            mime="text/csv"
-                        )
+                        # Export options
+                        col1, col2, col3 = st.columns(3)
 
-                    with col2:
-                        json_data = df_chat.to_json(orient='records', date_format='iso')
-                        st.download_button(
-                            label="📥 Download JSON",
-                            data=json_data,
-                            file_name=f"chat_feedback_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                            mime="application/json"
-                        )
+                        with col1:
+                            csv = df_chat.to_csv(index=False)
+                            st.download_button(
+                                label="📥 Download CSV",
+                                data=csv,
+                                file_name=f"chat_feedback_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                                mime="text/csv"
+                            )
 
-                    with col3:
-                        st.metric("Rows in Export", len(df_chat))
+                        with col2:
+                            json_data = df_chat.to_json(orient='records', date_format='iso')
+                            st.download_button(
+                                label="📥 Download JSON",
+                                data=json_data,
+                                file_name=f"chat_feedback_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                                mime="application/json"
+                            )
+
+                        with col3:
+                            st.metric("Rows in Export", len(df_chat))
             else:
                 st.warning("No chat feedback data found.")
 
@@ -1016,37 +1440,37 @@ def create_dashboard():
         st.markdown("### 🔐 OTP Analysis")
 
         with st.spinner("Loading OTP data..."):
-            df_otps = db_manager.query_df("SELECT * FROM otps;")
-
-            if not df_otps.empty:
-                df_otps = processor.try_parse_datetimes(df_otps)
-
-                # Apply date filter
-                if len(date_range) == 2 and 'created_at' in df_otps.columns:
-                    mask = (df_otps['created_at'].dt.date >= date_range[0]) & (df_otps['created_at'].dt.date <= date_range[1])
-                    df_otps = df_otps.loc[mask]
+            # Every panel below is a GROUP BY in Postgres over the date range;
+            # raw rows are fetched only for the preview/export drill-down
+            try:
+                otp_columns = db_manager.column_types("otps")
+            except Exception as e:
+                st.error(f"Schema query error: {e}")
+                otp_columns = {}
+            summary = db_manager.aggregate(otp_summary(list(otp_columns)), tuple(date_range)) if otp_columns else pd.DataFrame()
+            otp_stats = summary.iloc[0] if not summary.empty else None
 
+            if otp_stats is not None and otp_stats['rows'] > 0:
                 # Metrics dashboard - Updated for correct OTP column names
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
-                    st.metric("📊 Total OTPs", f"{len(df_otps):,}")
+                    st.metric("📊 Total OTPs", f"{otp_stats['rows']:,}")
                 with col2:
-                    if 'otp_code' in df_otps.columns:
-                        avg_length = df_otps['otp_code'].astype(str).str.len().mean()
-                        st.metric("📏 Avg Length", f"{avg_length:.1f}")
+                    if 'avg_length' in otp_stats:
+                        st.metric("📏 Avg Length", f"{otp_stats['avg_length']:.1f}")
                 with col3:
-                    if 'is_used' in df_otps.columns:
-                        used_rate = df_otps['is_used'].mean() * 100
-                        st.metric("✅ Usage Rate", f"{used_rate:.1f}%")
+                    if 'usage_rate' in otp_stats:
+                        st.metric("✅ Usage Rate", f"{otp_stats['usage_rate'] * 100:.1f}%")
                 with col4:
-                    if 'user_id' in df_otps.columns:
-                        unique_users = df_otps['user_id'].nunique()
-                        st.metric("👥 Unique Users", f"{unique_users:,}")
+                    if 'unique_users' in otp_stats:
+                        st.metric("👥 Unique Users", f"{otp_stats['unique_users']:,}")
 
                 # Analysis sections
                 if show_missing:
                     with st.expander("🔍 Missing Values Analysis", expanded=True):
-                        viz.plot_missing_values(df_otps, "OTPs")
+                        na_counts = db_manager.aggregate(null_counts("otps", list(otp_columns)), tuple(date_range))
+                        viz.plot_missing_values(na_counts.iloc[0] if not na_counts.empty else pd.Series(dtype='int64'),
+                                                "OTPs")
 
                 if show_distributions:
                     with st.expander("📊 Data Distributions", expanded=True):
@@ -1054,46 +1478,50 @@ def create_dashboard():
 
                         with col1:
                             # OTP length distribution
-                            if 'otp_code' in df_otps.columns:
-                                lengths = df_otps['otp_code'].dropna().astype(str).str.len()
+                            if 'otp_code' in otp_columns:
+                                lengths = db_manager.aggregate(value_lengths("otps", 'otp_code'), tuple(date_range))
                                 if not lengths.empty:
-                                    fig = px.histogram(
-                                        x=lengths,
+                                    fig = px.bar(
+                                        lengths,
+                                        x='length',
+                                        y='count',
                                         title="OTP Code Length Distribution",
-                                        labels={'x': 'Length', 'y': 'Frequency'},
-                                        nbins=10,
+                                        labels={'length': 'Length', 'count': 'Frequency'},
                                         color_discrete_sequence=[viz.MIVA_BLUE]
                                     )
                                     st.plotly_chart(fig, use_container_width=True)
 
                         with col2:
                             # Usage status distribution
-                            if 'is_used' in df_otps.columns:
-                                status_counts = df_otps['is_used'].value_counts()
-                                fig = px.pie(
-                                    values=status_counts.values,
-                                    names=['Used' if x else 'Unused' for x in status_counts.index],
-                                    title="OTP Usage Status",
-                                    color_discrete_sequence=[viz.MIVA_BLUE, viz.MIVA_ASH]
-                                )
-                                st.plotly_chart(fig, use_container_width=True)
+                            if 'is_used' in otp_columns:
+                                status_counts = db_manager.aggregate(otp_status_counts(), tuple(date_range))
+                                if not status_counts.empty:
+                                    fig = px.pie(
+                                        values=status_counts['count'],
+                                        names=['Used' if x else 'Unused' for x in status_counts['is_used']],
+                                        title="OTP Usage Status",
+                                        color_discrete_sequence=[viz.MIVA_BLUE, viz.MIVA_ASH]
+                                    )
+                                    st.plotly_chart(fig, use_container_width=True)
 
                 if show_trends:
                     with st.expander("📈 Time Trends Analysis", expanded=True):
-                        viz.plot_time_trends(df_otps, "OTPs")
+                        # created_at comes from the hourly rollup once it is built
+                        rollup = otp_trend() if db_manager.rollups().ready else None
+                        for col, trend in db_manager.daily_trends("otps", tuple(date_range), rollup).items():
+                            viz.plot_bucket_trend(trend, "OTPs", col)
 
                 if show_advanced:
                     with st.expander("🔬 Advanced Analytics", expanded=False):
                         # Usage patterns
-                        if 'is_used' in df_otps.columns and 'created_at' in df_otps.columns:
+                        if 'is_used' in otp_columns and 'created_at' in otp_columns:
                             st.markdown("#### Usage Patterns")
 
-                            # Usage rate over time
-                            df_otps['date'] = df_otps['created_at'].dt.date
-                            daily_usage = df_otps.groupby('date').agg({
-                                'is_used': ['sum', 'count', 'mean']
-                            }).reset_index()
-                            daily_usage.columns = ['date', 'used_count', 'total_count', 'usage_rate']
+                            # Usage rate over time, grouped by day in Postgres (from the rollup once built)
+                            if db_manager.rollups().ready:
+                                daily_usage = db_manager.aggregate(otp_trend(), tuple(date_range))
+                            else:
+                                daily_usage = db_manager.otp_usage_by_day(tuple(date_range))
 
                             fig = make_subplots(
                                 rows=2, cols=1,
@@ -1129,29 +1557,36 @@ def create_dashboard():
 
                 # Data export and preview
                 with st.expander("📋 Data Preview & Export", expanded=False):
-                    st.dataframe(df_otps.head(100), use_container_width=True)
+                    # The one view that needs the raw rows of the whole date range
+                    if st.checkbox("Load rows for preview and export", key="otps_rows"):
+                        # A newer range cancels this load
+                        with query_scope("otps_range", tuple(date_range)):
+                            load = get_interactive_executor().submit(db_manager.query_table_range, "otps", date_range)
+                        df_otps = processor.try_parse_datetimes(wait_interruptibly(load, st.empty(), "Loading OTP data..."))
 
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        csv = df_otps.to_csv(index=False)
-                        st.download_button(
-                            label="📥 Download CSV",
-                            data=csv,
-                            file_name=f"otps_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                            mime="text/csv"
-                        )
+                        st.dataframe(df_otps.head(100), use_container_width=True)
 
-                    with col2:
-                        json_data = df_otps.to_json(orient='records', date_format='iso')
-                        st.download_button(
-                            label="📥 Download JSON",
-                            data=json_data,
-                            file_name=f"otps_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                            mime="application/json"
-                        )
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            csv = df_otps.to_csv(index=False)
+                            st.download_button(
+                                label="📥 Download CSV",
+                                data=csv,
+                                file_name=f"otps_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                                mime="text/csv"
+                            )
 
-                    with col3:
-                        st.metric("Rows in Export", len(df_otps))
+                        with col2:
+                            json_data = df_otps.to_json(orient='records', date_format='iso')
+                            st.download_button(
+                                label="📥 Download JSON",
+                                data=json_data,
+                                file_name=f"otps_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                                mime="application/json"
+                            )
+
+                        with col3:
+                            st.metric("Rows in Export", len(df_otps))
             else:
                 st.warning("No OTP data found.")
 
@@ -1184,6 +1619,16 @@ def create_dashboard():
                 GROUP BY DATE(created_at)
                 ORDER BY date DESC;
             """,
+            "Daily Feedback Trends (rollup)": """
+                SELECT
+                    date_trunc('day', bucket) as date,
+                    SUM(feedback_count) as feedback_count,
+                    SUM(rating_sum)::float8 / NULLIF(SUM(rating_count), 0) as avg_rating
+                FROM dash_feedback_hourly
+                WHERE bucket >= CURRENT_DATE - INTERVAL '30 days'
+                GROUP BY 1
+                ORDER BY date DESC;
+            """,
             "Recent Comments Analysis": """
                 SELECT
                     rating,
@@ -1210,70 +1655,135 @@ def create_dashboard():
             help="Write your SQL query here. Be careful with large result sets!"
         )
 
-        # Query execution
+        # Query execution: Postgres queries run under the governor (timeout, row/byte budget, cancel)
+        governor = get_governor()
         col1, col2, col3 = st.columns([2, 1, 1])
 
         with col1:
-            if st.button("🚀 Execute Query", type="primary"):
-                if query.strip():
-                    with st.spinner("Executing query..."):
-                        try:
-                            start_time = time.time()
-                            result_df = db_manager.query_df(query)
-                            execution_time = time.time() - start_time
-
-                            if not result_df.empty:
-                                st.success(f"✅ Query executed successfully! {len(result_df)} rows returned in {execution_time:.2f}s")
-
-                                # Display results with pagination
-                                if len(result_df) > 1000:
-                                    st.warning("⚠️ Large result set detected. Showing first 1000 rows.")
-                                    display_df = result_df.head(1000)
-                                else:
-                                    display_df = result_df
-
-                                st.dataframe(display_df, use_container_width=True)
-
-                                # Quick statistics
-                                if len(result_df.select_dtypes(include=[np.number]).columns) > 0:
-                                    st.markdown("#### 📊 Quick Statistics")
-                                    st.dataframe(result_df.describe(), use_container_width=True)
-
-                                # Download results
-                                col1, col2 = st.columns(2)
-                                with col1:
-                                    csv = result_df.to_csv(index=False)
-                                    st.download_button(
-                                        label="📥 Download Results (CSV)",
-                                        data=csv,
-                                        file_name=f"query_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                                        mime="text/csv"
-                                    )
-
-                                with col2:
-                                    json_data = result_df.to_json(orient='records', date_format='iso')
-                                    st.download_button(
-                                        label="📥 Download Results (JSON)",
-                                        data=json_data,
-                                        file_name=f"query_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                                        mime="application/json"
-                                    )
-                            else:
-                                st.info("Query executed successfully but returned no results.")
-
-                        except Exception as e:
-                            st.error(f"❌ Query execution failed: {e}")
-                else:
-                    st.warning("Please enter a SQL query.")
+            execute = st.button("🚀 Execute Query", type="primary")
 
         with col2:
             if st.button("🔄 Clear Query"):
+                old_job = st.session_state.pop("_sql_job", None)
+                if old_job is not None:
+                    governor.cancel(old_job)
                 st.rerun()
 
         with col3:
             if st.button("💾 Save Query"):
                 st.info("Query saving feature coming soon!")
 
+        st.caption(
+            f"Limits: {governor.statement_timeout:.0f}s timeout, {governor.max_rows:,} rows, "
+            f"{governor.max_bytes / 1024 ** 2:,.0f} MB, {governor.max_per_user} concurrent queries per session. "
+            "One statement per run, in a read-only transaction; only a read-only database role rules out writes."
+        )
+        profile = st.checkbox(
+            "🔬 Profile with EXPLAIN ANALYZE",
+            help="Runs the query with EXPLAIN (ANALYZE, BUFFERS) and shows the measured plan instead of the rows"
+        )
+
+        def show_results(result_df: pd.DataFrame, execution_time: float, truncated: Optional[str] = None):
+            """Render a query result with statistics and downloads"""
+            if result_df is None:
+                st.success(f"✅ Statement executed in {execution_time:.2f}s (no result set)")
+                return
+            if result_df.empty:
+                st.info("Query executed successfully but returned no results.")
+                return
+
+            st.success(f"✅ Query executed successfully! {len(result_df)} rows returned in {execution_time:.2f}s")
+            if truncated:
+                st.warning(f"⚠️ Result stopped at the {truncated}; add a LIMIT or aggregate to see everything.")
+
+            # Display results with pagination
+            if len(result_df) > 1000:
+                st.warning("⚠️ Large result set detected. Showing first 1000 rows.")
+                display_df = result_df.head(1000)
+            else:
+                display_df = result_df
+
+            st.dataframe(display_df, use_container_width=True)
+
+            # Quick statistics
+            if len(result_df.select_dtypes(include=[np.number]).columns) > 0:
+                st.markdown("#### 📊 Quick Statistics")
+                st.dataframe(result_df.describe(), use_container_width=True)
+
+            # Download results
+            dl1, dl2 = st.columns(2)
+            with dl1:
+                csv = result_df.to_csv(index=False)
+                st.download_button(
+                    label="📥 Download Results (CSV)",
+                    data=csv,
+                    file_name=f"query_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                    mime="text/csv"
+                )
+
+            with dl2:
+                json_data = result_df.to_json(orient='records', date_format='iso')
+                st.download_button(
+                    label="📥 Download Results (JSON)",
+                    data=json_data,
+                    file_name=f"query_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                    mime="application/json"
+                )
+
+        if execute:
+            if not query.strip():
+                st.warning("Please enter a SQL query.")
+            elif use_mirror:
+                old_job = st.session_state.pop("_sql_job", None)
+                if old_job is not None:
+                    governor.cancel(old_job)
+                if profile:
+                    st.info("ℹ️ Plan profiling is only available for PostgreSQL queries.")
+                with st.spinner("Executing query..."):
+                    start_time = time.time()
+                    result_df = db_manager.query_mirror_df(query)
+                    show_results(result_df, time.time() - start_time, result_df.attrs.get("truncated"))
+            else:
+                try:
+                    sql = explain_statement(query) if profile else query
+                    old_job = st.session_state.pop("_sql_job", None)
+                    if old_job is not None:
+                        governor.cancel(old_job)
+                    st.session_state["_sql_job"] = governor.submit(db_manager.pool.pick(), sql)
+                    st.session_state["_sql_profile"] = query if profile else None
+                except ConcurrencyLimitExceeded as e:
+                    st.warning(f"⚠️ {e}")
+
+        job = st.session_state.get("_sql_job")
+        if job is not None and not job.done():
+            status = st.empty()
+            # Clicking reruns the script, which interrupts the wait loop below
+            if st.button("⏹ Cancel Query"):
+                governor.cancel(job)
+            while not job.done():
+                status.info(f"⏳ Running for {job.elapsed:.1f}s, {job.rows:,} rows fetched...")
+                job.wait(0.5)
+            status.empty()
+
+        if job is not None and job.done():
+            profiled = st.session_state.get("_sql_profile")
+            if job.status == "finished" and profiled:
+                plan = parse_plan(job.result)
+                history = get_plan_history()
+                # Record each run once, not on every rerun that redraws it
+                if st.session_state.get("_sql_profile_recorded") != job.id:
+                    history.record(profiled, plan)
+                    st.session_state["_sql_profile_recorded"] = job.id
+                viz.plot_query_plan(plan, history.runs(profiled))
+            elif job.status == "finished":
+                show_results(job.result, job.elapsed, job.truncated)
+            elif job.status == "cancelled":
+                st.warning("⏹ Query cancelled.")
+            elif job.status == "timed_out":
+                st.error(f"❌ Query exceeded the {governor.statement_timeout:.0f}s statement timeout.")
+            else:
+                st.error(f"❌ Query execution failed: {job.error}")
+
     with tab5:
         if show_advanced:
             st.markdown("### 🔍 Advanced Analytics")
@@ -1283,6 +1793,68 @@ def create_dashboard():
 
             with st.spinner("Loading cross-table analysis..."):
                 try:
+                    # The three summaries are independent: run them concurrently
+                    executor = get_executor()
+                    run = db_manager.query_mirror_df if use_mirror else db_manager.query_df
+                    futures = {
+                        "feedback": executor.submit(run, """
+                        SELECT
+                            COUNT(*) as total_feedback,
+                            ROUND(AVG(rating), 2) as avg_rating,
+                            COUNT(DISTINCT email) as unique_users,
+                            COUNT(CASE WHEN rating >= 4 THEN 1 END) as positive_feedback,
+                            COUNT(CASE WHEN rating <= 2 THEN 1 END) as negative_feedback
+                        FROM chat_feedback
+                        WHERE created_at >= CURRENT_DATE - INTERVAL '30 days';
+                        """),
+                        "otp": executor.submit(run, """
+                        SELECT
+                            COUNT(*) as total_otps,
+                            COUNT(DISTINCT user_id) as unique_users,
+                            ROUND(AVG(CASE WHEN is_used = true THEN 1.0 ELSE 0.0 END) * 100, 1) as usage_rate,
+                            COUNT(CASE WHEN is_used = true THEN 1 END) as used_otps,
+                            COUNT(CASE WHEN is_used = false THEN 1 END) as unused_otps
+                        FROM otps
+                        WHERE created_at >= CURRENT_DATE - INTERVAL '30 days';
+                        """),
+                    }
+                    if db_manager.rollups().ready and not use_mirror:
+                        # Same 30 days from the hourly rollups: O(days) instead of O(rows)
+                        last_30 = (datetime.now().date() - timedelta(days=30), datetime.now().date())
+                        futures["feedback_daily"] = executor.submit(db_manager.aggregate, feedback_trend(), last_30)
+                        futures["otp_daily"] = executor.submit(db_manager.aggregate, otp_trend(), last_30)
+                    else:
+                        futures["daily"] = executor.submit(run, """
+                        WITH feedback_daily AS (
+                            SELECT
+                                DATE(created_at) as date,
+                                COUNT(*) as feedback_count,
+                                AVG(rating) as avg_rating
+                            FROM chat_feedback
+                            WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
+                            GROUP BY DATE(created_at)
+                        ),
+                        otp_daily AS (
+                            SELECT
+                                DATE(created_at) as date,
+                                COUNT(*) as otp_count,
+                                ROUND(AVG(CASE WHEN is_used = true THEN 1.0 ELSE 0.0 END) * 100, 1) as usage_rate
+                            FROM otps
+                            WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
+                            GROUP BY DATE(created_at)
+                        )
+                        SELECT
+                            COALESCE(f.date, o.date) as date,
+                            COALESCE(f.feedback_count, 0) as feedback_count,
+                            COALESCE(f.avg_rating, 0) as avg_rating,
+                            COALESCE(o.otp_count, 0) as otp_count,
+                            COALESCE(o.usage_rate, 0) as usage_rate
+                        FROM feedback_daily f
+                        FULL OUTER JOIN otp_daily o ON f.date = o.date
+                        ORDER BY date DESC
+                        LIMIT 30;
+                        """)
+
                     # Since OTP table uses user_id instead of email, show separate analysis
                     st.info("📊 Note: OTP table uses user_id rather than email. Showing separate analysis for each table.")
 
@@ -1290,16 +1862,7 @@ def create_dashboard():
 
                     with col1:
                         st.markdown("#### 💬 Chat Feedback Analysis")
-                        feedback_analysis = db_manager.query_df("""
-                            SELECT
-                                COUNT(*) as total_feedback,
-                                ROUND(AVG(rating), 2) as avg_rating,
-                                COUNT(DISTINCT email) as unique_users,
-                                COUNT(CASE WHEN rating >= 4 THEN 1 END) as positive_feedback,
-                                COUNT(CASE WHEN rating <= 2 THEN 1 END) as negative_feedback
-                            FROM chat_feedback
-                            WHERE created_at >= CURRENT_DATE - INTERVAL '30 days';
-                        """)
+                        feedback_analysis = futures["feedback"].result()
 
                         if not feedback_analysis.empty:
                             for _, row in feedback_analysis.iterrows():
@@ -1311,16 +1874,7 @@ def create_dashboard():
 
                     with col2:
                         st.markdown("#### 🔐 OTP Analysis")
-                        otp_analysis = db_manager.query_df("""
-                            SELECT
-                                COUNT(*) as total_otps,
-                                COUNT(DISTINCT user_id) as unique_users,
-                                ROUND(AVG(CASE WHEN is_used = true THEN 1.0 ELSE 0.0 END) * 100, 1) as usage_rate,
-                                COUNT(CASE WHEN is_used = true THEN 1 END) as used_otps,
-                                COUNT(CASE WHEN is_used = false THEN 1 END) as unused_otps
-                            FROM otps
-                            WHERE created_at >= CURRENT_DATE - INTERVAL '30 days';
-                        """)
+                        otp_analysis = futures["otp"].result()
 
                         if not otp_analysis.empty:
                             for _, row in otp_analysis.iterrows():
@@ -1332,36 +1886,18 @@ def create_dashboard():
                     # Daily trends comparison
                     st.markdown("#### 📈 Daily Activity Comparison")
 
-                    daily_trends = db_manager.query_df("""
-                        WITH feedback_daily AS (
-                            SELECT
-                                DATE(created_at) as date,
-                                COUNT(*) as feedback_count,
-                                AVG(rating) as avg_rating
-                            FROM chat_feedback
-                            WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
-                            GROUP BY DATE(created_at)
-                        ),
-                        otp_daily AS (
-                            SELECT
-                                DATE(created_at) as date,
-                                COUNT(*) as otp_count,
-                                ROUND(AVG(CASE WHEN is_used = true THEN 1.0 ELSE 0.0 END) * 100, 1) as usage_rate
-                            FROM otps
-                            WHERE created_at >= CURRENT_DATE - INTERVAL '30 days'
-                            GROUP BY DATE(created_at)
-                        )
-                        SELECT
-                            COALESCE(f.date, o.date) as date,
-                            COALESCE(f.feedback_count, 0) as feedback_count,
-                            COALESCE(f.avg_rating, 0) as avg_rating,
-                            COALESCE(o.otp_count, 0) as otp_count,
-                            COALESCE(o.usage_rate, 0) as usage_rate
-                        FROM feedback_daily f
-                        FULL OUTER JOIN otp_daily o ON f.date = o.date
-                        ORDER BY date DESC
-                        LIMIT 30;
-                    """)
+                    if "daily" in futures:
+                        daily_trends = futures["daily"].result()
+                    else:
+                        # reindex keeps the merge valid when one aggregate failed and came back empty
+                        feedback_daily = futures["feedback_daily"].result().reindex(
+                            columns=['bucket', 'count', 'avg_rating']).rename(
+                            columns={'bucket': 'date', 'count': 'feedback_count'})
+                        otp_daily = futures["otp_daily"].result().reindex(
+                            columns=['date', 'total_count', 'usage_rate']).rename(columns={'total_count': 'otp_count'})
+                        otp_daily['usage_rate'] = (otp_daily['usage_rate'] * 100).round(1)
+                        daily_trends = (feedback_daily.merge(otp_daily, on='date', how='outer').fillna(0)
+                                        .sort_values('date', ascending=False).head(30))
 
                     if not daily_trends.empty:
                         # Create comparison chart
@@ -0,0 +1,70 @@
+"""Compare full-table extraction paths: pd.read_sql vs COPY ... TO STDOUT.
+
+Uses the same DB_* environment variables as the dashboards::
+
+    python benchmarks/bench_extract.py --table chat_feedback --table otps --repeat 3
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.db import copy_query_df, get_pool  # noqa: E402
+
+
+def _config():
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": int(os.getenv("DB_PORT", "5432")),
+        "user": os.getenv("DB_USER", "postgres"),
+        "password": os.getenv("DB_PASSWORD", "postgres"),
+        "database": os.getenv("DB_NAME", "postgres"),
+    }
+
+
+def _read_sql(conn, query):
+    return pd.read_sql(query, conn)
+
+
+def _copy(conn, query):
+    return copy_query_df(conn, query)
+
+
+def run(tables, repeat, limit):
+    pool = get_pool(_config())
+    methods = {"read_sql": _read_sql, "copy": _copy}
+    print(f"{'table':<24}{'method':<10}{'rows':>12}{'best s':>10}{'rows/s':>14}")
+    for table in tables:
+        query = f'SELECT * FROM "{table}"'
+        if limit:
+            query += f" LIMIT {int(limit)}"
+        for name, fn in methods.items():
+            timings = []
+            rows = 0
+            for _ in range(repeat):
+                with pool.connection() as conn:
+                    started = time.perf_counter()
+                    df = fn(conn, query)
+                    timings.append(time.perf_counter() - started)
+                rows = len(df)
+            best = min(timings)
+            rate = rows / best if best > 0 else float("inf")
+            print(f"{table:<24}{name:<10}{rows:>12,}{best:>10.3f}{rate:>14,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--table", action="append", help="table to extract (repeatable)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+    run(args.table or ["chat_feedback", "otps"], args.repeat, args.limit)
+
+
+if __name__ == "__main__":
+    main()
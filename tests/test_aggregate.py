@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from utils.aggregate import daily_counts, feedback_summary, null_counts, top_values
+
+
+def test_top_values_orders_by_count_and_limits():
+    sql, params = top_values("chat_feedback", "user_agent", 10).compile()
+    assert sql == ('SELECT COALESCE("user_agent"::text, \'(Missing)\') AS "user_agent", COUNT(*) AS "count" '
+                   'FROM "chat_feedback" GROUP BY 1 ORDER BY "count" DESC, 1 LIMIT 10')
+    assert params == {}
+    assert top_values("chat_feedback", "user_agent", 10) != top_values("chat_feedback", "user_agent", 20)
+
+
+def test_summaries_are_one_row_without_group_by():
+    sql, _ = null_counts("otps", ["id", "user_id"]).compile()
+    assert sql == 'SELECT COUNT(*) - COUNT("id") AS "id", COUNT(*) - COUNT("user_id") AS "user_id" FROM "otps"'
+
+    sql, _ = feedback_summary(["id", "rating", "created_at"]).compile()
+    assert '"avg_rating"' in sql and '"latest"' in sql
+    assert '"unique_users"' not in sql and "GROUP BY" not in sql
+
+
+def test_daily_counts_filters_the_range_on_created_at():
+    start, end = datetime(2024, 1, 1), datetime(2024, 2, 1)
+    sql, params = daily_counts("otps", "updated_at").compile(start, end)
+    assert "date_trunc('day', \"updated_at\") AS \"bucket\"" in sql
+    assert '("created_at" >= %(from)s) AND ("created_at" < %(to)s)' in sql
+    assert params == {"from": start, "to": end}
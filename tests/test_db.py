@@ -0,0 +1,59 @@
+import pytest
+
+from utils.db import referenced_tables, split_statements, to_positional
+
+
+def test_to_positional_numbers_each_name_once():
+    sql, names = to_positional("SELECT * FROM t WHERE a = %(a)s AND b > %(b)s OR a = %(a)s")
+    assert sql == "SELECT * FROM t WHERE a = $1 AND b > $2 OR a = $1"
+    assert names == ["a", "b"]
+
+
+def test_to_positional_unescapes_literal_percent():
+    sql, names = to_positional("SELECT * FROM t WHERE s LIKE 'a%%' AND id = %(id)s")
+    assert sql == "SELECT * FROM t WHERE s LIKE 'a%' AND id = $1"
+    assert names == ["id"]
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM chat_feedback", (("public", "chat_feedback"),)),
+    ('SELECT * FROM "Sales"."Orders" o JOIN public.otps p ON p.id = o.id',
+     (("Sales", "Orders"), ("public", "otps"))),
+    ("WITH recent AS (SELECT * FROM otps) SELECT * FROM recent", (("public", "otps"),)),
+    ("SELECT a, b FROM t WHERE x IN (1, 2) ORDER BY a, b", (("public", "t"),)),
+    ("SELECT * FROM a JOIN b USING (id) GROUP BY a.x, b.y", (("public", "a"), ("public", "b"))),
+    ("SELECT 1", None),
+])
+def test_referenced_tables(sql, expected):
+    assert referenced_tables(sql) == expected
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM t WHERE created_at > now() - interval '1 day'",
+    "SELECT random() FROM t",
+    "SELECT * FROM t WHERE created_at > statement_timestamp() - interval '1 hour'",
+    "SELECT transaction_timestamp(), timeofday() FROM t",
+    "SELECT nextval('t_id_seq'), gen_random_uuid() FROM t",
+    "SELECT * FROM t WHERE created_at >= 'today'",
+    "SELECT * FROM t WHERE created_at < 'NOW'::timestamp",
+    "SELECT * FROM a, b WHERE a.id = b.id",
+    "SELECT * FROM a JOIN b ON a.id = b.id, c",
+    "SELECT * FROM (SELECT * FROM a) x, b",
+])
+def test_referenced_tables_refuses_what_it_cannot_follow(sql):
+    assert referenced_tables(sql) is None
+
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT 1; COMMIT; DELETE FROM otps", ["SELECT 1", "COMMIT", "DELETE FROM otps"]),
+    ("SELECT ';' AS a, 'it''s; fine';", ["SELECT ';' AS a, 'it''s; fine'"]),
+    ("SELECT E'a\\';' ; SELECT 2", ["SELECT E'a\\';'", "SELECT 2"]),
+    ('SELECT "odd;name" FROM t', ['SELECT "odd;name" FROM t']),
+    ("SELECT $$a;b$$, $fn$;$fn$", ["SELECT $$a;b$$, $fn$;$fn$"]),
+    ("SELECT 1 -- ; not a break\n; /* nested /* ; */ ; */", ["SELECT 1 -- ; not a break"]),
+    ("SELECT $1; DROP TABLE t", ["SELECT $1", "DROP TABLE t"]),
+    ("  ;  -- only a comment", []),
+])
+def test_split_statements(sql, expected):
+    assert split_statements(sql) == expected
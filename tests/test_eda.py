@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.eda import daily_usage_chunked, reservoir_sample_chunked, value_counts_chunked
+
+
+def _chunks(rows, size):
+    frame = pd.DataFrame({"id": range(rows), "value": [f"v{i}" for i in range(rows)]})
+    return [frame.iloc[i:i + size] for i in range(0, rows, size)]
+
+
+def test_reservoir_keeps_n_distinct_rows_in_stream_order():
+    sample = reservoir_sample_chunked(_chunks(1000, 64), 50, seed=1)
+    assert len(sample) == 50
+    assert sample["id"].is_unique
+    assert sample["id"].is_monotonic_increasing
+    assert list(sample.columns) == ["id", "value"]
+    assert (sample["value"] == "v" + sample["id"].astype(str)).all()
+
+
+def test_reservoir_is_repeatable_per_seed():
+    first = reservoir_sample_chunked(_chunks(500, 50), 20, seed=7)
+    again = reservoir_sample_chunked(_chunks(500, 50), 20, seed=7)
+    other = reservoir_sample_chunked(_chunks(500, 50), 20, seed=8)
+    assert first.equals(again)
+    assert not first.equals(other)
+
+
+def test_reservoir_returns_everything_when_stream_is_short():
+    sample = reservoir_sample_chunked(_chunks(30, 8), 100, seed=0)
+    assert list(sample["id"]) == list(range(30))
+
+
+def test_reservoir_empty_stream_keeps_columns():
+    empty = pd.DataFrame({"id": pd.Series(dtype="int64"), "value": pd.Series(dtype=object)})
+    sample = reservoir_sample_chunked([empty], 10)
+    assert sample.empty and list(sample.columns) == ["id", "value"]
+
+
+def test_reservoir_is_roughly_uniform():
+    hits = np.zeros(100)
+    for seed in range(400):
+        hits[reservoir_sample_chunked(_chunks(100, 16), 10, seed=seed)["id"]] += 1
+    # Each row is expected 40 times; chunk position must not matter
+    assert hits.min() > 15 and hits.max() < 70
+    assert abs(hits[:50].sum() - hits[50:].sum()) < 400
+
+
+def test_reservoir_rejects_empty_sample_size():
+    with pytest.raises(ValueError):
+        reservoir_sample_chunked(_chunks(10, 5), 0)
+
+
+def test_value_counts_chunked_matches_a_single_pass():
+    ratings = pd.DataFrame({"rating": [5, 4, 5, None, 1, 5, 4] * 30})
+    chunks = [ratings.iloc[i:i + 16] for i in range(0, len(ratings), 16)]
+    expected = ratings["rating"].value_counts().astype("int64").sort_index()
+    pd.testing.assert_series_equal(value_counts_chunked(chunks, "rating"), expected, check_names=False)
+    assert value_counts_chunked([pd.DataFrame(columns=["rating"])], "rating").empty
+
+
+def test_daily_usage_chunked_merges_days_split_across_chunks():
+    stamps = pd.to_datetime(["2024-01-01 22:00", "2024-01-01 23:30", "2024-01-02 00:30"]).tz_localize("UTC")
+    first = pd.DataFrame({"created_at": stamps[:1], "is_used": [True]})
+    second = pd.DataFrame({"created_at": stamps[1:].tz_convert("Africa/Lagos"), "is_used": [False, None]})
+    daily = daily_usage_chunked([first, second])
+    assert list(daily["date"]) == list(pd.to_datetime(["2024-01-01", "2024-01-02"]))
+    assert list(daily["used_count"]) == [1, 0]
+    assert list(daily["total_count"]) == [2, 1]
+    assert list(daily["usage_rate"]) == [0.5, 0.0]
@@ -0,0 +1,63 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import psycopg2 as pg_dialect
+
+from utils.db import execute_prepared
+from utils.fulltext import build_tsquery, highlight_html, match_sql, search_page_sql
+
+
+class FakeCursor:
+    """Records statements and %-formats their params like psycopg2 would"""
+
+    def __init__(self):
+        self.connection = type("Conn", (), {})()
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        if params is not None:
+            sql = sql % {k: repr(v) for k, v in params.items()}
+        self.statements.append(sql)
+
+
+def _bound(sql):
+    # What app.fetch_prepared hands to execute_prepared
+    return str(text(sql).compile(dialect=pg_dialect.dialect()))
+
+
+@pytest.mark.parametrize("anchor", [
+    {"mode": "first"},
+    {"mode": "older", "rank": 0.5, "id": 10},
+    {"mode": "newer", "rank": 0.5, "id": 10},
+])
+def test_ranked_search_page_binds_every_placeholder(anchor):
+    params = {"tsq": build_tsquery("refund policy"), "msg_type": "user"}
+    where_sql = f"{match_sql()} AND message_type = :msg_type"
+    sql, page_params, order = search_page_sql("public", where_sql, params, 50, anchor, candidates=1000)
+
+    cur = FakeCursor()
+    execute_prepared(cur, _bound(sql), page_params)
+
+    assert cur.statements[0].startswith("PREPARE dash_")
+    assert "LIMIT $" in cur.statements[0]
+    assert cur.statements[-1].startswith("EXECUTE dash_")
+    assert "1000" in cur.statements[-1] and "51" in cur.statements[-1]
+    assert order == ("ASC" if anchor["mode"] == "newer" else "DESC")
+    assert params == {"tsq": "refund & policy", "msg_type": "user"}  # caller's dict untouched
+
+
+@pytest.mark.parametrize("text_in, expected", [
+    ("refund policy", "refund & policy"),
+    ('"late delivery"', "(late <-> delivery)"),
+    ("refun*", "refun:*"),
+    ("refund -card", "refund & !card"),
+    ("refund OR return", "refund | return"),
+    ("OR refund", "refund"),
+    ("&|!():*", ""),
+    ("", ""),
+])
+def test_build_tsquery(text_in, expected):
+    assert build_tsquery(text_in) == expected
+
+
+def test_highlight_html_escapes_before_marking():
+    assert highlight_html("<b>⟦refund⟧</b>") == "&lt;b&gt;<mark>refund</mark>&lt;/b&gt;"
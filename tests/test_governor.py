@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+
+from utils.governor import QueryGovernor, QueryJob
+
+
+class UnusedPool:
+    checkouts = 0
+
+    @contextmanager
+    def connection(self):
+        self.checkouts += 1
+        raise AssertionError("no connection should be taken")
+        yield
+
+
+def test_multiple_statements_are_rejected_before_connecting():
+    pool = UnusedPool()
+    job = QueryJob("SELECT 1; COMMIT; DELETE FROM otps", "tester")
+    QueryGovernor()._run(job, pool, None)
+    assert job.status == "failed"
+    assert "one SQL statement, got 3" in job.error
+    assert pool.checkouts == 0
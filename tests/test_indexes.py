@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+
+from utils.indexes import IndexNeed, _covering_index
+
+
+def _indexes(*rows):
+    columns = ["index_name", "method", "columns", "definition", "is_partial"]
+    return pd.DataFrame([dict(zip(columns, row)) for row in rows], columns=columns)
+
+
+def test_index_need_ddl_per_method():
+    assert IndexNeed("chat_messages", ("timestamp", "id")).ddl("public") == (
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_chat_messages_timestamp_id" '
+        'ON "public"."chat_messages" USING btree ("timestamp", "id");'
+    )
+    assert IndexNeed("otps", ("created_at",), "brin").ddl("app").endswith(
+        '"idx_otps_created_at_brin" ON "app"."otps" USING brin ("created_at");'
+    )
+    assert 'USING gin ("session_id" gin_trgm_ops)' in IndexNeed("chat_messages", ("session_id",), "gin_trgm").ddl("public")
+    fts = IndexNeed("chat_messages", ("content",), "gin_fts").ddl("public")
+    assert '"idx_chat_messages_content_fts"' in fts and "to_tsvector" in fts
+
+
+def test_index_need_name_fits_identifier_limit():
+    need = IndexNeed("a_rather_long_table_name", ("first_long_column", "second_long_column", "third"))
+    assert len(need.name) <= 63
+
+
+def test_index_need_rejects_unknown_method():
+    with pytest.raises(ValueError):
+        IndexNeed("otps", ("id",), "hash")
+
+
+def test_covering_index_btree_prefixes():
+    need = IndexNeed("chat_messages", ("timestamp", "id"))
+    full = ("ix_full", "btree", ['"timestamp"', "id", "session_id"], "CREATE INDEX ...", False)
+    lead = ("ix_lead", "btree", ["timestamp"], "CREATE INDEX ...", False)
+    assert _covering_index(need, _indexes(lead, full)) == ("covered", "ix_full")
+    assert _covering_index(need, _indexes(lead)) == ("partial", "ix_lead")
+    assert _covering_index(need, _indexes()) == ("missing", None)
+
+
+def test_covering_index_ignores_partial_indexes():
+    need = IndexNeed("otps", ("user_id",))
+    partial = ("ix_unused", "btree", ["user_id"], "CREATE INDEX ... WHERE NOT is_used", True)
+    assert _covering_index(need, _indexes(partial)) == ("missing", None)
+
+
+def test_covering_index_brin_is_served_by_btree_or_brin():
+    need = IndexNeed("otps", ("created_at",), "brin")
+    assert _covering_index(need, _indexes(("ix_b", "btree", ["created_at"], "", False)))[0] == "covered"
+    assert _covering_index(need, _indexes(("ix_r", "brin", ["created_at"], "", False)))[0] == "covered"
+
+
+def test_covering_index_gin_needs_matching_opclass():
+    trgm = IndexNeed("chat_messages", ("content",), "gin_trgm")
+    fts = IndexNeed("chat_messages", ("content",), "gin_fts")
+    trgm_ix = ("ix_trgm", "gin", ["content"], "USING gin (content gin_trgm_ops)", False)
+    fts_ix = ("ix_fts", "gin", ["to_tsvector('simple'::regconfig, content)"],
+              "USING gin (to_tsvector('simple'::regconfig, content))", False)
+    assert _covering_index(trgm, _indexes(trgm_ix)) == ("covered", "ix_trgm")
+    assert _covering_index(trgm, _indexes(fts_ix)) == ("missing", None)
+    assert _covering_index(fts, _indexes(fts_ix)) == ("covered", "ix_fts")
+    assert _covering_index(fts, _indexes(trgm_ix)) == ("missing", None)
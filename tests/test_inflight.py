@@ -0,0 +1,73 @@
+import threading
+
+from utils import inflight
+from utils.inflight import InflightQueries
+
+
+class FakeConn:
+    def __init__(self, registry=None):
+        self.cancelled = 0
+        self.registry = registry
+        self.saw_lock_free = None
+
+    def cancel(self):
+        if self.registry is not None:
+            self.saw_lock_free = self.registry._lock.acquire(blocking=False)
+            if self.saw_lock_free:
+                self.registry._lock.release()
+        self.cancelled += 1
+
+
+def _register(registry, conn, scope):
+    token = inflight._current_scope.set(scope)
+    try:
+        registry.register(conn)
+    finally:
+        inflight._current_scope.reset(token)
+
+
+def test_supersede_cancels_only_other_keys_outside_the_lock():
+    registry = InflightQueries()
+    old, current, other = FakeConn(registry), FakeConn(), FakeConn()
+    _register(registry, old, ("s1", "page", 1))
+    _register(registry, current, ("s1", "page", 2))
+    _register(registry, other, ("s2", "page", 1))
+    assert registry.supersede("s1", "page", 2) == 1
+    assert (old.cancelled, current.cancelled, other.cancelled) == (1, 0, 0)
+    assert old.saw_lock_free
+    assert registry.stats()["in_flight"] == 2
+
+
+def test_release_waits_for_a_pending_cancel():
+    registry = InflightQueries()
+    sending = threading.Event()
+    proceed = threading.Event()
+
+    class SlowConn(FakeConn):
+        def cancel(self):
+            sending.set()
+            proceed.wait(5)
+            super().cancel()
+
+    conn = SlowConn()
+    _register(registry, conn, ("s1", "page", 1))
+    canceller = threading.Thread(target=registry.supersede, args=("s1", "page", 2))
+    canceller.start()
+    assert sending.wait(5)
+    released = threading.Event()
+    releaser = threading.Thread(target=lambda: (registry.unregister(conn), released.set()))
+    releaser.start()
+    assert not released.wait(0.1)
+    proceed.set()
+    assert released.wait(5)
+    canceller.join(5)
+    releaser.join(5)
+    assert conn.cancelled == 1
+
+
+def test_latest_keys_are_bounded(monkeypatch):
+    monkeypatch.setattr(inflight, "MAX_SCOPES", 3)
+    registry = InflightQueries()
+    for session in range(5):
+        registry.supersede(f"s{session}", "page", 1)
+    assert list(registry._latest) == [("s2", "page"), ("s3", "page"), ("s4", "page")]
@@ -0,0 +1,60 @@
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+from utils.mirror import DuckDBMirror, mirror_path, pg_target  # noqa: E402
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    mirror = DuckDBMirror(str(tmp_path / "mirror.duckdb"), tables={})
+    mirror._con.execute('CREATE TABLE "public"."events" AS SELECT range AS id FROM range(50000)')
+    return mirror
+
+
+def test_query_arrow_runs_a_select_against_the_schema(mirror):
+    table, truncated = mirror.query_arrow("SELECT COUNT(*) AS n FROM events;")
+    assert table.to_pydict() == {"n": [50000]}
+    assert truncated is None
+
+
+def test_query_arrow_stops_at_the_row_limit(mirror):
+    table, truncated = mirror.query_arrow("SELECT * FROM events", max_rows=25000)
+    assert table.num_rows == 25000
+    assert truncated == "row limit (25,000 rows)"
+    table, truncated = mirror.query_arrow("SELECT * FROM events LIMIT 10", max_rows=10)
+    assert table.num_rows == 10 and truncated is None
+
+
+@pytest.mark.parametrize("sql", [
+    "DELETE FROM events",
+    "SELECT 1; DROP TABLE events",
+    "COPY events TO 'out.csv'",
+    "ATTACH 'other.duckdb'",
+    "INSTALL httpfs",
+    "SET enable_external_access = true",
+])
+def test_query_arrow_rejects_anything_but_one_select(mirror, sql):
+    with pytest.raises(ValueError):
+        mirror.query_arrow(sql)
+    assert mirror.query_arrow("SELECT COUNT(*) AS n FROM events")[0].num_rows == 1
+
+
+def test_query_arrow_cannot_read_host_files(mirror, tmp_path):
+    secret = tmp_path / ".env"
+    secret.write_text("DB_PASSWORD=hunter2")
+    with pytest.raises(duckdb.Error):
+        mirror.query_arrow(f"SELECT * FROM read_text('{secret}')")
+
+
+def test_query_arrow_times_out(mirror):
+    with pytest.raises(TimeoutError):
+        mirror.query_arrow("SELECT COUNT(*) FROM range(100000000000)", timeout=0.2)
+
+
+def test_pg_target_reads_the_dashboards_database_key():
+    dashboard = {"host": "db", "port": 5432, "user": "admin", "password": "x", "database": "miva_ai_db"}
+    url_style = {"host": "db", "port": 5432, "user": "admin", "password": "x", "dbname": "miva_ai_db"}
+    assert pg_target(dashboard) == pg_target(url_style) == "admin@db:5432/miva_ai_db"
+    other = dict(dashboard, database="staging")
+    assert mirror_path(pg_target(dashboard)) != mirror_path(pg_target(other))
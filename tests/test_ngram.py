@@ -0,0 +1,34 @@
+import pytest
+
+from utils.ngram import NgramIndex, contains_pattern
+
+
+@pytest.mark.parametrize("term, expected", [
+    ("refund", "%refund%"),
+    ("50%", "%50\\%%"),
+    ("user_id", "%user\\_id%"),
+    ("C:\\temp", "%C:\\\\temp%"),
+])
+def test_contains_pattern_escapes_like_wildcards(term, expected):
+    assert contains_pattern(term) == expected
+
+
+def test_ngram_search_matches_substrings_case_insensitively():
+    index = NgramIndex(["Refund please", "no REFUNDS", "thanks", None, "ok"], labels=[10, 11, 12, 13, 14])
+    assert index.search("refund") == [10, 11]
+    assert index.search("FUND") == [10, 11]
+    assert index.search("xyz") == []
+    assert len(index) == 5
+
+
+def test_ngram_search_verifies_candidates():
+    # Every trigram of "abcd" occurs in the first row, but not the substring itself
+    index = NgramIndex(["abc bcd", "abcd"])
+    assert index.search("abcd") == [1]
+
+
+def test_ngram_search_short_terms_include_short_values():
+    index = NgramIndex(["ok", "okay", "no", ""])
+    assert index.search("ok") == [0, 1]
+    assert index.search("o") == [0, 1, 2]
+    assert index.search("") == [0, 1, 2, 3]
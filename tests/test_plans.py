@@ -0,0 +1,71 @@
+import pytest
+
+from utils.plans import compare_nodes, plan_nodes
+
+
+def _plan(scan_ms=8.0, loops=1, scan_type="Seq Scan", execution_ms=10.0):
+    return {
+        "Execution Time": execution_ms,
+        "Plan": {
+            "Node Type": "Hash Join",
+            "Plan Rows": 100,
+            "Actual Rows": 90,
+            "Actual Loops": 1,
+            "Actual Total Time": 10.0,
+            "Shared Hit Blocks": 50,
+            "Shared Read Blocks": 10,
+            "Plans": [
+                {
+                    "Node Type": scan_type,
+                    "Relation Name": "chat_messages",
+                    "Plan Rows": 10,
+                    "Actual Rows": 500,
+                    "Actual Loops": loops,
+                    "Actual Total Time": scan_ms / loops,
+                    "Shared Hit Blocks": 40,
+                    "Shared Read Blocks": 10,
+                },
+                {
+                    "Node Type": "Hash",
+                    "Plan Rows": 5,
+                    "Actual Rows": 5,
+                    "Actual Loops": 1,
+                    "Actual Total Time": 1.0,
+                },
+            ],
+        },
+    }
+
+
+def test_plan_nodes_flattens_in_tree_order():
+    nodes = plan_nodes(_plan())
+    assert list(nodes["node"]) == ["Hash Join", "Seq Scan on chat_messages", "Hash"]
+    assert list(nodes["depth"]) == [0, 1, 1]
+    assert list(nodes["parent"].fillna(-1)) == [-1, 0, 0]
+
+
+def test_plan_nodes_self_time_and_buffers_exclude_children():
+    nodes = plan_nodes(_plan()).set_index("node")
+    assert nodes.at["Hash Join", "self_ms"] == pytest.approx(1.0)
+    assert nodes.at["Seq Scan on chat_messages", "self_ms"] == pytest.approx(8.0)
+    assert nodes.at["Hash Join", "self_shared_hit"] == 10
+    assert nodes.at["Seq Scan on chat_messages", "time_share"] == pytest.approx(0.8)
+
+
+def test_plan_nodes_scales_by_loops_and_flags_misestimates():
+    nodes = plan_nodes(_plan(loops=4)).set_index("node")
+    scan = nodes.loc["Seq Scan on chat_messages"]
+    assert scan["total_ms"] == pytest.approx(8.0)
+    assert scan["actual_rows"] == 2000 and scan["est_rows"] == 40
+    assert scan["misestimate"] == pytest.approx(50.0)
+
+
+def test_compare_nodes_reports_per_node_changes():
+    diff = compare_nodes(_plan(scan_ms=8.0), _plan(scan_ms=4.0, execution_ms=6.0))
+    scan = diff.set_index("node").loc["Seq Scan on chat_messages"]
+    assert scan["self_ms_before"] == pytest.approx(8.0)
+    assert scan["self_ms_change"] == pytest.approx(-4.0)
+
+
+def test_compare_nodes_returns_none_when_plan_shape_changes():
+    assert compare_nodes(_plan(), _plan(scan_type="Index Scan")) is None
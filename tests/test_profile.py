@@ -0,0 +1,21 @@
+from utils.profile import profile_sql
+
+
+def test_profile_sql_selects_per_column_kind():
+    sql = profile_sql("public", "chat_feedback", [
+        ("rating", "integer"), ("comment", "text"), ("is_used", "boolean"), ("meta", "json"),
+    ])
+    assert sql.startswith('SELECT COUNT(*) AS "rows", ')
+    assert sql.endswith('FROM "public"."chat_feedback"')
+    assert 'MIN("rating")::text AS "c0_min"' in sql and '"c0_min_len"' not in sql
+    assert 'AVG(length("comment"::text))::float8 AS "c1_avg_len"' in sql
+    assert 'MAX("is_used"::int)::text AS "c2_max"' in sql
+    assert '"c3_min"' not in sql and 'MAX(length("meta"::text)) AS "c3_max_len"' in sql
+    assert "DISTINCT" not in sql
+
+
+def test_profile_sql_exact_distinct_compares_json_as_text():
+    sql = profile_sql("public", "t", [("id", "bigint"), ("meta", "json"), ("blob", "bytea")], exact_distinct=True)
+    assert 'COUNT(DISTINCT "id") AS "c0_distinct"' in sql
+    assert 'COUNT(DISTINCT "meta"::text) AS "c1_distinct"' in sql
+    assert 'MIN(octet_length("blob")) AS "c2_min_len"' in sql
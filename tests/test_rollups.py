@@ -0,0 +1,46 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from utils.rollups import FEEDBACK_HOURLY, RollupManager
+
+
+class ScriptedCursor:
+    """Answers the fetchone() calls of one _refresh_one pass in order"""
+
+    def __init__(self, *rows):
+        self.rows = list(rows)
+        self.executed = []
+        self.rowcount = 3
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+
+NEWEST = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("state, mode", [
+    ((7, False), "incremental"),
+    ((5, False), "full (source rows deleted)"),
+    (None, "full (source rows deleted)"),
+    ((7, True), "full (scheduled)"),
+])
+def test_refresh_rebuilds_on_deletes_and_schedule(state, mode):
+    cur = ScriptedCursor((True,), (7,), state, (NEWEST,))
+    result = RollupManager(pool=None, enabled=True)._refresh_one(cur, FEEDBACK_HOURLY, force=False)
+    assert result["mode"] == mode
+    deletes = [sql for sql in cur.executed if sql.startswith("DELETE FROM")]
+    assert deletes == ['DELETE FROM "public"."dash_feedback_hourly"' + (
+        " WHERE bucket >= %(since)s" if mode == "incremental" else "")]
+
+
+def test_disabled_manager_never_touches_the_database():
+    manager = RollupManager(pool=None, enabled=False)
+    manager.start()
+    assert manager._thread is None and not manager.ready
+    with pytest.raises(RuntimeError):
+        manager.refresh()
@@ -0,0 +1,87 @@
+import pytest
+
+import utils.routing as routing
+from utils.db import PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, row):
+        self.row = row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql):
+        pass
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConn:
+    def __init__(self, name, row=(True, 0.0)):
+        self.name = name
+        self.row = row
+        self.closed_count = 0
+
+    def cursor(self):
+        return FakeCursor(self.row)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed_count += 1
+
+
+class FakePool:
+    def __init__(self, name, row=(True, 0.0), busy=False):
+        self.name = name
+        self.row = row
+        self.busy = busy
+        self.timeouts = []
+        self.connect_kwargs = {"host": name}
+
+    def acquire(self, timeout=None):
+        self.timeouts.append(timeout)
+        if self.busy:
+            raise PoolTimeout("busy")
+        return FakeConn(self.name, self.row)
+
+    def stats(self):
+        return {}
+
+
+@pytest.fixture
+def make_router(monkeypatch):
+    def make(*replicas, **options):
+        pools = {"primary": FakePool("primary")}
+        pools.update((pool.name, pool) for pool in replicas)
+        monkeypatch.setattr(routing, "get_pool", lambda config, **_: pools[config["host"]])
+        return routing.ReplicaRouter({"host": "primary"}, [{"host": p.name} for p in replicas], **options), pools
+    return make
+
+
+def test_busy_replica_is_not_waited_on(make_router):
+    router, pools = make_router(FakePool("r1", busy=True))
+    assert router.acquire(timeout=30).name == "primary"
+    assert pools["r1"].timeouts == [0]
+    assert pools["primary"].timeouts == [30]
+
+
+def test_replica_without_streaming_receiver_is_skipped(make_router):
+    router, _ = make_router(FakePool("r1", row=(False, 0.0)), FakePool("r2"))
+    names = {router.acquire().name for _ in range(4)}
+    assert names == {"r2"}
+    servers = {s["host"]: s for s in router.stats()["replicas"]}
+    assert servers["r1"]["status"] == "disconnected"
+    assert router.pick().connect_kwargs["host"] == "r2"
+
+
+def test_lagging_replica_falls_back_to_primary(make_router):
+    router, _ = make_router(FakePool("r1", row=(True, 120.0)), max_lag=30)
+    assert router.acquire().name == "primary"
+    assert router.stats()["replicas"][0]["status"] == "lagging"
@@ -0,0 +1,41 @@
+import pytest
+
+from utils.sampling import plan_sample, sample_percent
+
+
+def test_plan_sample_reads_whole_table_only_for_exact_counts():
+    method, sql, _ = plan_sample("public", "otps", "system", 1000, 400, exact=True)
+    assert method == "full"
+    assert sql == 'SELECT * FROM "public"."otps" LIMIT 1000'
+
+    method, sql, _ = plan_sample("public", "otps", "system", 1000, 400)
+    assert method == "system"
+    assert "TABLESAMPLE SYSTEM (100.000000)" in sql
+
+
+def test_plan_sample_tablesample_is_seeded_and_padded():
+    method, sql, described = plan_sample("public", "chat_messages", "bernoulli", 1000, 1_000_000, seed=42)
+    assert method == "bernoulli"
+    assert "TABLESAMPLE BERNOULLI (0.125000) REPEATABLE (42)" in sql
+    assert sql.endswith("ORDER BY md5(ctid::text || '42') LIMIT 1000")
+    assert "REPEATABLE (42)" in described
+
+
+@pytest.mark.parametrize("estimate", [None, 0])
+def test_plan_sample_without_estimate_falls_back_to_reservoir(estimate):
+    method, sql, described = plan_sample("public", "otps", "system", 100, estimate)
+    assert method == "reservoir"
+    assert sql == 'SELECT * FROM "public"."otps"'
+    assert "no row estimate" in described
+
+
+def test_plan_sample_latest_and_unknown_methods():
+    method, sql, _ = plan_sample("public", "otps", "latest", 10, 5, exact=True)
+    assert method == "latest" and sql.endswith("ORDER BY 1 DESC LIMIT 10")
+    with pytest.raises(ValueError):
+        plan_sample("public", "otps", "random", 10, 100)
+
+
+def test_sample_percent_is_capped():
+    assert sample_percent(100, 10_000) == pytest.approx(1.25)
+    assert sample_percent(100, 10) == 100.0
@@ -0,0 +1,202 @@
+"""Chart data compiled to server-side GROUP BY queries.
+
+Each dashboard chart describes what it plots as an :class:`Aggregate`:
+grouping expressions, measures and fixed filters over one table. The
+aggregate compiles to a single parameterized ``GROUP BY`` statement (with
+the sidebar date range pushed into its WHERE clause) so only the grouped
+rows cross the wire. Raw rows are fetched only for drill-down views.
+"""
+
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from utils.db import execute_prepared
+
+
+class Aggregate:
+    """One chart's data need: ``dimensions`` x ``measures`` over ``table``"""
+
+    def __init__(
+        self,
+        table: str,
+        dimensions: Sequence[Tuple[str, str]],
+        measures: Sequence[Tuple[str, str]],
+        filters: Sequence[str] = (),
+        ts_col: str = "created_at",
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+    ):
+        self.table = table
+        self.dimensions = tuple(dimensions)
+        self.measures = tuple(measures)
+        self.filters = tuple(filters)
+        self.ts_col = ts_col
+        self.order_by = order_by
+        self.limit = limit
+
+    def compile(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Tuple[str, Dict[str, object]]:
+        """SQL and params for the aggregate, restricted to ``start <= ts_col < end``"""
+        select = [f'{expr} AS "{alias}"' for alias, expr in self.dimensions + self.measures]
+        where = list(self.filters)
+        params: Dict[str, object] = {}
+        if start is not None:
+            where.append(f'"{self.ts_col}" >= %(from)s')
+            params["from"] = start
+        if end is not None:
+            where.append(f'"{self.ts_col}" < %(to)s')
+            params["to"] = end
+
+        sql = f'SELECT {", ".join(select)} FROM "{self.table}"'
+        if where:
+            sql += " WHERE " + " AND ".join(f"({w})" for w in where)
+        if self.dimensions:
+            positions = ", ".join(str(i + 1) for i in range(len(self.dimensions)))
+            sql += f" GROUP BY {positions} ORDER BY {self.order_by or positions}"
+        if self.limit is not None:
+            sql += f" LIMIT {int(self.limit)}"
+        return sql, params
+
+    def _key(self) -> Tuple:
+        return (self.table, self.dimensions, self.measures, self.filters, self.ts_col, self.order_by, self.limit)
+
+    # Compared by content so equal specs built on different reruns share a cache entry
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Aggregate) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return f"Aggregate({self.compile()[0]!r})"
+
+
+def run_aggregate(conn, spec: Aggregate, start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+    """Execute ``spec`` on a DB-API connection and return the grouped rows.
+
+    Runs as a prepared statement: a chart's SQL only changes with its spec,
+    so every rerun after the first on a pooled connection skips parsing.
+    The transaction runs in UTC, so ``date_trunc``/``EXTRACT`` buckets line
+    up with the UTC bounds from :func:`utils.cache.date_bounds`.
+    """
+    sql, params = spec.compile(start, end)
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL TimeZone = 'UTC'")
+        execute_prepared(cur, sql, params)
+        columns = [d[0] for d in cur.description]
+        rows = cur.fetchall()
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+def _non_empty(col: str) -> str:
+    return f"\"{col}\" IS NOT NULL AND btrim(\"{col}\"::text) <> ''"
+
+
+def rating_counts(table: str = "chat_feedback", col: str = "rating", comment_col: Optional[str] = "comment") -> Aggregate:
+    """Rows and commented rows per rating (rating distribution, comments by rating)"""
+    measures = [("count", "COUNT(*)")]
+    if comment_col:
+        measures.append(("comment_count", f"COUNT(*) FILTER (WHERE {_non_empty(comment_col)})"))
+    return Aggregate(table, [(col, f'"{col}"')], measures, filters=[f'"{col}" IS NOT NULL'])
+
+
+def hourly_ratings(table: str = "chat_feedback", col: str = "rating", ts_col: str = "created_at") -> Aggregate:
+    """Mean rating and feedback count per hour of day"""
+    return Aggregate(
+        table,
+        [("hour", f'EXTRACT(HOUR FROM "{ts_col}")::int')],
+        [("mean", f'AVG("{col}")::float8'), ("count", f'COUNT("{col}")')],
+        filters=[f'"{ts_col}" IS NOT NULL'],
+        ts_col=ts_col,
+    )
+
+
+def otp_daily_usage(table: str = "otps", ts_col: str = "created_at", flag_col: str = "is_used") -> Aggregate:
+    """Generated vs used OTPs per day with the daily usage rate"""
+    return Aggregate(
+        table,
+        [("date", f"date_trunc('day', \"{ts_col}\")")],
+        [
+            ("used_count", f'COUNT(*) FILTER (WHERE "{flag_col}")'),
+            ("total_count", "COUNT(*)"),
+            ("usage_rate", f'AVG(CASE WHEN "{flag_col}" THEN 1.0 ELSE 0.0 END)::float8'),
+        ],
+        filters=[f'"{ts_col}" IS NOT NULL'],
+        ts_col=ts_col,
+    )
+
+
+def otp_status_counts(table: str = "otps", flag_col: str = "is_used") -> Aggregate:
+    """Used / unused OTP counts"""
+    return Aggregate(table, [(flag_col, f'"{flag_col}"')], [("count", "COUNT(*)")], filters=[f'"{flag_col}" IS NOT NULL'])
+
+
+def feedback_summary(columns: Sequence[str], table: str = "chat_feedback") -> Aggregate:
+    """Headline feedback metrics: rows, average rating, latest entry, comments and unique users"""
+    measures = [("rows", "COUNT(*)")]
+    if "rating" in columns:
+        measures.append(("avg_rating", 'AVG("rating")::float8'))
+    if "created_at" in columns:
+        measures.append(("latest", 'MAX("created_at")'))
+    if "comment" in columns:
+        measures.append(("comments", 'COUNT("comment")'))
+    if "email" in columns:
+        measures.append(("unique_users", 'COUNT(DISTINCT "email")'))
+    return Aggregate(table, [], measures)
+
+
+def otp_summary(columns: Sequence[str], table: str = "otps") -> Aggregate:
+    """Headline OTP metrics: rows, average code length, usage rate and unique users"""
+    measures = [("rows", "COUNT(*)")]
+    if "otp_code" in columns:
+        measures.append(("avg_length", 'AVG(length("otp_code"::text))::float8'))
+    if "is_used" in columns:
+        measures.append(("usage_rate", 'AVG("is_used"::int)::float8'))
+    if "user_id" in columns:
+        measures.append(("unique_users", 'COUNT(DISTINCT "user_id")'))
+    return Aggregate(table, [], measures)
+
+
+def null_counts(table: str, columns: Sequence[str]) -> Aggregate:
+    """Missing values per column, as one row with a count per column"""
+    return Aggregate(table, [], [(col, f'COUNT(*) - COUNT("{col}")') for col in columns])
+
+
+def top_values(table: str, col: str, n: int = 20) -> Aggregate:
+    """The ``n`` most frequent values of ``col``, with NULL reported as ``(Missing)``"""
+    return Aggregate(
+        table,
+        [(col, f"COALESCE(\"{col}\"::text, '(Missing)')")],
+        [("count", "COUNT(*)")],
+        order_by='"count" DESC, 1',
+        limit=n,
+    )
+
+
+def value_lengths(table: str, col: str) -> Aggregate:
+    """Rows per text length of ``col``"""
+    return Aggregate(table, [("length", f'length("{col}"::text)')], [("count", "COUNT(*)")],
+                     filters=[f'"{col}" IS NOT NULL'])
+
+
+def daily_counts(table: str, col: str, ts_col: str = "created_at") -> Aggregate:
+    """Rows per UTC day of timestamp ``col``; the date range still applies to ``ts_col``"""
+    return Aggregate(table, [("bucket", f"date_trunc('day', \"{col}\")")], [("count", "COUNT(*)")],
+                     filters=[f'"{col}" IS NOT NULL'], ts_col=ts_col)
+
+
+def comment_stats(table: str = "chat_feedback", col: str = "comment") -> Aggregate:
+    """Comment count with average length, average word count and longest comment"""
+    words = (f"CASE WHEN btrim(\"{col}\"::text) = '' THEN 0 "
+             f"ELSE array_length(regexp_split_to_array(btrim(\"{col}\"::text), '\\s+'), 1) END")
+    return Aggregate(
+        table,
+        [],
+        [
+            ("total_comments", f'COUNT("{col}")'),
+            ("avg_length", f'AVG(length("{col}"::text))::float8'),
+            ("avg_words", f"AVG({words})::float8"),
+            ("longest_comment", f'MAX(length("{col}"::text))'),
+        ],
+    )
@@ -0,0 +1,399 @@
+"""Result caches for query helpers.
+
+``st.cache_data`` without ``max_entries`` keeps every distinct query,
+page and filter combination for the life of the process. ``ResultCache``
+instead accounts each entry's size in bytes and evicts least recently used
+entries once a configurable budget is exceeded. ``ParquetResultCache`` sits
+behind it on local disk so results survive restarts until the underlying
+tables change.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.db import referenced_tables, table_watermark
+
+DEFAULT_MAX_BYTES = int(float(os.getenv("APP_CACHE_MAX_MB", "512")) * 1024 * 1024)
+DEFAULT_TTL = float(os.getenv("APP_CACHE_TTL", "300"))
+DEFAULT_DISK_CACHE_DIR = os.getenv("APP_DISK_CACHE_DIR", os.path.join(".cache", "query_results"))
+DEFAULT_DISK_MAX_BYTES = int(float(os.getenv("APP_DISK_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+_MISSING = object()
+
+
+def sizeof(value) -> int:
+    """Approximate in-memory size of a cached result in bytes"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True, index=True)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    nbytes = getattr(value, "nbytes", None)  # pyarrow.Table, numpy arrays
+    if isinstance(nbytes, int):
+        return nbytes
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+def _copy_out(value):
+    # Callers add/replace columns on the frames they get back; a shallow
+    # copy keeps those edits out of the cached entry without duplicating data.
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=False)
+    return value
+
+
+class ResultCache:
+    """Thread-safe LRU cache bounded by total entry size in bytes"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[object, int, Optional[float]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "rejected": 0}
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return default
+            value, size, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                self._drop(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key: Hashable, value, ttl: Optional[float] = None) -> bool:
+        """Store ``value``; returns False if it alone exceeds the budget"""
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                self._stats["rejected"] += 1
+                return False
+            expires = time.monotonic() + ttl if ttl else None
+            self._entries[key] = (value, size, expires)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self._stats["evictions"] += 1
+            return True
+
+    def _drop(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches ``predicate``"""
+        with self._lock:
+            keys = [k for k in self._entries if predicate(k)]
+            for k in keys:
+                self._drop(k)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+            snapshot["bytes"] = self._bytes
+            snapshot["max_bytes"] = self.max_bytes
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Process-wide cache shared by every app and session"""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
+
+
+def date_bounds(start: date, end: date) -> Tuple[datetime, datetime]:
+    """Half-open UTC ``[from, to)`` bounds for an inclusive date range"""
+    lo = datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc)
+    hi = datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return lo, hi
+
+
+def _range_mask(series: pd.Series, lo: datetime, hi: datetime) -> pd.Series:
+    if getattr(series.dt, "tz", None) is None:
+        lo, hi = lo.replace(tzinfo=None), hi.replace(tzinfo=None)
+    return (series >= pd.Timestamp(lo)) & (series < pd.Timestamp(hi))
+
+
+class RangeCache:
+    """Time-range query results that answer any narrower range by slicing.
+
+    Frames live in a :class:`ResultCache` (so they share its byte budget and
+    TTL); this class only remembers which ``[lo, hi)`` windows are cached per
+    namespace. A request inside a cached window is filtered in memory on
+    ``ts_col`` instead of going back to the database.
+    """
+
+    def __init__(self, cache: Optional[ResultCache] = None, ttl: Optional[float] = DEFAULT_TTL):
+        self._cache = cache
+        self.ttl = ttl
+        self._windows: Dict[Hashable, list] = {}
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "subsumed_hits": 0, "misses": 0}
+
+    @property
+    def cache(self) -> ResultCache:
+        return self._cache or get_result_cache()
+
+    def fetch(self, namespace: Hashable, lo: datetime, hi: datetime, loader: Callable, ts_col: str) -> pd.DataFrame:
+        """Frame for ``lo <= ts_col < hi``; ``loader(lo, hi)`` runs only on a miss"""
+        with self._lock:
+            windows = sorted(self._windows.get(namespace, []), key=lambda w: w[1] - w[0])
+        for w_lo, w_hi in windows:  # narrowest covering window first
+            if w_lo <= lo and hi <= w_hi:
+                df = self.cache.get(("range", namespace, w_lo, w_hi), _MISSING)
+                if df is _MISSING:
+                    self._forget(namespace, (w_lo, w_hi))
+                    continue
+                if (w_lo, w_hi) == (lo, hi):
+                    self._bump("exact_hits")
+                    return _copy_out(df)
+                self._bump("subsumed_hits")
+                return df.loc[_range_mask(df[ts_col], lo, hi)].reset_index(drop=True)
+
+        self._bump("misses")
+        df = loader(lo, hi)
+        if self.cache.put(("range", namespace, lo, hi), df, self.ttl):
+            with self._lock:
+                self._windows.setdefault(namespace, []).append((lo, hi))
+        return _copy_out(df)
+
+    def _forget(self, namespace: Hashable, window: Tuple[datetime, datetime]):
+        with self._lock:
+            windows = self._windows.get(namespace, [])
+            if window in windows:
+                windows.remove(window)
+
+    def _bump(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["windows"] = sum(len(w) for w in self._windows.values())
+        return snapshot
+
+
+_range_cache: Optional[RangeCache] = None
+
+
+def get_range_cache() -> RangeCache:
+    """Process-wide range cache backed by the shared result cache"""
+    global _range_cache
+    with _result_cache_lock:
+        if _range_cache is None:
+            _range_cache = RangeCache()
+        return _range_cache
+
+
+def _key_part(value) -> Hashable:
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _key_part(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_key_part(v) for v in value)
+    url = getattr(value, "url", None)  # SQLAlchemy Engine
+    if url is not None:
+        return ("engine", url.render_as_string(hide_password=False) if hasattr(url, "render_as_string") else str(url))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def cached(ttl: Optional[float] = None, cache: Optional[ResultCache] = None):
+    """Decorator memoising a query helper in the shared :class:`ResultCache`.
+
+    Like ``st.cache_data``, arguments whose names start with an underscore
+    (e.g. ``_self``) are left out of the cache key. Exceptions are not cached.
+    """
+
+    def decorator(fn):
+        sig = inspect.signature(fn)
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (name,) + tuple(
+                (arg, _key_part(val)) for arg, val in bound.arguments.items() if not arg.startswith("_")
+            )
+            store = cache or get_result_cache()
+            value = store.get(key, _MISSING)
+            if value is _MISSING:
+                value = fn(*args, **kwargs)
+                store.put(key, value, ttl)
+            return _copy_out(value)
+
+        wrapper.cache_name = name
+        return wrapper
+
+    return decorator
+
+
+def normalize_sql(sql: str) -> str:
+    """Whitespace-insensitive form of a statement, used for cache keys"""
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+class ParquetResultCache:
+    """Query results persisted as zstd-compressed Parquet files.
+
+    Files are keyed by normalised SQL plus parameters and stamped with the
+    change watermark of the tables the query reads (see
+    :func:`utils.db.table_watermark`). A file is served only while that
+    watermark is unchanged, so container restarts and new replicas start
+    warm without ever returning data older than the tables.
+    """
+
+    _META_KEY = b"dash_cache"
+
+    def __init__(self, directory: str = DEFAULT_DISK_CACHE_DIR, max_bytes: int = DEFAULT_DISK_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "uncacheable": 0, "writes": 0, "evictions": 0}
+
+    def _path(self, sql: str, params: Optional[dict]) -> str:
+        raw = json.dumps([normalize_sql(sql), params or {}], sort_keys=True, default=str)
+        return os.path.join(self.directory, hashlib.sha256(raw.encode("utf-8")).hexdigest() + ".parquet")
+
+    def _bump(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def fetch(self, conn, sql: str, loader: Callable, params: Optional[dict] = None):
+        """Return the cached Arrow table for ``sql`` or ``loader()``'s fresh one.
+
+        ``conn`` and ``loader`` must both be on the primary; see
+        :func:`utils.db.table_watermark`.
+        """
+        tables = referenced_tables(sql)
+        watermark = table_watermark(conn, tables) if tables else None
+        if watermark is None:
+            self._bump("uncacheable")
+            return loader()
+
+        path = self._path(sql, params)
+        try:
+            meta = pq.read_schema(path).metadata or {}
+            if json.loads(meta.get(self._META_KEY, b"{}")).get("watermark") == watermark:
+                table = pq.read_table(path)
+                os.utime(path)  # LRU by mtime
+                self._bump("hits")
+                return table.replace_schema_metadata(
+                    {k: v for k, v in meta.items() if k != self._META_KEY} or None
+                )
+            self._bump("stale")
+        except (OSError, ValueError):
+            self._bump("misses")
+
+        table = loader()
+        self._write(path, table, {"watermark": watermark, "sql": normalize_sql(sql)})
+        return table
+
+    def _write(self, path: str, table, info: dict):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            meta = dict(table.schema.metadata or {})
+            meta[self._META_KEY] = json.dumps(info).encode("utf-8")
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            pq.write_table(table.replace_schema_metadata(meta), tmp, compression="zstd")
+            os.replace(tmp, path)
+            self._bump("writes")
+        except OSError:
+            return
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        try:
+            files = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".parquet")]
+            entries = sorted(((os.stat(f).st_mtime, os.stat(f).st_size, f) for f in files))
+        except OSError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, f in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(f)
+                total -= size
+                self._bump("evictions")
+            except OSError:
+                pass
+
+    def clear(self):
+        if not os.path.isdir(self.directory):
+            return
+        for f in os.listdir(self.directory):
+            if f.endswith(".parquet"):
+                try:
+                    os.remove(os.path.join(self.directory, f))
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            snapshot = dict(self._stats)
+        try:
+            files = [f for f in os.listdir(self.directory) if f.endswith(".parquet")]
+            snapshot["files"] = len(files)
+            snapshot["bytes"] = sum(os.path.getsize(os.path.join(self.directory, f)) for f in files)
+        except OSError:
+            snapshot["files"] = snapshot["bytes"] = 0
+        snapshot["max_bytes"] = self.max_bytes
+        return snapshot
+
+
+_disk_cache: Optional[ParquetResultCache] = None
+
+
+def get_disk_cache() -> ParquetResultCache:
+    """Process-wide Parquet cache (APP_DISK_CACHE_DIR)"""
+    global _disk_cache
+    with _result_cache_lock:
+        if _disk_cache is None:
+            _disk_cache = ParquetResultCache()
+        return _disk_cache
@@ -1 +1,766 @@
+"""Shared PostgreSQL connection layer for the dashboards.
 
+Every app variant used to open a brand new ``psycopg2.connect`` per query.
+This module keeps a process-wide, bounded pool of connections per database
+target so Streamlit reruns (and every user session in the same server
+process) reuse warm backends instead of paying the connect/TLS/fork cost.
+"""
+
+import hashlib
+import itertools
+import os
+import re
+import tempfile
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+from utils.inflight import get_inflight
+
+
+DEFAULT_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DEFAULT_POOL_MAX = int(os.getenv("DB_POOL_MAX", "8"))
+DEFAULT_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DEFAULT_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK", "30"))
+DEFAULT_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+DEFAULT_FETCH_SIZE = int(os.getenv("DB_FETCH_SIZE", "50000"))
+
+# Applied with SET on every new physical connection.
+DEFAULT_SESSION_SETTINGS = {
+    "application_name": os.getenv("DB_APPLICATION_NAME", "miva-dashboard"),
+    "statement_timeout": os.getenv("DB_STATEMENT_TIMEOUT", "120s"),
+    "idle_in_transaction_session_timeout": os.getenv("DB_IDLE_TX_TIMEOUT", "60s"),
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became available in time"""
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection whose ``close()`` hands it back to its pool.
+
+    Being a real ``psycopg2.extensions.connection`` subclass, it can be given
+    to pandas, SQLAlchemy's ``creator`` hook or psycopg2 extras unchanged.
+    """
+
+    _pool = None
+    _created_at = 0.0
+    _last_used = 0.0
+
+    def close(self):
+        pool = self._pool
+        if pool is not None:
+            pool.release(self)
+        else:
+            super().close()
+
+    def discard(self):
+        """Close the physical connection for good"""
+        self._pool = None
+        if not self.closed:
+            super().close()
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of :class:`PooledConnection` objects"""
+
+    def __init__(
+        self,
+        connect_kwargs: Dict[str, object],
+        min_size: int = DEFAULT_POOL_MIN,
+        max_size: int = DEFAULT_POOL_MAX,
+        timeout: float = DEFAULT_POOL_TIMEOUT,
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+        max_lifetime: float = DEFAULT_MAX_LIFETIME,
+        session_settings: Optional[Dict[str, str]] = None,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.connect_kwargs = dict(connect_kwargs)
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_lifetime = max_lifetime
+        self.session_settings = dict(DEFAULT_SESSION_SETTINGS if session_settings is None else session_settings)
+
+        self._idle: deque = deque()
+        self._in_use = 0
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "peak_in_use": 0,
+        }
+
+        for _ in range(self.min_size):
+            try:
+                self._idle.append(self._open())
+            except psycopg2.Error:
+                break
+
+    # -- physical connections -------------------------------------------------
+
+    def _open(self) -> PooledConnection:
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.connect_kwargs)
+        try:
+            if self.session_settings:
+                with conn.cursor() as cur:
+                    for name, value in self.session_settings.items():
+                        cur.execute("SELECT set_config(%s, %s, false)", (name, str(value)))
+                conn.commit()
+        except Exception:
+            conn.discard()
+            raise
+        now = time.monotonic()
+        conn._created_at = now
+        conn._last_used = now
+        with self._cond:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _close(self, conn: PooledConnection):
+        conn.discard()
+        with self._cond:
+            self._stats["connections_closed"] += 1
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        if self.max_lifetime and now - conn._created_at > self.max_lifetime:
+            return False
+        if now - conn._last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            return False
+
+    # -- checkout / checkin ---------------------------------------------------
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Check out a healthy connection, waiting up to ``timeout`` seconds"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        with self._cond:
+            while not self._idle and self._in_use >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {timeout:.1f}s "
+                        f"(pool size {self.max_size})"
+                    )
+                waited = True
+                self._cond.wait(remaining)
+            conn = self._idle.popleft() if self._idle else None
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._in_use)
+            if waited:
+                wait_time = time.monotonic() - started
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += wait_time
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+
+        try:
+            if conn is not None and not self._is_healthy(conn):
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        conn._pool = self
+        get_inflight().register(conn)
+        return conn
+
+    def release(self, conn: PooledConnection):
+        """Return a connection to the pool, resetting any open transaction"""
+        get_inflight().unregister(conn)
+        conn._pool = None
+        keep = not conn.closed
+        if keep:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                keep = False
+        if not keep:
+            self._close(conn)
+
+        conn._last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[PooledConnection]:
+        """Context manager that checks a connection out and always returns it"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            if conn._pool is self:
+                conn.close()
+
+    def closeall(self):
+        """Close every idle connection; checked-out ones close on release"""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, float]:
+        """Snapshot of pool usage and wait statistics"""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot["in_use"] = self._in_use
+            snapshot["idle"] = len(self._idle)
+            snapshot["max_size"] = self.max_size
+        checkouts = snapshot["checkouts"] or 1
+        snapshot["wait_time_avg"] = snapshot["wait_time_total"] / checkouts
+        return snapshot
+
+
+_pools: Dict[Tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(connect_kwargs: Dict[str, object]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in connect_kwargs.items()))
+
+
+def get_pool(connect_kwargs: Dict[str, object], **pool_options) -> ConnectionPool:
+    """Return the process-wide pool for these connection parameters.
+
+    Pools are shared by every caller (and every Streamlit session) that
+    connects with identical parameters. ``pool_options`` only take effect
+    when the pool is first created.
+    """
+    key = _pool_key(connect_kwargs)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(connect_kwargs, **pool_options)
+            _pools[key] = pool
+        return pool
+
+
+def all_pools() -> Dict[Tuple, ConnectionPool]:
+    """All pools created in this process, keyed by connection parameters"""
+    with _pools_lock:
+        return dict(_pools)
+
+
+def connect_kwargs_from_url(conn_url: str) -> Dict[str, object]:
+    """Translate a SQLAlchemy URL into psycopg2 keyword arguments"""
+    from sqlalchemy.engine import make_url
+
+    url = make_url(conn_url)
+    kwargs: Dict[str, object] = url.translate_connect_args(username="user", database="dbname")
+    kwargs.update({k: v for k, v in url.query.items() if isinstance(v, str)})
+    return kwargs
+
+
+def create_pooled_engine(conn_url: str, **pool_options):
+    """SQLAlchemy engine whose DBAPI connections come from :func:`get_pool`.
+
+    SQLAlchemy's own pooling is disabled (``NullPool``); when it closes a
+    connection, :class:`PooledConnection` returns it to the shared pool.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+
+    pool = get_pool(connect_kwargs_from_url(conn_url), **pool_options)
+    # The URL only selects the dialect here (and keeps engines distinguishable);
+    # connections always come from the shared pool via ``creator``.
+    return create_engine(conn_url, creator=pool.acquire, poolclass=NullPool)
+
+
+_cursor_ids = itertools.count(1)
+
+
+def strip_statement(sql: str) -> str:
+    """Drop surrounding whitespace and trailing semicolons from a statement"""
+    return sql.strip().rstrip(";").strip()
+
+
+_DOLLAR_TAG_RE = re.compile(r"\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$")
+_BLANK_SQL_RE = re.compile(r"(?:\s+|--[^\n]*|/\*.*?\*/)*", re.DOTALL)
+
+
+def split_statements(sql: str) -> List[str]:
+    """Split a script on the semicolons that end its statements.
+
+    Semicolons inside string literals (including ``E''`` and dollar-quoted
+    ones), quoted identifiers and comments do not count. Statements that
+    are empty or only comments are dropped.
+    """
+    statements, start, i, n = [], 0, 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch == "'":
+            escapes = i > 0 and sql[i - 1] in "eE" and (i == 1 or not (sql[i - 2].isalnum() or sql[i - 2] == "_"))
+            i += 1
+            while i < n:
+                if escapes and sql[i] == "\\":
+                    i += 2
+                    continue
+                if sql[i] == "'":
+                    if i + 1 < n and sql[i + 1] == "'":
+                        i += 2
+                        continue
+                    break
+                i += 1
+        elif ch == '"':
+            end = sql.find('"', i + 1)
+            i = n if end < 0 else end
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end < 0 else end
+        elif sql.startswith("/*", i):
+            # Block comments nest in PostgreSQL
+            depth, i = 1, i + 2
+            while i < n and depth:
+                if sql.startswith("/*", i):
+                    depth, i = depth + 1, i + 2
+                elif sql.startswith("*/", i):
+                    depth, i = depth - 1, i + 2
+                else:
+                    i += 1
+            continue
+        elif ch == "$" and not (i > 0 and (sql[i - 1].isalnum() or sql[i - 1] == "_")):
+            tag = _DOLLAR_TAG_RE.match(sql, i)
+            if tag:
+                end = sql.find(tag.group(), tag.end())
+                i = n if end < 0 else end + len(tag.group()) - 1
+        elif ch == ";":
+            statements.append(sql[start:i])
+            start = i + 1
+        i += 1
+    statements.append(sql[start:])
+    return [s.strip() for s in statements if not _BLANK_SQL_RE.fullmatch(s)]
+
+
+def iter_query_chunks(
+    pool: ConnectionPool,
+    query: str,
+    params: Optional[Dict[str, object]] = None,
+    chunksize: int = DEFAULT_FETCH_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """Stream a query through a named server-side cursor.
+
+    Yields DataFrames of at most ``chunksize`` rows, so only one chunk is
+    held client-side at a time, and every FETCH is its own statement under
+    ``statement_timeout``. A query with no rows yields a single empty frame
+    carrying the column names. The pooled connection is returned as soon
+    as the generator is exhausted or closed.
+    """
+    with pool.connection() as conn:
+        yield from iter_connection_chunks(conn, query, params, chunksize)
+
+
+def iter_connection_chunks(
+    conn,
+    query: str,
+    params: Optional[Dict[str, object]] = None,
+    chunksize: int = DEFAULT_FETCH_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """:func:`iter_query_chunks` on a DB-API connection the caller already holds"""
+    if chunksize < 1:
+        raise ValueError("chunksize must be at least 1")
+    with conn.cursor(name=f"dash_stream_{next(_cursor_ids)}") as cur:
+        cur.itersize = chunksize
+        cur.execute(strip_statement(query), params)
+        columns = None
+        while True:
+            rows = cur.fetchmany(chunksize)
+            if columns is None:
+                columns = [d[0] for d in cur.description or []]
+                if not rows:
+                    yield pd.DataFrame(columns=columns)
+                    break
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+# PostgreSQL type OIDs, used to give COPY output proper column dtypes
+_INT_OIDS = {20, 21, 23, 26}             # int8, int2, int4, oid
+_FLOAT_OIDS = {700, 701, 1700}          # float4, float8, numeric
+_BOOL_OIDS = {16}
+_TIMESTAMPTZ_OIDS = {1184}
+_TIMESTAMP_OIDS = {1114, 1082}           # timestamp, date
+_COPY_NULL = "\\N"
+_COPY_SPOOL_BYTES = 64 * 1024 * 1024
+
+
+def bind_params(conn, query: str, params: Optional[Dict[str, object]] = None) -> str:
+    """Inline ``%(name)s`` parameters client-side (COPY cannot take binds)"""
+    with conn.cursor() as cur:
+        bound = cur.mogrify(query, params or None)
+    encoding = psycopg2.extensions.encodings.get(conn.encoding, "utf-8")
+    return bound.decode(encoding)
+
+
+@contextmanager
+def _copy_csv(conn, query: str, params: Optional[Dict[str, object]] = None, utc: bool = False):
+    """Run ``COPY (query) TO STDOUT`` and yield ``(columns, buffer)``.
+
+    ``columns`` is a list of ``(name, type_oid)`` from a ``LIMIT 0`` probe of
+    the same query; the buffer spills to disk past ``_COPY_SPOOL_BYTES``.
+    """
+    query = strip_statement(bind_params(conn, strip_statement(query), params))
+    with conn.cursor() as cur:
+        if utc:
+            cur.execute("SET LOCAL TimeZone = 'UTC'")
+        cur.execute(f"SELECT * FROM ({query}) AS _copy_probe LIMIT 0")
+        columns = [(d[0], d[1]) for d in cur.description]
+        with tempfile.SpooledTemporaryFile(max_size=_COPY_SPOOL_BYTES) as buf:
+            cur.copy_expert(
+                f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '{_COPY_NULL}')",
+                buf,
+            )
+            buf.seek(0)
+            yield columns, buf
+
+
+def copy_query_df(conn, query: str, params: Optional[Dict[str, object]] = None) -> pd.DataFrame:
+    """Bulk-load a SELECT through ``COPY (query) TO STDOUT`` in CSV format.
+
+    The result travels as one CSV stream and is parsed by pandas' C reader
+    straight into typed columns, skipping the per-row Python tuples that a
+    cursor fetch builds. ``conn`` can be a pooled connection or a SQLAlchemy
+    raw connection.
+    """
+    with _copy_csv(conn, query, params) as (columns, buf):
+        return _frame_from_copy_csv(buf, columns)
+
+
+def _frame_from_copy_csv(buf, columns) -> pd.DataFrame:
+    names = [name for name, _ in columns]
+    dtype: Dict[int, str] = {}
+    for i, (_, oid) in enumerate(columns):
+        if oid in _INT_OIDS:
+            dtype[i] = "Int64"
+        elif oid in _FLOAT_OIDS:
+            dtype[i] = "float64"
+        else:
+            dtype[i] = "object"
+
+    df = pd.read_csv(
+        buf,
+        header=0,
+        names=names,
+        dtype=dtype,
+        na_values=[_COPY_NULL],
+        keep_default_na=False,
+        encoding="utf-8",
+    )
+    for i, (_, oid) in enumerate(columns):
+        col = df.iloc[:, i]
+        if oid in _BOOL_OIDS:
+            df.isetitem(i, col.map({"t": True, "f": False}).astype("boolean"))
+        elif oid in _TIMESTAMPTZ_OIDS:
+            df.isetitem(i, pd.to_datetime(col, utc=True, format="ISO8601", errors="coerce"))
+        elif oid in _TIMESTAMP_OIDS:
+            df.isetitem(i, pd.to_datetime(col, format="ISO8601", errors="coerce"))
+    return df
+
+
+def _arrow_type(oid: int):
+    import pyarrow as pa
+
+    if oid in _INT_OIDS:
+        return pa.int64()
+    if oid in _FLOAT_OIDS:
+        return pa.float64()
+    if oid in _BOOL_OIDS:
+        return pa.bool_()
+    if oid in _TIMESTAMPTZ_OIDS:
+        return pa.timestamp("us", tz="UTC")
+    if oid == 1114:
+        return pa.timestamp("us")
+    if oid == 1082:
+        return pa.date32()
+    return pa.string()
+
+
+def copy_query_arrow(conn, query: str, params: Optional[Dict[str, object]] = None):
+    """Bulk-load a SELECT straight into a typed ``pyarrow.Table``.
+
+    Same COPY transport as :func:`copy_query_df`, but parsed by Arrow's
+    multithreaded CSV reader, so text columns end up in contiguous Arrow
+    buffers rather than one Python ``str`` per cell.
+    """
+    import pyarrow.csv as pacsv
+
+    with _copy_csv(conn, query, params, utc=True) as (columns, buf):
+        names = [name for name, _ in columns]
+        return pacsv.read_csv(
+            buf,
+            read_options=pacsv.ReadOptions(column_names=names, skip_rows=1),
+            convert_options=pacsv.ConvertOptions(
+                column_types={name: _arrow_type(oid) for name, oid in columns},
+                null_values=[_COPY_NULL],
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+                true_values=["t"],
+                false_values=["f"],
+            ),
+        )
+
+
+def arrow_to_pandas(table) -> pd.DataFrame:
+    """Convert an Arrow result for pandas analysis.
+
+    Strings stay Arrow-backed (``string[pyarrow]``) and integers/booleans
+    use pandas' nullable dtypes, so conversion does not materialise Python
+    objects for text-heavy columns.
+    """
+    import pyarrow as pa
+
+    mapping = {
+        pa.string(): pd.StringDtype("pyarrow"),
+        pa.large_string(): pd.StringDtype("pyarrow"),
+        pa.int64(): pd.Int64Dtype(),
+        pa.bool_(): pd.BooleanDtype(),
+    }
+    return table.to_pandas(types_mapper=mapping.get)
+
+
+# Server-side prepared statements for hot, parameterized query shapes.
+# Names are derived from the statement text and tracked per DB-API
+# connection, so each pooled backend parses a shape once and then only
+# binds and executes it (switching to a cached generic plan when Postgres
+# finds one as good as the custom plans).
+_PLACEHOLDER_RE = re.compile(r"%\((\w+)\)s|%%")
+_prepared: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+_prepared_stats = {"prepares": 0, "executions": 0, "invalidations": 0}
+_prepared_shapes: Dict[str, int] = {}
+
+
+def _dbapi_connection(conn):
+    # SQLAlchemy's raw_connection() proxies the psycopg2 connection
+    return getattr(conn, "dbapi_connection", None) or conn
+
+
+def to_positional(query: str) -> Tuple[str, List[str]]:
+    """Rewrite ``%(name)s`` placeholders as ``$1..$n``; returns the SQL and parameter order"""
+    names: List[str] = []
+
+    def sub(match):
+        name = match.group(1)
+        if name is None:
+            return "%"
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    return _PLACEHOLDER_RE.sub(sub, query), names
+
+
+def execute_prepared(cur, query: str, params: Optional[Dict[str, object]] = None):
+    """Execute ``query`` on ``cur`` through a named prepared statement.
+
+    The statement is prepared the first time its shape is seen on the
+    connection and reused by every later execution there.
+    """
+    sql, names = to_positional(strip_statement(query))
+    name = "dash_" + hashlib.sha1(sql.encode("utf-8")).hexdigest()[:20]
+    conn = _dbapi_connection(cur.connection)
+    with _prepared_lock:
+        known = _prepared.setdefault(conn, set())
+        fresh = name not in known
+    if fresh:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        with _prepared_lock:
+            known.add(name)
+            _prepared_stats["prepares"] += 1
+    try:
+        if names:
+            cur.execute(f"EXECUTE {name} ({', '.join(f'%({n})s' for n in names)})", params)
+        else:
+            cur.execute(f"EXECUTE {name}")
+    except psycopg2.errors.InvalidSqlStatementName:
+        # Session was reset (DISCARD ALL / DEALLOCATE); prepare again next time
+        with _prepared_lock:
+            known.clear()
+            _prepared_stats["invalidations"] += 1
+        raise
+    with _prepared_lock:
+        _prepared_stats["executions"] += 1
+        _prepared_shapes[name] = _prepared_shapes.get(name, 0) + 1
+
+
+def prepared_query_df(conn, query: str, params: Optional[Dict[str, object]] = None) -> pd.DataFrame:
+    """Small, hot query through :func:`execute_prepared`, returned as a DataFrame"""
+    with conn.cursor() as cur:
+        execute_prepared(cur, query, params)
+        columns = [d[0] for d in cur.description]
+        return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+
+
+def prepared_query_arrow(conn, query: str, params: Optional[Dict[str, object]] = None):
+    """Like :func:`prepared_query_df` but typed like :func:`copy_query_arrow`'s output"""
+    import pyarrow as pa
+    import psycopg2.extras
+
+    with conn.cursor() as cur:
+        # Keep JSON as text, as it arrives through COPY
+        psycopg2.extras.register_default_json(cur, loads=lambda s: s)
+        psycopg2.extras.register_default_jsonb(cur, loads=lambda s: s)
+        execute_prepared(cur, query, params)
+        columns = [(d[0], d[1]) for d in cur.description]
+        rows = cur.fetchall()
+
+    arrays = []
+    for i, (_, oid) in enumerate(columns):
+        typ = _arrow_type(oid)
+        values = [row[i] for row in rows]
+        if pa.types.is_string(typ):
+            values = [v if v is None or isinstance(v, str) else str(v) for v in values]
+        elif pa.types.is_floating(typ):
+            values = [None if v is None else float(v) for v in values]
+        arrays.append(pa.array(values, type=typ))
+    return pa.Table.from_arrays(arrays, names=[name for name, _ in columns])
+
+
+def prepared_statement_stats() -> Dict[str, float]:
+    """Process-wide prepare/execute counts; ``reuse_rate`` is executions served without a PREPARE"""
+    with _prepared_lock:
+        snapshot = dict(_prepared_stats)
+        snapshot["shapes"] = len(_prepared_shapes)
+        snapshot["connections"] = len(_prepared)
+    reused = max(snapshot["executions"] - snapshot["prepares"], 0)
+    snapshot["reused"] = reused
+    snapshot["reuse_rate"] = reused / snapshot["executions"] if snapshot["executions"] else 0.0
+    return snapshot
+
+
+_TABLE_REF_RE = re.compile(r'\b(?:from|join)\s+((?:"[^"]+"|\w+)(?:\s*\.\s*(?:"[^"]+"|\w+))?)', re.IGNORECASE)
+_CTE_RE = re.compile(r'(?:\bwith(?:\s+recursive)?|,)\s*(\w+)\s+as\s*\(', re.IGNORECASE)
+_VOLATILE_RE = re.compile(
+    r"\b(now|current_date|current_time|current_timestamp|localtime|localtimestamp|clock_timestamp"
+    r"|statement_timestamp|transaction_timestamp|timeofday|random|setseed|nextval|currval|lastval"
+    r"|gen_random_uuid|uuid_generate_v[14])\b"
+    # Date/time input literals resolved when the statement runs, e.g. 'today'::date
+    r"|'\s*(now|today|tomorrow|yesterday)\s*'",
+    re.IGNORECASE,
+)
+_SQL_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|--[^\n]*|/\*.*?\*/|\w+|[(),\[\]]", re.DOTALL)
+# Keywords that end a FROM list at the same nesting level; JOIN ... ON/USING stays inside it
+_FROM_END = {"where", "group", "having", "window", "order", "limit", "offset", "fetch", "for",
+             "union", "intersect", "except", "returning"}
+
+
+def _has_comma_from(sql: str) -> bool:
+    """Whether a FROM list joins with commas (``FROM a, b``), which the FROM/JOIN scan cannot follow"""
+    in_from = [False]
+    for token in _SQL_TOKEN_RE.findall(sql):
+        word = token.lower()
+        if token in ("(", "["):
+            in_from.append(False)
+        elif token in (")", "]"):
+            if len(in_from) > 1:
+                in_from.pop()
+        elif token == ",":
+            if in_from[-1]:
+                return True
+        elif word == "from":
+            in_from[-1] = True
+        elif word in _FROM_END:
+            in_from[-1] = False
+    return False
+
+
+def referenced_tables(sql: str) -> Optional[Tuple[Tuple[str, str], ...]]:
+    """``(schema, table)`` pairs a query reads, or None if it is not cacheable.
+
+    A simple FROM/JOIN scan; CTE names are skipped. Queries using volatile
+    functions such as NOW() return None because their result depends on
+    more than table contents, and so do comma joins, which the scan would
+    only partly see.
+    """
+    if _VOLATILE_RE.search(sql) or _has_comma_from(sql):
+        return None
+    ctes = {name.lower() for name in _CTE_RE.findall(sql)}
+    tables = set()
+    for ref in _TABLE_REF_RE.findall(sql):
+        # Unquoted identifiers fold to lower case, quoted ones are kept as-is
+        parts = [p.strip() for p in ref.split(".")]
+        parts = [p[1:-1] if p.startswith('"') else p.lower() for p in parts]
+        if len(parts) == 1:
+            if parts[0] in ctes:
+                continue
+            parts.insert(0, "public")
+        tables.add((parts[0], parts[1]))
+    return tuple(sorted(tables)) or None
+
+
+def table_watermark(conn, tables) -> Optional[str]:
+    """Cheap change marker for a set of tables.
+
+    Sums n_tup_ins + n_tup_upd + n_tup_del from pg_stat_user_tables per
+    table, plus the server start time and the database's statistics reset
+    time (the counters restart from zero after either, so old values could
+    otherwise repeat).
+    Returns None if any table is not a plain user table (views, catalogs),
+    since their changes are not tracked there.
+
+    Read it on the server the data comes from, and that server must be the
+    primary: a standby does not count replayed writes, and counters read on
+    the primary would stamp a lagging replica's rows as current.
+    """
+    if not tables:
+        return None
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.schemaname, s.relname, s.n_tup_ins + s.n_tup_upd + s.n_tup_del, pg_postmaster_start_time(),
+                   (SELECT d.stats_reset FROM pg_stat_database d WHERE d.datname = current_database())
+            FROM pg_stat_user_tables s
+            WHERE (s.schemaname, s.relname) IN %s
+            """,
+            (tuple(tables),),
+        )
+        rows = cur.fetchall()
+    if len(rows) != len(tables):
+        return None
+    started, reset = rows[0][3], rows[0][4]
+    marks = ",".join(f"{schema}.{table}={changes}" for schema, table, changes, _, _ in sorted(rows))
+    return f"{started.isoformat()}|{reset.isoformat() if reset else '-'}|{marks}"
@@ -1 +1,82 @@
+"""EDA helpers shared by the dashboards.
 
+The ``*_chunked`` helpers accept any iterable of DataFrames, such as the
+chunks produced by :func:`utils.db.iter_query_chunks`, and only ever keep
+their running result in memory.
+"""
+
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def value_counts_chunked(chunks: Iterable[pd.DataFrame], column: str, dropna: bool = True) -> pd.Series:
+    """Value counts of ``column`` accumulated chunk by chunk"""
+    total = pd.Series(dtype="int64")
+    for chunk in chunks:
+        if column not in chunk.columns or chunk.empty:
+            continue
+        counts = chunk[column].value_counts(dropna=dropna)
+        total = total.add(counts, fill_value=0)
+    return total.astype("int64").sort_index()
+
+
+def daily_usage_chunked(
+    chunks: Iterable[pd.DataFrame],
+    ts_col: str = "created_at",
+    flag_col: str = "is_used",
+) -> pd.DataFrame:
+    """Per-UTC-day used/total counts and usage rate, accumulated chunk by chunk"""
+    parts = []
+    for chunk in chunks:
+        if chunk.empty or ts_col not in chunk.columns or flag_col not in chunk.columns:
+            continue
+        days = pd.to_datetime(chunk[ts_col], errors="coerce", utc=True).dt.tz_convert(None).dt.floor("D")
+        used = chunk[flag_col].fillna(False).astype(bool)
+        grouped = pd.DataFrame({"date": days, "used": used}).dropna(subset=["date"]).groupby("date")["used"]
+        parts.append(pd.DataFrame({"used_count": grouped.sum(), "total_count": grouped.size()}))
+
+    if not parts:
+        return pd.DataFrame(columns=["date", "used_count", "total_count", "usage_rate"])
+
+    daily = pd.concat(parts).groupby(level=0).sum()
+    daily["usage_rate"] = daily["used_count"] / daily["total_count"]
+    daily.index.name = "date"
+    return daily.reset_index()
+
+
+def reservoir_sample_chunked(chunks: Iterable[pd.DataFrame], n: int, seed: Optional[int] = None) -> pd.DataFrame:
+    """Uniform random sample of ``n`` rows (without replacement), in stream order.
+
+    Every row gets an independent uniform key and the ``n`` smallest keys
+    are kept, which is equivalent to reservoir sampling: one pass, and at
+    most ``n`` rows plus one chunk in memory.
+    """
+    if n < 1:
+        raise ValueError("n must be at least 1")
+    rng = np.random.default_rng(seed)
+    kept: Optional[pd.DataFrame] = None
+    keys = np.empty(0)
+    columns = None
+    for chunk in chunks:
+        if columns is None:
+            columns = list(chunk.columns)
+        if chunk.empty:
+            continue
+        chunk_keys = rng.random(len(chunk))
+        if len(keys) == n:
+            # Reservoir is full: only rows beating its largest key can enter
+            entering = chunk_keys < keys.max()
+            chunk, chunk_keys = chunk[entering], chunk_keys[entering]
+            if chunk.empty:
+                continue
+        combined = chunk.reset_index(drop=True) if kept is None else pd.concat([kept, chunk], ignore_index=True)
+        combined_keys = np.concatenate([keys, chunk_keys])
+        if len(combined) > n:
+            keep = np.sort(np.argpartition(combined_keys, n - 1)[:n])
+            combined, combined_keys = combined.iloc[keep].reset_index(drop=True), combined_keys[keep]
+        kept, keys = combined, combined_keys
+    if kept is None:
+        return pd.DataFrame(columns=columns or [])
+    return kept
@@ -0,0 +1,132 @@
+"""Bounded thread-pool fan-out for independent dashboard queries.
+
+Queries that only wait on the database (row counts, per-table metadata,
+the cross-table summaries) can run side by side. ``QueryExecutor`` runs
+them on a shared pool with a concurrency cap and hands results back in
+completion order so the page can render each one as soon as it is ready.
+
+Page fetches a user is waiting on go through :func:`get_interactive_executor`
+instead, so background scans (exact counts, column profiles) queued on the
+shared pool never hold them up.
+"""
+
+import contextvars
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("DB_QUERY_CONCURRENCY", "4"))
+DEFAULT_INTERACTIVE_CONCURRENCY = int(os.getenv("DB_INTERACTIVE_CONCURRENCY", "8"))
+
+
+def _with_script_context(fn: Callable) -> Callable:
+    """Attach the caller's Streamlit script context to the worker thread.
+
+    Without it, ``st.cache_data`` and friends warn about a missing
+    ScriptRunContext when called off the main script thread.
+    """
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    except ImportError:
+        return fn
+
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return fn
+
+    def run(*args, **kwargs):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args, **kwargs)
+
+    return run
+
+
+class QueryExecutor:
+    """Run independent callables concurrently, at most ``max_concurrency`` at a time"""
+
+    def __init__(self, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, name: str = "dash-query"):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=name)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        # A copy of the caller's context carries its query scope (utils.inflight)
+        ctx = contextvars.copy_context()
+        return self._pool.submit(ctx.run, _with_script_context(fn), *args, **kwargs)
+
+    def as_completed(
+        self,
+        tasks: Dict[Hashable, Tuple],
+        timeout: Optional[float] = None,
+    ) -> Iterator[Tuple[Hashable, object, Optional[BaseException]]]:
+        """Run ``{key: (fn, *args)}`` and yield ``(key, result, error)`` as each finishes.
+
+        A failing task yields its exception instead of raising, so one bad
+        query does not hide the others. Tasks not yet started are cancelled
+        if the consumer stops iterating early.
+        """
+        futures = {self.submit(fn, *args): key for key, (fn, *args) in tasks.items()}
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"{len(pending)} queries still running after {timeout}s")
+                for future in done:
+                    error = future.exception()
+                    yield futures[future], (None if error else future.result()), error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def map(self, tasks: Dict[Hashable, Tuple], timeout: Optional[float] = None) -> Dict[Hashable, object]:
+        """Run tasks concurrently and return ``{key: result}``, raising the first error"""
+        results = {}
+        for key, result, error in self.as_completed(tasks, timeout):
+            if error is not None:
+                raise error
+            results[key] = result
+        return results
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def wait_interruptibly(future: Future, slot, message: str, poll: float = 0.25):
+    """Block on ``future`` while keeping the Streamlit script interruptible.
+
+    Streamlit only stops a script for a newer rerun between element updates,
+    so ``slot`` (an ``st.empty()`` placeholder) is refreshed every ``poll``
+    seconds. An abandoned query is then cancelled by the next run's
+    :func:`utils.inflight.query_scope`.
+    """
+    while not future.done():
+        slot.caption(message)
+        wait([future], timeout=poll)
+    slot.empty()
+    return future.result()
+
+
+_executor: Optional[QueryExecutor] = None
+_interactive_executor: Optional[QueryExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> QueryExecutor:
+    """Process-wide executor shared by every page and session, for fan-out and background scans"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = QueryExecutor()
+        return _executor
+
+
+def get_interactive_executor() -> QueryExecutor:
+    """Process-wide executor reserved for page fetches a user is waiting on (DB_INTERACTIVE_CONCURRENCY)"""
+    global _interactive_executor
+    with _executor_lock:
+        if _interactive_executor is None:
+            _interactive_executor = QueryExecutor(DEFAULT_INTERACTIVE_CONCURRENCY, name="dash-interactive")
+        return _interactive_executor
@@ -0,0 +1,173 @@
+"""Index-backed full-text search over chat message bodies.
+
+``content ILIKE '%q%'`` has to read every message. Here the search runs
+against ``to_tsvector(<config>, coalesce(content, ''))``, which a GIN
+expression index (:func:`fulltext_index_ddl`) can answer directly, so the
+table needs no new column. The SQL fragments below must match the index
+expression exactly for the planner to use it, so queries build them with
+these helpers rather than by hand.
+
+Search box syntax (see :func:`build_tsquery`): words are ANDed, ``"a b"``
+is a phrase, ``word*`` a prefix, ``-word`` excludes and ``OR`` between
+terms makes an alternative.
+"""
+
+import html
+import os
+import re
+from typing import Dict, List, Tuple
+
+FTS_CONFIG = os.getenv("MESSAGES_FTS_CONFIG", "english")
+# Relevance is computed for at most this many of the newest matches, so a
+# very common term costs the same however long the history grows
+MAX_RANKED_MATCHES = int(os.getenv("MESSAGES_FTS_MAX_RANKED", "5000"))
+
+# Markers ts_headline puts around matches; swapped for <mark> after escaping
+_SEL_START, _SEL_STOP = "⟦", "⟧"
+HEADLINE_OPTIONS = (f'StartSel="{_SEL_START}", StopSel="{_SEL_STOP}", '
+                    'MaxFragments=2, MaxWords=20, MinWords=6, FragmentDelimiter=" … "')
+
+_CONFIG_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+_TOKEN_RE = re.compile(r'-?"[^"]*"?|\S+')
+_WORD_RE = re.compile(r"\w+")
+
+
+def _config(config: str) -> str:
+    # Inlined as a literal: the planner only matches the index for a constant config
+    if not _CONFIG_RE.match(config):
+        raise ValueError(f"Invalid text search configuration: {config!r}")
+    return config
+
+
+def tsvector_sql(column: str = "content", config: str = FTS_CONFIG) -> str:
+    """The indexed document expression"""
+    return f"to_tsvector('{_config(config)}', coalesce({column}, ''))"
+
+
+def tsquery_sql(placeholder: str = ":tsq", config: str = FTS_CONFIG) -> str:
+    """Query expression for a bound :func:`build_tsquery` string"""
+    return f"to_tsquery('{_config(config)}', {placeholder})"
+
+
+def match_sql(column: str = "content", placeholder: str = ":tsq", config: str = FTS_CONFIG) -> str:
+    """WHERE predicate that can use the GIN index"""
+    return f"{tsvector_sql(column, config)} @@ {tsquery_sql(placeholder, config)}"
+
+
+def rank_sql(column: str = "content", placeholder: str = ":tsq", config: str = FTS_CONFIG) -> str:
+    """Cover-density rank, normalised by document length"""
+    return f"ts_rank_cd({tsvector_sql(column, config)}, {tsquery_sql(placeholder, config)}, 1)::float8"
+
+
+def headline_sql(column: str = "content", placeholder: str = ":tsq", config: str = FTS_CONFIG) -> str:
+    """Snippet of ``column`` around the matches, for :func:`highlight_html`"""
+    return (f"ts_headline('{_config(config)}', coalesce({column}, ''), "
+            f"{tsquery_sql(placeholder, config)}, '{HEADLINE_OPTIONS}')")
+
+
+def fulltext_index_ddl(schema: str, table: str = "chat_messages", column: str = "content",
+                       config: str = FTS_CONFIG) -> str:
+    """GIN expression index serving :func:`match_sql`"""
+    return (f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_{table}_{column}_fts" '
+            f'ON "{schema}"."{table}" USING gin ({tsvector_sql(column, config)});')
+
+
+def has_fulltext_index(conn, schema: str, table: str = "chat_messages", column: str = "content") -> bool:
+    """Whether a GIN index on a to_tsvector(... column ...) expression exists"""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE schemaname = %(schema)s AND tablename = %(table)s
+                  AND indexdef ILIKE '%%USING gin%%to_tsvector%%'
+                  AND indexdef ~ %(column)s
+            )
+            """,
+            {"schema": schema, "table": table, "column": rf"\m{column}\M"},
+        )
+        return bool(cur.fetchone()[0])
+
+
+def search_page_sql(schema: str, where_sql: str, params: Dict[str, object], page_size: int,
+                    anchor: Dict[str, object], candidates: int = MAX_RANKED_MATCHES) -> Tuple[str, Dict[str, object], str]:
+    """(SQL, bound params, sort direction) for one relevance-ranked page of chat_messages.
+
+    ``where_sql`` must contain :func:`match_sql` with ``params["tsq"]``
+    bound. Only the newest ``candidates`` matches are ranked, and snippets
+    are built only for the page's rows. ``anchor`` is {"mode": "first"} or
+    {"mode": "older"|"newer", "rank", "id"}; one extra row is fetched to
+    tell whether more follow.
+    """
+    mode = anchor.get("mode", "first")
+    page_params = dict(params)
+    seek, order = "", "DESC"
+    if mode == "older":
+        seek = "WHERE (rank, id) < (:k_rank, :k_id)"
+    elif mode == "newer":
+        seek, order = "WHERE (rank, id) > (:k_rank, :k_id)", "ASC"
+    if seek:
+        page_params.update({"k_rank": anchor["rank"], "k_id": anchor["id"]})
+    page_params["limit"] = int(page_size) + 1
+    page_params["candidates"] = int(candidates)
+
+    sql = f"""
+        SELECT id, session_id, message_type, timestamp, rank, {headline_sql()} AS snippet
+        FROM (
+            SELECT *
+            FROM (
+                SELECT id, session_id, message_type, content, timestamp, {rank_sql()} AS rank
+                FROM (
+                    SELECT id, session_id, message_type, content, timestamp
+                    FROM "{schema}"."chat_messages"
+                    WHERE {where_sql}
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT :candidates
+                ) AS recent
+            ) AS matches
+            {seek}
+            ORDER BY rank {order}, id {order}
+            LIMIT :limit
+        ) AS page
+        ORDER BY rank {order}, id {order}
+        """
+    return sql, page_params, order
+
+
+def _phrase(words: List[str], prefix: bool = False) -> str:
+    if prefix:
+        words = words[:-1] + [words[-1] + ":*"]
+    term = " <-> ".join(words)
+    return f"({term})" if len(words) > 1 else term
+
+
+def build_tsquery(text: str) -> str:
+    """Translate search-box input into ``to_tsquery`` syntax; "" when nothing searchable remains.
+
+    Only word characters reach the query, so user input cannot inject
+    tsquery operators.
+    """
+    parts: List[str] = []
+    op = " & "
+    for token in _TOKEN_RE.findall(text):
+        if token == "OR":
+            op = " | " if parts else op
+            continue
+        negate = token.startswith("-") and len(token) > 1
+        body = token[1:] if negate else token
+        if body.startswith('"'):
+            words, prefix = _WORD_RE.findall(body), False
+        else:
+            words, prefix = _WORD_RE.findall(body), body.endswith("*")
+        if not words:
+            continue
+        term = ("!" if negate else "") + _phrase(words, prefix)
+        parts.append(op + term if parts else term)
+        op = " & "
+    return "".join(parts)
+
+
+def highlight_html(snippet: str) -> str:
+    """HTML-escape a :func:`headline_sql` snippet and mark the matches"""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_SEL_START, "<mark>").replace(_SEL_STOP, "</mark>")
@@ -0,0 +1,229 @@
+"""Resource limits for ad-hoc SQL from the SQL Runner tabs.
+
+``QueryGovernor`` runs user SQL in the background inside a read-only
+transaction with a per-query ``statement_timeout``, reads the result in
+batches and stops once a row or byte budget is reached, caps how many
+queries one user may have in flight, and cancels a running statement with
+``pg_cancel_backend``.
+
+Input must be a single statement: ``SELECT 1; COMMIT; DELETE ...`` would
+otherwise end the read-only transaction and run the rest outside it. Even
+so, ``SET TRANSACTION READ ONLY`` only guards against mistakes. Functions
+can still have side effects. For a real guarantee, connect the SQL Runner
+with a database role that has only SELECT privileges.
+"""
+
+import itertools
+import os
+import re
+import threading
+import time
+from concurrent.futures import wait
+from typing import Dict, List, Optional
+
+import pandas as pd
+import psycopg2
+import psycopg2.errors
+
+from utils.cache import sizeof
+from utils.db import ConnectionPool, split_statements
+from utils.executor import QueryExecutor
+
+DEFAULT_STATEMENT_TIMEOUT = float(os.getenv("SQL_RUNNER_TIMEOUT", "30"))
+DEFAULT_MAX_ROWS = int(os.getenv("SQL_RUNNER_MAX_ROWS", "100000"))
+DEFAULT_MAX_BYTES = int(float(os.getenv("SQL_RUNNER_MAX_MB", "128")) * 1024 * 1024)
+DEFAULT_MAX_PER_USER = int(os.getenv("SQL_RUNNER_MAX_PER_USER", "2"))
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("SQL_RUNNER_CONCURRENCY", "4"))
+FETCH_BATCH = 2000
+
+# Statements a server-side cursor can stream; anything else uses a plain cursor
+_STREAMABLE_RE = re.compile(r"^\s*(select|with|values|table)\b", re.IGNORECASE)
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_job_ids = itertools.count(1)
+
+
+class ConcurrencyLimitExceeded(RuntimeError):
+    """The user already has the maximum number of queries running"""
+
+
+def current_user() -> str:
+    """Identity for per-user limits: the Streamlit session, if any"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return "anonymous"
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "anonymous"
+
+
+class QueryJob:
+    """A governed query; fields are updated by the worker as it runs"""
+
+    def __init__(self, sql: str, user: str):
+        self.id = next(_job_ids)
+        self.sql = sql
+        self.user = user
+        self.status = "queued"  # queued, running, finished, cancelled, timed_out, failed
+        self.pid: Optional[int] = None
+        self.rows = 0
+        self.bytes = 0
+        self.truncated: Optional[str] = None
+        self.error: Optional[str] = None
+        self.result: Optional[pd.DataFrame] = None
+        self.cancel_requested = False
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self._future = None
+
+    def done(self) -> bool:
+        return self._future is not None and self._future.done()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        wait([self._future], timeout=timeout)
+        return self.done()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+
+class QueryGovernor:
+    """Run ad-hoc SQL under a timeout, row/byte budget and per-user concurrency cap"""
+
+    def __init__(
+        self,
+        statement_timeout: float = DEFAULT_STATEMENT_TIMEOUT,
+        max_rows: int = DEFAULT_MAX_ROWS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_per_user: int = DEFAULT_MAX_PER_USER,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ):
+        self.statement_timeout = statement_timeout
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_per_user = max_per_user
+        self._executor = QueryExecutor(max_concurrency)
+        self._jobs: Dict[int, QueryJob] = {}
+        self._pools: Dict[int, ConnectionPool] = {}
+        self._lock = threading.Lock()
+
+    def active(self, user: Optional[str] = None) -> List[QueryJob]:
+        with self._lock:
+            return [j for j in self._jobs.values() if user is None or j.user == user]
+
+    def submit(self, pool: ConnectionPool, sql: str, user: Optional[str] = None,
+               params: Optional[dict] = None) -> QueryJob:
+        """Start ``sql`` in the background; raises ConcurrencyLimitExceeded past the per-user cap"""
+        job = QueryJob(sql, user or current_user())
+        with self._lock:
+            # A cancelled job is already on its way out and does not hold the user's slot
+            running = sum(1 for j in self._jobs.values() if j.user == job.user and not j.cancel_requested)
+            if running >= self.max_per_user:
+                raise ConcurrencyLimitExceeded(
+                    f"{running} queries already running for this session (limit {self.max_per_user}); "
+                    "wait for one to finish or cancel it"
+                )
+            self._jobs[job.id] = job
+            self._pools[job.id] = pool
+        job._future = self._executor.submit(self._run, job, pool, params)
+        return job
+
+    def cancel(self, job: QueryJob) -> bool:
+        """Ask Postgres to cancel the job's statement; returns False if it was not running"""
+        job.cancel_requested = True
+        with self._lock:
+            pool = self._pools.get(job.id)
+        if pool is None or job.pid is None:
+            return False
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_cancel_backend(%s)", (job.pid,))
+                return bool(cur.fetchone()[0])
+
+    def _run(self, job: QueryJob, pool: ConnectionPool, params: Optional[dict]):
+        try:
+            if job.cancel_requested:
+                job.status = "cancelled"
+                return
+            statements = split_statements(job.sql)
+            if len(statements) != 1:
+                raise ValueError(f"Expected one SQL statement, got {len(statements)}; run statements one at a time")
+            sql = statements[0]
+            with pool.connection() as conn:
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT pg_backend_pid()")
+                        job.pid = cur.fetchone()[0]
+                        cur.execute("SET TRANSACTION READ ONLY")
+                        cur.execute("SET LOCAL statement_timeout = %s", (int(self.statement_timeout * 1000),))
+                    job.status = "running"
+                    streamable = bool(_STREAMABLE_RE.match(_COMMENT_RE.sub(" ", sql)))
+                    cursor = conn.cursor(name=f"dash_governed_{job.id}") if streamable else conn.cursor()
+                    with cursor as cur:
+                        cur.execute(sql, params)
+                        job.result = self._fetch(job, cur)
+                    conn.rollback()
+                finally:
+                    # Once pooled, the backend may run someone else's query; a late cancel must not reach it
+                    job.pid = None
+            job.status = "finished"
+        except psycopg2.errors.QueryCanceled as e:
+            # statement_timeout and pg_cancel_backend both surface as QueryCanceled
+            job.status = "cancelled" if job.cancel_requested else "timed_out"
+            job.error = str(e).strip()
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e).strip()
+        finally:
+            job.finished = time.monotonic()
+            with self._lock:
+                self._jobs.pop(job.id, None)
+                self._pools.pop(job.id, None)
+
+    def _fetch(self, job: QueryJob, cur) -> Optional[pd.DataFrame]:
+        """Read the cursor in batches until exhausted or a budget is hit"""
+        if cur.name is None and cur.description is None:
+            return None  # statement without a result set
+        chunks, columns = [], None
+        while True:
+            batch = cur.fetchmany(min(FETCH_BATCH, self.max_rows - job.rows + 1))
+            if columns is None:
+                columns = [d[0] for d in cur.description or []]
+            if not batch:
+                break
+            if job.rows + len(batch) > self.max_rows:
+                batch = batch[: self.max_rows - job.rows]
+                job.truncated = f"row limit ({self.max_rows:,} rows)"
+            chunk = pd.DataFrame.from_records(batch, columns=columns)
+            chunks.append(chunk)
+            job.rows += len(chunk)
+            job.bytes += sizeof(chunk)
+            if job.truncated:
+                break
+            if job.bytes >= self.max_bytes:
+                job.truncated = f"size limit ({self.max_bytes / 1024 ** 2:,.0f} MB)"
+                break
+        if not chunks:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    def limits(self) -> Dict[str, float]:
+        return {
+            "statement_timeout_s": self.statement_timeout,
+            "max_rows": self.max_rows,
+            "max_bytes": self.max_bytes,
+            "max_per_user": self.max_per_user,
+        }
+
+
+_governor: Optional[QueryGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> QueryGovernor:
+    """Process-wide governor shared by every SQL Runner session"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = QueryGovernor()
+        return _governor
@@ -0,0 +1,149 @@
+"""Incremental, watermark-based sync of append-mostly tables.
+
+``chat_feedback`` and ``otps`` only grow at the tail (``id`` /
+``created_at``), so after the first full load a refresh fetches just the
+rows above the last seen ``id`` plus a bounded re-check window of recent
+``created_at`` values (e.g. an OTP flipping to ``is_used``), and merges them
+into the in-memory Arrow table. Refresh cost then scales with new data, not
+table size.
+"""
+
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Hashable, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.db import copy_query_arrow
+
+DEFAULT_RECHECK_WINDOW = timedelta(hours=float(os.getenv("SYNC_RECHECK_HOURS", "24")))
+DEFAULT_MIN_INTERVAL = float(os.getenv("SYNC_MIN_INTERVAL", "30"))
+
+
+def tail_query(relation: str, key_col: str, ts_col: Optional[str], max_id, max_ts, recheck_window: timedelta):
+    """SELECT for rows past ``max_id`` or inside the re-check window below ``max_ts``"""
+    where = f'"{key_col}" > %(max_id)s'
+    params = {"max_id": max_id}
+    if ts_col and max_ts is not None:
+        where += f' OR "{ts_col}" >= %(recheck_from)s'
+        params["recheck_from"] = max_ts - recheck_window
+    return f"SELECT * FROM {relation} WHERE {where}", params
+
+
+class IncrementalTable:
+    """Keeps one table mirrored in memory, refreshing by high-water mark"""
+
+    def __init__(
+        self,
+        table: str,
+        schema: str = "public",
+        key_col: str = "id",
+        ts_col: str = "created_at",
+        recheck_window: timedelta = DEFAULT_RECHECK_WINDOW,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+    ):
+        self.table = table
+        self.schema = schema
+        self.key_col = key_col
+        self.ts_col = ts_col
+        self.recheck_window = recheck_window
+        self.min_interval = min_interval
+
+        self._data: Optional[pa.Table] = None
+        self._max_id = None
+        self._max_ts = None
+        self._deletes = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"full_loads": 0, "incremental_loads": 0, "rows_fetched": 0, "skipped": 0}
+
+    @property
+    def _relation(self) -> str:
+        return f'"{self.schema}"."{self.table}"'
+
+    def _delete_counter(self, conn) -> Optional[int]:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT n_tup_del FROM pg_stat_user_tables WHERE schemaname = %s AND relname = %s",
+                (self.schema, self.table),
+            )
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def _remember_marks(self, data: pa.Table):
+        if data.num_rows == 0:
+            self._max_id = self._max_ts = None
+            return
+        self._max_id = pc.max(data.column(self.key_col)).as_py()
+        self._max_ts = pc.max(data.column(self.ts_col)).as_py()
+
+    def reset(self):
+        """Forget the mirrored rows; the next refresh is a full load"""
+        with self._lock:
+            self._data = None
+            self._last_refresh = 0.0
+
+    def refresh(self, conn, force: bool = False) -> pa.Table:
+        """Bring the mirror up to date and return it.
+
+        ``conn`` must be a primary connection: the delete counter and the rows
+        are read on it, and a standby's statistics never see the deletes.
+        """
+        with self._lock:
+            if not force and self._data is not None and time.monotonic() - self._last_refresh < self.min_interval:
+                self.stats["skipped"] += 1
+                return self._data
+
+            deletes = self._delete_counter(conn)
+            # Deleted rows cannot be seen from the tail, so reload when deletes happened
+            if self._data is None or self._max_id is None or deletes != self._deletes:
+                data = copy_query_arrow(conn, f"SELECT * FROM {self._relation}")
+                self.stats["full_loads"] += 1
+                self.stats["rows_fetched"] += data.num_rows
+            else:
+                sql, params = tail_query(
+                    self._relation, self.key_col, self.ts_col, self._max_id, self._max_ts, self.recheck_window
+                )
+                delta = copy_query_arrow(conn, sql, params)
+                self.stats["incremental_loads"] += 1
+                self.stats["rows_fetched"] += delta.num_rows
+                data = self._merge(delta)
+
+            self._data = data
+            self._deletes = deletes
+            self._remember_marks(data)
+            self._last_refresh = time.monotonic()
+            return data
+
+    def _merge(self, delta: pa.Table) -> pa.Table:
+        if delta.num_rows == 0:
+            return self._data
+        # Re-checked rows replace their previous version
+        stale = pc.is_in(self._data.column(self.key_col), value_set=delta.column(self.key_col).combine_chunks())
+        kept = self._data.filter(pc.invert(stale))
+        return pa.concat_tables([kept, delta.cast(kept.schema)])
+
+
+_tables: Dict[Tuple, IncrementalTable] = {}
+_tables_lock = threading.Lock()
+
+
+def get_incremental_table(target: Hashable, table: str, **options) -> IncrementalTable:
+    """Process-wide mirror of ``table`` for a database ``target`` (e.g. its pool)"""
+    key = (target, options.get("schema", "public"), table)
+    with _tables_lock:
+        mirror = _tables.get(key)
+        if mirror is None:
+            mirror = _tables[key] = IncrementalTable(table, **options)
+        return mirror
+
+
+def reset_incremental_tables():
+    """Force the next refresh of every mirror to be a full reload"""
+    with _tables_lock:
+        mirrors = list(_tables.values())
+    for mirror in mirrors:
+        mirror.reset()
@@ -0,0 +1,254 @@
+"""Index advisor for the dashboards' hot predicates.
+
+The dashboards filter a handful of tables in a few fixed ways: keyset pages
+over ``chat_messages (timestamp, id)``, ``session_id`` / ``content`` ILIKE
+searches, ``created_at`` ranges from the sidebar, ``rating`` drill-downs and
+OTP lookups. :data:`DASHBOARD_NEEDS` lists those access paths.
+:func:`advise` checks each one against the indexes that exist (``pg_index``
+/ ``pg_indexes``) and the scan counters in ``pg_stat_user_tables``, lists
+indexes that have never been scanned, and produces a migration script with
+the missing B-tree, trigram / full-text GIN and BRIN indexes.
+"""
+
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from utils.fulltext import tsvector_sql
+
+# Below this many rows a sequential scan is cheap enough not to matter
+SMALL_TABLE_ROWS = 10000
+# BRIN only pays off when physical order follows the column
+BRIN_MIN_CORRELATION = 0.9
+_MAX_IDENTIFIER = 63
+
+
+class IndexNeed:
+    """One access path a dashboard query relies on"""
+
+    def __init__(self, table: str, columns: Sequence[str], method: str = "btree", reason: str = ""):
+        if method not in ("btree", "brin", "gin_trgm", "gin_fts"):
+            raise ValueError(f"Unsupported index method: {method}")
+        self.table = table
+        self.columns = tuple(columns)
+        self.method = method
+        self.reason = reason
+
+    @property
+    def name(self) -> str:
+        suffix = {"btree": "", "brin": "_brin", "gin_trgm": "_trgm", "gin_fts": "_fts"}[self.method]
+        return f"idx_{self.table}_{'_'.join(self.columns)}{suffix}"[:_MAX_IDENTIFIER]
+
+    def ddl(self, schema: str) -> str:
+        """``CREATE INDEX CONCURRENTLY`` statement for this need"""
+        if self.method == "gin_trgm":
+            using, cols = "gin", ", ".join(f'"{c}" gin_trgm_ops' for c in self.columns)
+        elif self.method == "gin_fts":
+            using, cols = "gin", tsvector_sql(self.columns[0])
+        else:
+            using, cols = self.method, ", ".join(f'"{c}"' for c in self.columns)
+        return (f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{self.name}" '
+                f'ON "{schema}"."{self.table}" USING {using} ({cols});')
+
+    def with_method(self, method: str) -> "IndexNeed":
+        return IndexNeed(self.table, self.columns, method, self.reason)
+
+    def __repr__(self) -> str:
+        return f"IndexNeed({self.table!r}, {self.columns!r}, {self.method!r})"
+
+
+DASHBOARD_NEEDS: List[IndexNeed] = [
+    IndexNeed("chat_messages", ("timestamp", "id"), reason="Messages Viewer keyset pages and date filters"),
+    IndexNeed("chat_messages", ("session_id", "timestamp"), reason="Conversation lookup by exact session_id"),
+    IndexNeed("chat_messages", ("message_type", "timestamp"), reason="Messages Viewer message_type filter"),
+    IndexNeed("chat_messages", ("session_id",), "gin_trgm", "Messages Viewer 'Session ID contains' (ILIKE)"),
+    IndexNeed("chat_messages", ("content",), "gin_fts", "Messages Viewer full-text search"),
+    IndexNeed("chat_messages", ("content",), "gin_trgm", "Messages Viewer substring search (ILIKE fallback)"),
+    IndexNeed("chat_feedback", ("created_at",), "brin", "Sidebar date range"),
+    IndexNeed("chat_feedback", ("rating", "created_at"), reason="Rating distribution drill-down"),
+    IndexNeed("otps", ("created_at",), "brin", "Sidebar date range and daily OTP usage"),
+    IndexNeed("otps", ("user_id",), reason="OTP usage by user"),
+    IndexNeed("otps", ("is_used", "created_at"), reason="Used / unused OTP breakdown"),
+]
+
+_INDEXES_SQL = """
+    SELECT t.relname AS table_name,
+           i.relname AS index_name,
+           am.amname AS method,
+           ARRAY(SELECT pg_get_indexdef(ix.indexrelid, k + 1, true)
+                 FROM generate_subscripts(ix.indkey, 1) AS k ORDER BY k) AS columns,
+           pi.indexdef AS definition,
+           ix.indisunique OR ix.indisprimary AS is_unique,
+           ix.indpred IS NOT NULL AS is_partial,
+           COALESCE(s.idx_scan, 0) AS idx_scan,
+           pg_relation_size(ix.indexrelid) AS size_bytes
+    FROM pg_index ix
+    JOIN pg_class i ON i.oid = ix.indexrelid
+    JOIN pg_class t ON t.oid = ix.indrelid
+    JOIN pg_namespace n ON n.oid = t.relnamespace
+    JOIN pg_am am ON am.oid = i.relam
+    JOIN pg_indexes pi ON pi.schemaname = n.nspname AND pi.indexname = i.relname
+    LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = ix.indexrelid
+    WHERE n.nspname = %(schema)s
+    ORDER BY t.relname, i.relname
+"""
+
+_TABLE_STATS_SQL = """
+    SELECT relname AS table_name, seq_scan, seq_tup_read, COALESCE(idx_scan, 0) AS idx_scan,
+           n_live_tup, pg_total_relation_size(relid) AS size_bytes
+    FROM pg_stat_user_tables
+    WHERE schemaname = %(schema)s
+"""
+
+_CORRELATION_SQL = """
+    SELECT tablename AS table_name, attname AS column_name, correlation
+    FROM pg_stats
+    WHERE schemaname = %(schema)s
+"""
+
+_CONTEXT_SQL = """
+    SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'),
+           (SELECT stats_reset FROM pg_stat_database WHERE datname = current_database())
+"""
+
+
+def _frame(conn, sql: str, params: Dict[str, object]) -> pd.DataFrame:
+    with conn.cursor() as cur:
+        cur.execute(sql, params)
+        columns = [d[0] for d in cur.description]
+        return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+
+
+def _strip_quotes(column: str) -> str:
+    return column.strip().strip('"')
+
+
+def _covering_index(need: IndexNeed, indexes: pd.DataFrame) -> Tuple[str, Optional[str]]:
+    """("covered" | "partial" | "missing", index name) for ``need`` among ``indexes``"""
+    partial = None
+    for row in indexes.itertuples(index=False):
+        if row.is_partial:
+            continue  # only serves queries that repeat its predicate
+        cols = tuple(_strip_quotes(c) for c in row.columns)
+        if need.method == "gin_trgm":
+            if row.method in ("gin", "gist") and need.columns[0] in cols and "trgm_ops" in row.definition:
+                return "covered", row.index_name
+            continue
+        if need.method == "gin_fts":
+            mentions = re.search(rf"\b{re.escape(need.columns[0])}\b", row.definition)
+            if row.method == "gin" and "to_tsvector" in row.definition and mentions:
+                return "covered", row.index_name
+            continue
+        if need.method == "brin" and row.method == "brin" and cols[:1] == need.columns[:1]:
+            return "covered", row.index_name
+        if row.method == "btree":
+            # A B-tree serves the range a BRIN would, and leading-column prefixes serve equality
+            if cols[:len(need.columns)] == need.columns:
+                return "covered", row.index_name
+            if cols[:1] == need.columns[:1]:
+                partial = partial or row.index_name
+    return ("partial", partial) if partial else ("missing", None)
+
+
+class IndexReport:
+    """Result of :func:`advise`"""
+
+    def __init__(self, schema: str, recommendations: pd.DataFrame, unused: pd.DataFrame,
+                 tables: pd.DataFrame, needs: List[IndexNeed], has_trgm: bool, stats_reset=None):
+        self.schema = schema
+        self.recommendations = recommendations
+        self.unused = unused
+        self.tables = tables
+        self.needs = needs
+        self.has_trgm = has_trgm
+        self.stats_reset = stats_reset
+
+    def missing(self) -> pd.DataFrame:
+        """Recommendations without a fully covering index, most urgent first"""
+        if self.recommendations.empty:
+            return self.recommendations
+        return self.recommendations[self.recommendations["status"] != "covered"]
+
+    def migration_sql(self) -> str:
+        """Ready-to-apply script creating the missing indexes"""
+        missing = [(self.needs[i], row) for i, row in self.missing().iterrows()]
+        lines = [
+            f"-- Index migration for schema \"{self.schema}\" generated {datetime.now():%Y-%m-%d %H:%M}",
+            "-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block:",
+            "-- apply these statements one at a time (e.g. psql without --single-transaction).",
+            "",
+        ]
+        if not missing:
+            lines.append("-- Every known dashboard predicate already has a supporting index.")
+        if any(need.method == "gin_trgm" for need, _ in missing) and not self.has_trgm:
+            lines += ["CREATE EXTENSION IF NOT EXISTS pg_trgm;", ""]
+        for need, row in missing:
+            lines.append(f"-- {need.reason} ({row['status']}; {row['seq_scan']:,} seq scans, "
+                         f"{row['idx_scan']:,} index scans)")
+            lines.append(need.ddl(self.schema))
+            lines.append("")
+        if not self.unused.empty:
+            since = f" since {self.stats_reset:%Y-%m-%d}" if self.stats_reset is not None else ""
+            lines.append(f"-- Never scanned{since}; check replicas and rare jobs before dropping:")
+            for row in self.unused.itertuples(index=False):
+                lines.append(f'-- DROP INDEX CONCURRENTLY IF EXISTS "{self.schema}"."{row.index_name}";  '
+                             f"-- {row.size_bytes / 1024 ** 2:,.1f} MB on {row.table_name}")
+        return "\n".join(lines).rstrip() + "\n"
+
+
+def advise(conn, schema: str = "public", needs: Sequence[IndexNeed] = DASHBOARD_NEEDS) -> IndexReport:
+    """Check ``needs`` against the live catalog and statistics of ``schema``"""
+    params = {"schema": schema}
+    indexes = _frame(conn, _INDEXES_SQL, params)
+    tables = _frame(conn, _TABLE_STATS_SQL, params).set_index("table_name")
+    correlation = _frame(conn, _CORRELATION_SQL, params)
+    with conn.cursor() as cur:
+        cur.execute(_CONTEXT_SQL)
+        has_trgm, stats_reset = cur.fetchone()
+    conn.rollback()
+
+    corr = {(r.table_name, r.column_name): r.correlation for r in correlation.itertuples(index=False)}
+    resolved, rows = [], []
+    for need in needs:
+        if need.table not in tables.index:
+            continue
+        c = corr.get((need.table, need.columns[0]))
+        if need.method == "brin" and c is not None and abs(c) < BRIN_MIN_CORRELATION:
+            need = need.with_method("btree")  # rows are not stored in column order
+        status, index_name = _covering_index(need, indexes[indexes["table_name"] == need.table])
+        stats = tables.loc[need.table]
+        small = stats["n_live_tup"] < SMALL_TABLE_ROWS
+        if status == "covered":
+            priority = "-"
+        elif small:
+            priority = "low"
+        elif stats["seq_scan"] > stats["idx_scan"]:
+            priority = "high"
+        else:
+            priority = "medium"
+        resolved.append(need)
+        rows.append({
+            "table": need.table,
+            "columns": ", ".join(need.columns),
+            "method": need.method,
+            "used_for": need.reason,
+            "status": status,
+            "index": index_name,
+            "priority": priority,
+            "seq_scan": int(stats["seq_scan"]),
+            "seq_tup_read": int(stats["seq_tup_read"]),
+            "idx_scan": int(stats["idx_scan"]),
+            "live_rows": int(stats["n_live_tup"]),
+            "correlation": c,
+        })
+
+    recommendations = pd.DataFrame(rows)
+    if not recommendations.empty:
+        order = recommendations["priority"].map({"high": 0, "medium": 1, "low": 2, "-": 3})
+        recommendations = recommendations.loc[order.sort_values(kind="stable").index]
+    unused = indexes[(indexes["idx_scan"] == 0) & ~indexes["is_unique"]]
+    unused = unused[["table_name", "index_name", "method", "definition", "size_bytes"]].sort_values(
+        "size_bytes", ascending=False).reset_index(drop=True)
+    return IndexReport(schema, recommendations, unused, tables.reset_index(), resolved, has_trgm, stats_reset)
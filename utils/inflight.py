@@ -0,0 +1,121 @@
+"""Cancel database work that a newer Streamlit rerun has superseded.
+
+Queries started inside ``query_scope(name, key)`` are tracked per browser
+session. When a later rerun enters the same scope with a different key
+(e.g. the Messages Viewer filters or the sidebar date range changed), the
+connections still working for the old key get a protocol-level cancel
+request, which frees the backend and returns the pooled connection instead
+of letting an abandoned query run to completion.
+
+Tracking happens when a pooled connection is checked out, so any helper
+called inside the scope is covered, including work handed to
+:class:`utils.executor.QueryExecutor` (which runs tasks in a copy of the
+caller's context).
+"""
+
+import contextvars
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Hashable, Optional, Set, Tuple
+
+_current_scope: contextvars.ContextVar = contextvars.ContextVar("query_scope", default=None)
+# Current keys remembered for this many (session, scope) pairs; the oldest are dropped
+MAX_SCOPES = 4096
+
+
+def current_session() -> str:
+    """Streamlit session id of the running script, if any"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return "default"
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "default"
+
+
+class InflightQueries:
+    """Registry of checked-out connections by (session, scope name, key)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._active: Dict[object, Tuple[str, str, Hashable]] = {}
+        self._cancelling: Set[object] = set()
+        self._latest: "OrderedDict[Tuple[str, str], Hashable]" = OrderedDict()
+        self._stats = {"tracked": 0, "cancelled": 0}
+
+    def register(self, conn):
+        scope = _current_scope.get()
+        if scope is None:
+            return
+        with self._lock:
+            self._active[conn] = scope
+            self._stats["tracked"] += 1
+
+    def unregister(self, conn):
+        with self._released:
+            self._active.pop(conn, None)
+            # Hold the release until a cancel on its way to this connection
+            # has been sent, so it cannot hit the connection's next query
+            while conn in self._cancelling:
+                self._released.wait()
+
+    def supersede(self, session: str, name: str, key: Hashable) -> int:
+        """Make ``key`` current for the scope and cancel work for any other key"""
+        with self._lock:
+            self._latest[(session, name)] = key
+            self._latest.move_to_end((session, name))
+            while len(self._latest) > MAX_SCOPES:
+                self._latest.popitem(last=False)
+            stale = [c for c, (s, n, k) in self._active.items() if s == session and n == name and k != key]
+            for conn in stale:
+                del self._active[conn]
+            self._cancelling.update(stale)
+            self._stats["cancelled"] += len(stale)
+        # Cancel requests are network round trips; send them without blocking other sessions
+        try:
+            for conn in stale:
+                try:
+                    conn.cancel()
+                except Exception:
+                    pass
+        finally:
+            with self._released:
+                self._cancelling.difference_update(stale)
+                self._released.notify_all()
+        return len(stale)
+
+    def superseded(self) -> bool:
+        """True when the caller's scope has been replaced by a newer key"""
+        scope = _current_scope.get()
+        if scope is None:
+            return False
+        session, name, key = scope
+        with self._lock:
+            return self._latest.get((session, name), key) != key
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["in_flight"] = len(self._active)
+        return snapshot
+
+
+_inflight = InflightQueries()
+
+
+def get_inflight() -> InflightQueries:
+    return _inflight
+
+
+@contextmanager
+def query_scope(name: str, key: Hashable, session: Optional[str] = None):
+    """Tag queries started in this block; entering with a new ``key`` cancels the old ones"""
+    scope = (session or current_session(), name, key)
+    _inflight.supersede(*scope)
+    token = _current_scope.set(scope)
+    try:
+        yield
+    finally:
+        _current_scope.reset(token)
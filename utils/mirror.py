@@ -0,0 +1,301 @@
+"""Optional DuckDB analytical mirror of the chatbot tables.
+
+Heavy group-bys over chat_messages or the feedback/OTP history are a poor
+fit for the OLTP primary. When ``duckdb`` is installed, ``DuckDBMirror``
+keeps a local columnar copy of the chatbot tables in one DuckDB file per
+Postgres database, refreshed with the same id/created_at tail sync as
+:mod:`utils.incremental`, and answers analytical SQL (PostgreSQL-flavoured
+SELECTs mostly run unchanged) from it.
+
+The DuckDB file is opened without external access and with its
+configuration locked, so user SQL cannot read host files (``read_text``,
+``.env``), write them (``COPY ... TO``) or load extensions. On top of that,
+:meth:`DuckDBMirror.query_arrow` only runs a single SELECT, under a timeout
+and a row limit.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from utils.db import ConnectionPool, copy_query_arrow, strip_statement
+from utils.executor import get_executor
+from utils.incremental import DEFAULT_MIN_INTERVAL, DEFAULT_RECHECK_WINDOW, tail_query
+
+try:
+    import duckdb
+except ImportError:  # optional dependency
+    duckdb = None
+
+DEFAULT_MIRROR_PATH = os.getenv("DUCKDB_MIRROR_PATH", os.path.join(".cache", "mirror.duckdb"))
+FETCH_BATCH = 10000
+
+# table -> (key column, timestamp column for the late-update re-check window)
+MIRROR_TABLES = {
+    "chat_feedback": ("id", "created_at"),
+    "otps": ("id", "created_at"),
+    "otp_verifications": ("id", "created_at"),
+    "chat_sessions": ("id", "created_at"),
+    "chat_messages": ("id", "timestamp"),
+}
+
+
+def mirror_available() -> bool:
+    return duckdb is not None
+
+
+def _arrow_max(table: pa.Table, column: str):
+    if column not in table.column_names or table.num_rows == 0:
+        return None
+    return pc.max(table.column(column)).as_py()
+
+
+class DuckDBMirror:
+    """Local DuckDB copy of Postgres tables with incremental refresh"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_MIRROR_PATH,
+        pg_schema: str = "public",
+        tables: Optional[Dict[str, tuple]] = None,
+        recheck_window: timedelta = DEFAULT_RECHECK_WINDOW,
+        min_interval: float = DEFAULT_MIN_INTERVAL,
+    ):
+        if duckdb is None:
+            raise RuntimeError("duckdb is not installed; `pip install duckdb` to enable the analytical mirror")
+        self.path = path
+        self.pg_schema = pg_schema
+        self.tables = dict(MIRROR_TABLES if tables is None else tables)
+        self.recheck_window = recheck_window
+        self.min_interval = min_interval
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # No file, network or extension access from SQL; only this process's Arrow tables get in
+        self._con = duckdb.connect(path, config={"enable_external_access": False, "lock_configuration": True})
+        self._con.execute(f'CREATE SCHEMA IF NOT EXISTS "{pg_schema}"')
+        self._con.execute("CREATE TABLE IF NOT EXISTS main._mirror_state (table_name VARCHAR PRIMARY KEY, state VARCHAR)")
+        # State rows are keyed "schema.table" so several schemas can share one file
+        prefix = f"{pg_schema}."
+        self._state: Dict[str, dict] = {
+            name[len(prefix):]: json.loads(state)
+            for name, state in self._con.execute("SELECT * FROM main._mirror_state").fetchall()
+            if name.startswith(prefix)
+        }
+        self._lock = threading.Lock()
+        self._pending: Optional[Future] = None
+        self._pending_lock = threading.Lock()
+
+    # -- refresh ----------------------------------------------------------------
+
+    def _delete_counter(self, pg_conn, table: str) -> Optional[int]:
+        with pg_conn.cursor() as cur:
+            cur.execute(
+                "SELECT n_tup_del FROM pg_stat_user_tables WHERE schemaname = %s AND relname = %s",
+                (self.pg_schema, table),
+            )
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def _save_state(self, cur, table: str, state: dict):
+        cur.execute(
+            "INSERT OR REPLACE INTO main._mirror_state VALUES (?, ?)",
+            [f"{self.pg_schema}.{table}", json.dumps(state, default=str)],
+        )
+
+    def refresh_table(self, pg_conn, table: str, force: bool = False) -> dict:
+        """Bring one mirrored table up to date; returns its sync state.
+
+        ``pg_conn`` must be a primary connection: the delete counter and the
+        rows are read on it, and a standby's statistics never see the deletes.
+        """
+        key_col, ts_col = self.tables[table]
+        relation = f'"{self.pg_schema}"."{table}"'  # same name in Postgres and DuckDB
+        with self._lock:
+            state = self._state.get(table) or {}
+            if not force and state and time.time() - state.get("refreshed_at", 0) < self.min_interval:
+                return state
+
+            deletes = self._delete_counter(pg_conn, table)
+            cur = self._con.cursor()
+            # Data and sync state change in one transaction, so a failed refresh leaves both as they were
+            cur.execute("BEGIN TRANSACTION")
+            try:
+                incremental = (
+                    not force
+                    and state.get("max_id") is not None
+                    and state.get("deletes") == deletes
+                )
+                if incremental:
+                    max_ts = datetime.fromisoformat(state["max_ts"]) if state.get("max_ts") else None
+                    sql, params = tail_query(relation, key_col, ts_col, state["max_id"], max_ts, self.recheck_window)
+                    delta = copy_query_arrow(pg_conn, sql, params)
+                    try:
+                        if delta.num_rows:
+                            cur.register("_delta", delta)
+                            cur.execute(f'DELETE FROM {relation} WHERE "{key_col}" IN (SELECT "{key_col}" FROM _delta)')
+                            cur.execute(f'INSERT INTO {relation} SELECT * FROM _delta')
+                            cur.unregister("_delta")
+                        fetched, mode = delta, "incremental"
+                    except duckdb.Error:
+                        incremental = False  # e.g. the Postgres table changed shape
+                        cur.execute("ROLLBACK")
+                        cur.execute("BEGIN TRANSACTION")
+                if not incremental:
+                    data = copy_query_arrow(pg_conn, f"SELECT * FROM {relation}")
+                    cur.register("_full", data)
+                    cur.execute(f'CREATE OR REPLACE TABLE {relation} AS SELECT * FROM _full')
+                    cur.unregister("_full")
+                    fetched, mode = data, "full"
+                    state = {}
+
+                # Tail sync needs an integer key; otherwise every refresh is a full load
+                max_id = _arrow_max(fetched, key_col)
+                if max_id is not None and not isinstance(max_id, int):
+                    max_id = None
+                elif state.get("max_id") is not None:
+                    max_id = max(max_id or state["max_id"], state["max_id"])
+                max_ts = _arrow_max(fetched, ts_col)
+                if state.get("max_ts"):
+                    prev_ts = datetime.fromisoformat(state["max_ts"])
+                    max_ts = max(max_ts, prev_ts) if max_ts is not None else prev_ts
+                rows = cur.execute(f'SELECT COUNT(*) FROM {relation}').fetchone()[0]
+                state = {
+                    "max_id": max_id,
+                    "max_ts": max_ts.isoformat() if isinstance(max_ts, datetime) else None,
+                    "deletes": deletes,
+                    "rows": rows,
+                    "rows_fetched": fetched.num_rows,
+                    "mode": mode,
+                    "refreshed_at": time.time(),
+                }
+                self._save_state(cur, table, state)
+                cur.execute("COMMIT")
+            except BaseException:
+                with contextlib.suppress(duckdb.Error):  # already closed if COMMIT itself failed
+                    cur.execute("ROLLBACK")
+                raise
+            finally:
+                cur.close()
+            self._state[table] = state
+            return state
+
+    def refresh(self, pg_conn, force: bool = False, tables: Optional[List[str]] = None) -> Dict[str, dict]:
+        """Refresh every mirrored table (missing Postgres tables are reported, not raised)"""
+        results = {}
+        for table in tables or self.tables:
+            try:
+                results[table] = self.refresh_table(pg_conn, table, force=force)
+            except Exception as e:
+                pg_conn.rollback()
+                results[table] = {"error": str(e)}
+        return results
+
+    def _refresh_from_pool(self, pool: ConnectionPool, force: bool) -> Dict[str, dict]:
+        with pool.connection() as conn:
+            return self.refresh(conn, force=force)
+
+    def refresh_in_background(self, pool: ConnectionPool, force: bool = False) -> Future:
+        """Refresh on the shared executor from ``pool``, joining a refresh already under way.
+
+        Pass the primary's pool: the copy and its change counters then come
+        from the same server. A ``force`` request always queues a full reload.
+        """
+        with self._pending_lock:
+            if force or self._pending is None or self._pending.done():
+                self._pending = get_executor().submit(self._refresh_from_pool, pool, force)
+            return self._pending
+
+    @property
+    def loaded(self) -> bool:
+        """Whether any table has been copied yet"""
+        with self._lock:
+            return bool(self._state)
+
+    # -- queries ----------------------------------------------------------------
+
+    def query_arrow(self, sql: str, max_rows: Optional[int] = None,
+                    timeout: Optional[float] = None) -> Tuple[pa.Table, Optional[str]]:
+        """Run one SELECT against the mirror; returns the rows and the limit that cut them short, if any.
+
+        Anything other than a single SELECT (or WITH ... SELECT) raises
+        ValueError. ``timeout`` interrupts the query and raises TimeoutError;
+        reading stops after ``max_rows`` rows.
+        """
+        sql = strip_statement(sql)
+        statements = self._con.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise ValueError("The mirror only runs a single SELECT statement")
+        cur = self._con.cursor()
+        timer = threading.Timer(timeout, cur.interrupt) if timeout else None
+        try:
+            cur.execute(f"SET search_path = '{self.pg_schema},main'")
+            if timer is not None:
+                timer.start()
+            result = cur.execute(sql)
+            to_reader = getattr(result, "to_arrow_reader", None) or result.fetch_record_batch
+            reader = to_reader(FETCH_BATCH)
+            batches, rows, truncated = [], 0, None
+            for batch in reader:
+                if max_rows is not None and rows + batch.num_rows > max_rows:
+                    batches.append(batch.slice(0, max_rows - rows))
+                    truncated = f"row limit ({max_rows:,} rows)"
+                    break
+                batches.append(batch)
+                rows += batch.num_rows
+            return pa.Table.from_batches(batches, schema=reader.schema), truncated
+        except duckdb.InterruptException:
+            raise TimeoutError(f"Mirror query exceeded the {timeout:.0f}s timeout") from None
+        finally:
+            if timer is not None:
+                timer.cancel()
+            cur.close()
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            return [{"table": table, **state} for table, state in sorted(self._state.items())]
+
+
+_mirrors: Dict[tuple, DuckDBMirror] = {}
+_mirrors_lock = threading.Lock()
+
+
+def pg_target(connect_kwargs: Dict[str, object]) -> str:
+    """``user@host:port/dbname`` identifying the Postgres database a mirror copies
+
+    Accepts psycopg2's ``database`` alias, which the dashboards' configs use, for ``dbname``.
+    """
+    kwargs = dict(connect_kwargs)
+    kwargs.setdefault("dbname", kwargs.get("database"))
+    return "{}@{}:{}/{}".format(*(kwargs.get(k) or "" for k in ("user", "host", "port", "dbname")))
+
+
+def mirror_path(target: str, base: str = DEFAULT_MIRROR_PATH) -> str:
+    """Per-target mirror file: ``base`` with a digest of ``target`` before the extension"""
+    root, ext = os.path.splitext(base)
+    return f"{root}-{hashlib.sha1(target.encode()).hexdigest()[:12]}{ext}"
+
+
+def get_mirror(connect_kwargs: Dict[str, object], pg_schema: str = "public",
+               path: Optional[str] = None) -> DuckDBMirror:
+    """Process-wide mirror of one schema of the Postgres database ``connect_kwargs`` points at.
+
+    Each database gets its own DuckDB file unless ``path`` is given, so
+    mirrors of different servers never share tables or sync state.
+    """
+    target = pg_target(connect_kwargs)
+    path = path or mirror_path(target)
+    with _mirrors_lock:
+        mirror = _mirrors.get((target, path, pg_schema))
+        if mirror is None:
+            mirror = _mirrors[(target, path, pg_schema)] = DuckDBMirror(path, pg_schema=pg_schema)
+        return mirror
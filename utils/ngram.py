@@ -0,0 +1,107 @@
+"""Trigram substring search, in Postgres and over loaded columns.
+
+Server side, ``col ILIKE '%term%'`` can use a ``pg_trgm`` GIN index
+(:func:`trigram_index_ddl`) once the term has at least three characters;
+:func:`contains_pattern` builds that pattern with LIKE wildcards in the
+term escaped. Client side, :class:`NgramIndex` is the same idea for a
+column already in memory: a posting list per trigram, intersected for a
+lookup and then verified, so a search touches only candidate rows instead
+of every string.
+"""
+
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# pg_trgm (and NgramIndex) cannot narrow down terms shorter than this
+MIN_TRIGRAM_TERM = 3
+
+
+def contains_pattern(term: str) -> str:
+    """``%term%`` for LIKE/ILIKE, with ``\\``, ``%`` and ``_`` in ``term`` matched literally"""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def trigram_index_ddl(schema: str, table: str, column: str) -> str:
+    """GIN trigram index serving ``column ILIKE '%...%'``"""
+    return (f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_{table}_{column}_trgm" '
+            f'ON "{schema}"."{table}" USING gin ("{column}" gin_trgm_ops);')
+
+
+def has_trigram_index(conn, schema: str, table: str, column: str) -> bool:
+    """Whether a GIN/GiST trigram index covers ``column``"""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE schemaname = %(schema)s AND tablename = %(table)s
+                  AND indexdef ~ %(pattern)s
+            )
+            """,
+            {"schema": schema, "table": table, "pattern": rf"\m{column}\M\"? gi(n|st)_trgm_ops"},
+        )
+        return bool(cur.fetchone()[0])
+
+
+def _grams(text: str, n: int) -> Iterable[str]:
+    return (text[i:i + n] for i in range(len(text) - n + 1))
+
+
+class NgramIndex:
+    """Case-insensitive substring index over a column of strings.
+
+    ``search`` returns the labels of matching rows in their original order.
+    Terms shorter than ``n`` are matched against the distinct n-grams
+    rather than against every row.
+    """
+
+    def __init__(self, values: Iterable, labels: Optional[Iterable[Hashable]] = None, n: int = MIN_TRIGRAM_TERM):
+        self.n = n
+        self._texts: List[str] = ["" if v is None or v is pd.NA or v != v else str(v).casefold() for v in values]
+        self._labels = list(labels) if labels is not None else list(range(len(self._texts)))
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for pos, text in enumerate(self._texts):
+            for gram in set(_grams(text, n)):
+                postings[gram].append(pos)
+        self._postings = {g: np.asarray(p, dtype=np.int64) for g, p in postings.items()}
+        # Strings shorter than n have no n-grams; short terms must still find them
+        self._short = np.asarray([pos for pos, text in enumerate(self._texts) if 0 < len(text) < n], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate footprint, used by the result cache's size accounting"""
+        return sum(p.nbytes for p in self._postings.values()) + sum(len(t) for t in self._texts) + self._short.nbytes
+
+    def _candidates(self, term: str) -> np.ndarray:
+        if len(term) >= self.n:
+            lists = []
+            for gram in set(_grams(term, self.n)):
+                posting = self._postings.get(gram)
+                if posting is None:
+                    return np.empty(0, dtype=np.int64)
+                lists.append(posting)
+            lists.sort(key=len)
+            found = lists[0]
+            for posting in lists[1:]:
+                found = np.intersect1d(found, posting, assume_unique=True)
+                if not len(found):
+                    break
+            return found
+        # Short term: union the postings of every n-gram containing it
+        hits = [p for g, p in self._postings.items() if term in g] + [self._short]
+        return np.unique(np.concatenate(hits))
+
+    def search(self, term: str) -> List[Hashable]:
+        """Labels of rows containing ``term`` (case-insensitive, literal)"""
+        term = term.casefold()
+        if not term:
+            return list(self._labels)
+        # n-gram hits are only candidates: verify the substring actually occurs
+        return [self._labels[i] for i in self._candidates(term) if term in self._texts[i]]
@@ -0,0 +1,229 @@
+"""EXPLAIN (ANALYZE, BUFFERS) profiling for the SQL Runner.
+
+``explain_statement`` wraps a query so Postgres executes it and returns
+the measured plan as JSON. ``plan_nodes`` flattens that plan into one row
+per node with exclusive ("self") time and buffers, so the nodes that
+dominate a query stand out, along with how far the planner's row
+estimate was from the actual row count. ``PlanHistory`` keeps the
+plans of past runs per statement on disk so a later run can be
+compared with earlier ones.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from utils.cache import normalize_sql
+from utils.db import strip_statement
+
+DEFAULT_PLAN_HISTORY_PATH = os.getenv("APP_PLAN_HISTORY_PATH", os.path.join(".cache", "plans.jsonl"))
+DEFAULT_RUNS_PER_QUERY = 20
+
+# Thresholds used to flag nodes in the rendered plan
+HOT_TIME_SHARE = 0.2
+MISESTIMATE_FACTOR = 10.0
+
+_BUFFER_KEYS = {
+    "shared_hit": "Shared Hit Blocks",
+    "shared_read": "Shared Read Blocks",
+    "temp_read": "Temp Read Blocks",
+    "temp_written": "Temp Written Blocks",
+}
+
+
+def explain_statement(sql: str) -> str:
+    """``sql`` wrapped in EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON); note that it runs the query"""
+    return f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {strip_statement(sql)}"
+
+
+def parse_plan(result: pd.DataFrame) -> dict:
+    """Top-level plan object from the one-cell result of an EXPLAIN ... FORMAT JSON"""
+    raw = result.iloc[0, 0]
+    if isinstance(raw, str):
+        raw = json.loads(raw)
+    return raw[0] if isinstance(raw, list) else raw
+
+
+def _label(node: dict) -> str:
+    label = node.get("Node Type", "?")
+    if node.get("Index Name"):
+        label += f" using {node['Index Name']}"
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    return label
+
+
+def plan_nodes(plan: dict) -> pd.DataFrame:
+    """One row per plan node, in tree order, with inclusive and exclusive costs.
+
+    Times and row counts are multiplied by ``Actual Loops`` so they are per
+    query rather than per loop. ``misestimate`` is actual/estimated rows
+    (below 1 means the planner overestimated).
+    """
+    rows: List[Dict[str, object]] = []
+
+    def walk(node: dict, depth: int, parent: Optional[int]) -> dict:
+        loops = node.get("Actual Loops", 1) or 1
+        row = {
+            "id": len(rows),
+            "parent": parent,
+            "depth": depth,
+            "node": _label(node),
+            "est_rows": node.get("Plan Rows", 0) * loops,
+            "actual_rows": node.get("Actual Rows", 0) * loops,
+            "loops": loops,
+            "total_ms": node.get("Actual Total Time", 0.0) * loops,
+        }
+        for key, name in _BUFFER_KEYS.items():
+            row[key] = node.get(name, 0)
+        rows.append(row)
+        children = [walk(child, depth + 1, row["id"]) for child in node.get("Plans", [])]
+        # Inclusive figures include the children; subtract them for the node's own share
+        row["self_ms"] = max(row["total_ms"] - sum(c["total_ms"] for c in children), 0.0)
+        for key in _BUFFER_KEYS:
+            row[f"self_{key}"] = max(row[key] - sum(c[key] for c in children), 0)
+        return row
+
+    walk(plan["Plan"], 0, None)
+    df = pd.DataFrame(rows)
+    df["misestimate"] = df["actual_rows"].clip(lower=1) / df["est_rows"].clip(lower=1)
+    total = float(plan.get("Execution Time") or df["self_ms"].sum() or 1.0)
+    df["time_share"] = df["self_ms"] / total
+    return df
+
+
+def plan_summary(plan: dict) -> Dict[str, float]:
+    """Query-level timings, row count and buffer usage of an analysed plan"""
+    root = plan["Plan"]
+    hit, read = root.get("Shared Hit Blocks", 0), root.get("Shared Read Blocks", 0)
+    return {
+        "planning_ms": plan.get("Planning Time", 0.0),
+        "execution_ms": plan.get("Execution Time", 0.0),
+        "rows": root.get("Actual Rows", 0) * (root.get("Actual Loops", 1) or 1),
+        "shared_hit": hit,
+        "shared_read": read,
+        "hit_ratio": hit / (hit + read) if hit + read else 1.0,
+        "temp_written": root.get("Temp Written Blocks", 0),
+    }
+
+
+def plan_shape(plan: dict) -> str:
+    """Short fingerprint of the plan's node structure; changes when the planner picks a different plan"""
+    labels = plan_nodes(plan)
+    text = "|".join(f"{d}:{n}" for d, n in zip(labels["depth"], labels["node"]))
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:10]
+
+
+def compare_nodes(old: dict, new: dict) -> Optional[pd.DataFrame]:
+    """Per-node time and row changes between two runs, or None if the plan shape changed"""
+    before, after = plan_nodes(old), plan_nodes(new)
+    if list(before["node"]) != list(after["node"]) or list(before["depth"]) != list(after["depth"]):
+        return None
+    diff = after[["id", "depth", "node"]].copy()
+    diff["self_ms_before"] = before["self_ms"]
+    diff["self_ms_after"] = after["self_ms"]
+    diff["self_ms_change"] = after["self_ms"] - before["self_ms"]
+    diff["rows_before"] = before["actual_rows"]
+    diff["rows_after"] = after["actual_rows"]
+    return diff
+
+
+def runs_frame(runs: List[dict]) -> pd.DataFrame:
+    """One row per stored run with its summary and plan shape"""
+    records = []
+    for run in runs:
+        record = {"run_at": pd.Timestamp(run["at"], unit="s"), "shape": run["shape"]}
+        record.update(run["summary"])
+        records.append(record)
+    return pd.DataFrame(records)
+
+
+class PlanHistory:
+    """Analysed plans per statement, appended to a JSON-lines file"""
+
+    def __init__(self, path: str = DEFAULT_PLAN_HISTORY_PATH, runs_per_query: int = DEFAULT_RUNS_PER_QUERY):
+        self.path = path
+        self.runs_per_query = runs_per_query
+        self._runs: Optional[Dict[str, List[dict]]] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(sql: str) -> str:
+        return hashlib.sha1(normalize_sql(sql).encode("utf-8")).hexdigest()[:16]
+
+    def _load(self) -> Dict[str, List[dict]]:
+        if self._runs is None:
+            self._runs = {}
+            try:
+                with open(self.path, encoding="utf-8") as fh:
+                    for line in fh:
+                        try:
+                            run = json.loads(line)
+                        except ValueError:
+                            continue  # partially written line
+                        self._runs.setdefault(run["key"], []).append(run)
+            except OSError:
+                pass
+            dropped = 0
+            for runs in self._runs.values():
+                dropped += max(len(runs) - self.runs_per_query, 0)
+                del runs[:-self.runs_per_query]
+            if dropped:
+                self._rewrite()
+        return self._runs
+
+    def _rewrite(self):
+        """Rewrite the file with only the retained runs"""
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                for runs in self._runs.values():
+                    for run in runs:
+                        fh.write(json.dumps(run, default=str) + "\n")
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def record(self, sql: str, plan: dict) -> dict:
+        """Store a run of ``sql``; returns the stored entry"""
+        run = {
+            "key": self.key(sql),
+            "sql": normalize_sql(sql),
+            "at": time.time(),
+            "shape": plan_shape(plan),
+            "summary": plan_summary(plan),
+            "plan": plan,
+        }
+        with self._lock:
+            runs = self._load().setdefault(run["key"], [])
+            runs.append(run)
+            del runs[:-self.runs_per_query]
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as fh:
+                    fh.write(json.dumps(run, default=str) + "\n")
+            except OSError:
+                pass  # history is best effort; the run is still kept in memory
+        return run
+
+    def runs(self, sql: str) -> List[dict]:
+        """Earlier runs of ``sql``, oldest first"""
+        with self._lock:
+            return list(self._load().get(self.key(sql), []))
+
+_history: Optional[PlanHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_plan_history() -> PlanHistory:
+    """Process-wide plan history (APP_PLAN_HISTORY_PATH)"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = PlanHistory()
+        return _history
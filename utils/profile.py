@@ -0,0 +1,141 @@
+"""Column profiles computed in Postgres in a single scan.
+
+:func:`profile_sql` builds one ``SELECT`` with null counts, min/max and
+value lengths for every column of a table, so all of them come from one
+pass over the full table rather than from the EDA sample. Postgres has no
+built-in approximate distinct aggregate, and an exact ``COUNT(DISTINCT)``
+sorts every column. Distinct counts therefore come from the planner
+statistics (``pg_stats.n_distinct``), with an opt-in exact mode.
+:func:`profile_table` returns every statistic together with its basis:
+
+- ``exact``: computed over every row in the scan;
+- ``approximate``: from ANALYZE statistics;
+- ``sampled``: from the EDA sample (:func:`fill_sampled`).
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+_NUMERIC_TYPES = {"smallint", "integer", "bigint", "numeric", "real", "double precision", "money"}
+_TEXT_TYPES = {"text", "character varying", "character", "citext", "inet", "cidr"}
+_TIME_TYPES = {
+    "date", "time without time zone", "time with time zone",
+    "timestamp without time zone", "timestamp with time zone", "interval",
+}
+
+_N_DISTINCT_SQL = """
+    SELECT attname AS column_name, n_distinct
+    FROM pg_stats
+    WHERE schemaname = %(schema)s AND tablename = %(table)s
+"""
+
+
+def _kind(data_type: str) -> str:
+    if data_type in _NUMERIC_TYPES:
+        return "numeric"
+    if data_type in _TEXT_TYPES:
+        return "text"
+    if data_type in _TIME_TYPES:
+        return "time"
+    if data_type == "boolean":
+        return "boolean"
+    return "other"
+
+
+def profile_sql(schema: str, table: str, columns: Sequence[Tuple[str, str]], exact_distinct: bool = False) -> str:
+    """One-scan profile of ``columns`` ((name, information_schema data_type) pairs)"""
+    select = ['COUNT(*) AS "rows"']
+    for i, (name, data_type) in enumerate(columns):
+        col, kind = f'"{name}"', _kind(data_type)
+        select.append(f'COUNT({col}) AS "c{i}_non_null"')
+        if kind == "boolean":
+            select.append(f'MIN({col}::int)::text AS "c{i}_min"')
+            select.append(f'MAX({col}::int)::text AS "c{i}_max"')
+        elif kind != "other":  # json, uuid, arrays etc. get lengths only
+            select.append(f'MIN({col})::text AS "c{i}_min"')
+            select.append(f'MAX({col})::text AS "c{i}_max"')
+        if kind in ("text", "other"):
+            length = f"octet_length({col})" if data_type == "bytea" else f"length({col}::text)"
+            select.append(f'MIN({length}) AS "c{i}_min_len"')
+            select.append(f'AVG({length})::float8 AS "c{i}_avg_len"')
+            select.append(f'MAX({length}) AS "c{i}_max_len"')
+        if exact_distinct:
+            # json and xml have no equality operator, so compare their text form
+            value = f"{col}::text" if data_type in ("json", "xml") else col
+            select.append(f'COUNT(DISTINCT {value}) AS "c{i}_distinct"')
+    return f'SELECT {", ".join(select)} FROM "{schema}"."{table}"'
+
+
+def _n_distinct(conn, schema: str, table: str) -> Dict[str, float]:
+    with conn.cursor() as cur:
+        cur.execute(_N_DISTINCT_SQL, {"schema": schema, "table": table})
+        return {name: value for name, value in cur.fetchall() if value is not None}
+
+
+def profile_table(
+    conn,
+    schema: str,
+    table: str,
+    columns: Sequence[Tuple[str, str]],
+    exact_distinct: bool = False,
+) -> pd.DataFrame:
+    """Per-column profile of the full table, one row per column, with a basis per statistic"""
+    with conn.cursor() as cur:
+        cur.execute(profile_sql(schema, table, columns, exact_distinct))
+        names = [d[0] for d in cur.description]
+        result = dict(zip(names, cur.fetchone()))
+    estimates = {} if exact_distinct else _n_distinct(conn, schema, table)
+    conn.rollback()
+
+    rows = int(result["rows"])
+    records: List[Dict[str, object]] = []
+    for i, (name, data_type) in enumerate(columns):
+        non_null = int(result[f"c{i}_non_null"])
+        record = {
+            "column": name,
+            "data_type": data_type,
+            "nulls": rows - non_null,
+            "null_rate": (rows - non_null) / rows if rows else 0.0,
+            "distinct": None,
+            "min": result.get(f"c{i}_min"),
+            "max": result.get(f"c{i}_max"),
+            "min_len": result.get(f"c{i}_min_len"),
+            "avg_len": result.get(f"c{i}_avg_len"),
+            "max_len": result.get(f"c{i}_max_len"),
+            "nulls_basis": "exact",
+            "distinct_basis": None,
+            "range_basis": "exact" if f"c{i}_min" in result or f"c{i}_min_len" in result else None,
+        }
+        if exact_distinct:
+            record["distinct"], record["distinct_basis"] = int(result[f"c{i}_distinct"]), "exact"
+        elif name in estimates:
+            # Negative n_distinct is a fraction of the rows; it excludes nulls either way
+            estimate = estimates[name]
+            distinct = estimate if estimate >= 0 else -estimate * non_null
+            record["distinct"], record["distinct_basis"] = int(round(min(distinct, non_null))), "approximate"
+        records.append(record)
+    profile = pd.DataFrame(records)
+    profile.attrs["rows"] = rows
+    return profile
+
+
+def fill_sampled(profile: pd.DataFrame, sample: pd.DataFrame) -> pd.DataFrame:
+    """Fill distinct counts the statistics lack (never analysed) from ``sample``, marked as sampled"""
+    profile = profile.copy()
+    missing = profile["distinct"].isna() & profile["column"].isin(sample.columns)
+    for idx in profile.index[missing]:
+        column = profile.at[idx, "column"]
+        profile.at[idx, "distinct"] = int(sample[column].astype(str).where(sample[column].notna()).nunique())
+        profile.at[idx, "distinct_basis"] = "sampled"
+    return profile
+
+
+def profile_sources(profile: pd.DataFrame) -> Optional[str]:
+    """One-line legend of how the statistics in ``profile`` were obtained"""
+    if profile.empty:
+        return None
+    bases = profile["distinct_basis"].dropna().value_counts()
+    distinct = ", ".join(f"{count} {basis}" for basis, count in bases.items()) or "not available"
+    return (f"Nulls, min/max and lengths: exact over all {profile.attrs.get('rows', 0):,} rows. "
+            f"Distinct counts: {distinct} (approximate = pg_stats, sampled = EDA sample).")
@@ -0,0 +1,264 @@
+"""Hourly rollup tables behind the trend charts.
+
+Trend views used to group every raw ``chat_feedback`` / ``otps`` row on
+each render. :class:`RollupManager` keeps one small table per source with
+an hourly ``bucket`` and additive measures (counts and sums, so averages
+and coarser grains are derived exactly), created on the primary and
+refreshed incrementally in the background: each pass recomputes only the
+buckets from the newest one minus the re-check window, so refresh cost
+follows new data and reading a trend costs O(hours in range) instead of
+O(rows).
+
+The re-check window catches late updates to recent rows only. Deleted
+rows and rows that arrive with an older ``created_at`` are picked up by a
+full rebuild, which runs when the source's ``n_tup_del`` counter moves and
+otherwise every ``ROLLUP_REBUILD_INTERVAL`` seconds.
+
+Building rollups means DDL and writes on the primary, so it is opt-in:
+unless ``ROLLUPS_ENABLED`` is set, managers never start and charts keep
+using the raw aggregates.
+
+The ``*_trend`` builders return :class:`utils.aggregate.Aggregate` specs
+over the rollups, so charts read them through the usual aggregate path.
+"""
+
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.aggregate import Aggregate
+from utils.db import ConnectionPool
+from utils.incremental import DEFAULT_RECHECK_WINDOW
+
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "false").strip().lower() in ("1", "true", "yes", "on")
+DEFAULT_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "300"))
+DEFAULT_REBUILD_INTERVAL = float(os.getenv("ROLLUP_REBUILD_INTERVAL", "86400"))
+# The first build scans the whole source table, so it gets its own timeout
+DEFAULT_BUILD_TIMEOUT = os.getenv("ROLLUP_BUILD_TIMEOUT", "30min")
+STATE_TABLE = "dash_rollup_state"
+
+
+class Rollup:
+    """Hourly pre-aggregate of ``source``: ``bucket`` plus additive ``measures``"""
+
+    def __init__(self, name: str, source: str, measures: Sequence[Tuple[str, str]], ts_col: str = "created_at"):
+        self.name = name
+        self.source = source
+        self.measures = tuple(measures)
+        self.ts_col = ts_col
+
+    def select_sql(self, schema: str, incremental: bool) -> str:
+        cols = ", ".join(f'{expr} AS "{alias}"' for alias, expr in self.measures)
+        where = f'"{self.ts_col}" IS NOT NULL'
+        if incremental:
+            where += f' AND "{self.ts_col}" >= %(since)s'
+        return (f'SELECT date_trunc(\'hour\', "{self.ts_col}") AS bucket, {cols} '
+                f'FROM "{schema}"."{self.source}" WHERE {where} GROUP BY 1')
+
+    def __repr__(self) -> str:
+        return f"Rollup({self.name!r} from {self.source!r})"
+
+
+FEEDBACK_HOURLY = Rollup("dash_feedback_hourly", "chat_feedback", [
+    ("feedback_count", "COUNT(*)"),
+    ("rating_count", 'COUNT("rating")'),
+    ("rating_sum", 'COALESCE(SUM("rating"), 0)'),
+    ("positive_count", 'COUNT(*) FILTER (WHERE "rating" >= 4)'),
+    ("negative_count", 'COUNT(*) FILTER (WHERE "rating" <= 2)'),
+])
+OTP_HOURLY = Rollup("dash_otp_hourly", "otps", [
+    ("otp_count", "COUNT(*)"),
+    ("used_count", 'COUNT(*) FILTER (WHERE "is_used")'),
+    ("unused_count", 'COUNT(*) FILTER (WHERE NOT "is_used")'),
+])
+ROLLUPS: List[Rollup] = [FEEDBACK_HOURLY, OTP_HOURLY]
+
+
+class RollupManager:
+    """Creates and incrementally refreshes the rollup tables on one database"""
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        schema: str = "public",
+        rollups: Sequence[Rollup] = ROLLUPS,
+        refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+        recheck_window: timedelta = DEFAULT_RECHECK_WINDOW,
+        rebuild_interval: float = DEFAULT_REBUILD_INTERVAL,
+        enabled: bool = ROLLUPS_ENABLED,
+    ):
+        self.pool = pool
+        self.schema = schema
+        self.rollups = list(rollups)
+        self.refresh_interval = refresh_interval
+        self.recheck_window = recheck_window
+        self.rebuild_interval = rebuild_interval
+        self.enabled = enabled
+        self.ready = False
+        self.last_error: Optional[str] = None
+        self.last_refresh: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_tables(self, cur):
+        cur.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.schema}"."{STATE_TABLE}" ('
+            "name text PRIMARY KEY, refreshed_at timestamptz NOT NULL, rows_written bigint NOT NULL)"
+        )
+        # Added after the table first shipped
+        cur.execute(f'ALTER TABLE "{self.schema}"."{STATE_TABLE}" '
+                    "ADD COLUMN IF NOT EXISTS source_deletes bigint, ADD COLUMN IF NOT EXISTS rebuilt_at timestamptz")
+        for rollup in self.rollups:
+            cur.execute("SELECT to_regclass(%s)", (f'"{self.schema}"."{rollup.name}"',))
+            if cur.fetchone()[0] is None:
+                # Shaped by the query itself, so bucket takes the source column's type
+                cur.execute(f'CREATE TABLE "{self.schema}"."{rollup.name}" AS '
+                            f"{rollup.select_sql(self.schema, False)} WITH NO DATA")
+                cur.execute(f'ALTER TABLE "{self.schema}"."{rollup.name}" ADD PRIMARY KEY (bucket)')
+
+    def _refresh_one(self, cur, rollup: Rollup, force: bool) -> dict:
+        started = time.monotonic()
+        table = f'"{self.schema}"."{rollup.name}"'
+        # Another process may be refreshing the same rollup; let it finish
+        cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s))", (f"{self.schema}.{rollup.name}",))
+        if not cur.fetchone()[0]:
+            return {"mode": "skipped (locked)"}
+        # Hour buckets are UTC hours, matching the UTC date bounds the charts filter on
+        cur.execute("SET LOCAL TimeZone = 'UTC'")
+        cur.execute(
+            "SELECT n_tup_del FROM pg_stat_user_tables WHERE schemaname = %s AND relname = %s",
+            (self.schema, rollup.source),
+        )
+        row = cur.fetchone()
+        deletes = row[0] if row else None
+        cur.execute(
+            f'SELECT source_deletes, rebuilt_at IS NULL OR rebuilt_at < now() - %s * interval \'1 second\' '
+            f'FROM "{self.schema}"."{STATE_TABLE}" WHERE name = %s',
+            (self.rebuild_interval, rollup.name),
+        )
+        state = cur.fetchone()
+        cur.execute(f"SELECT max(bucket) FROM {table}")
+        newest = cur.fetchone()[0]
+        if force or newest is None:
+            reason = "full"
+        elif state is None or state[0] != deletes:
+            reason = "full (source rows deleted)"  # deletes cannot be seen from the recent buckets
+        elif state[1]:
+            reason = "full (scheduled)"  # late-arriving rows older than the re-check window
+        else:
+            reason = None
+        if reason:
+            cur.execute("SET LOCAL statement_timeout = %s", (DEFAULT_BUILD_TIMEOUT,))
+            cur.execute(f"DELETE FROM {table}")
+            params, mode = None, reason
+        else:
+            # Recompute whole hours from the start of the re-check window
+            since = newest - self.recheck_window
+            since = since.replace(minute=0, second=0, microsecond=0)
+            cur.execute(f"DELETE FROM {table} WHERE bucket >= %(since)s", {"since": since})
+            params, mode = {"since": since}, "incremental"
+        columns = ", ".join(["bucket"] + [f'"{alias}"' for alias, _ in rollup.measures])
+        cur.execute(f"INSERT INTO {table} ({columns}) {rollup.select_sql(self.schema, params is not None)}", params)
+        written = cur.rowcount
+        cur.execute(
+            f'INSERT INTO "{self.schema}"."{STATE_TABLE}" AS s (name, refreshed_at, rows_written, source_deletes, rebuilt_at) '
+            "VALUES (%s, now(), %s, %s, CASE WHEN %s THEN now() END) "
+            "ON CONFLICT (name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at, rows_written = EXCLUDED.rows_written, "
+            "source_deletes = EXCLUDED.source_deletes, rebuilt_at = COALESCE(EXCLUDED.rebuilt_at, s.rebuilt_at)",
+            (rollup.name, written, deletes, params is None),
+        )
+        return {"mode": mode, "buckets_written": written, "seconds": round(time.monotonic() - started, 3)}
+
+    def refresh(self, force: bool = False) -> Dict[str, dict]:
+        """Bring every rollup up to date; ``force`` rebuilds from scratch"""
+        if not self.enabled:
+            raise RuntimeError("Rollups are disabled; set ROLLUPS_ENABLED=true to build them")
+        with self._lock:
+            results = {}
+            try:
+                with self.pool.connection() as conn:
+                    with conn.cursor() as cur:
+                        self._ensure_tables(cur)
+                    conn.commit()
+                    for rollup in self.rollups:
+                        with conn.cursor() as cur:
+                            results[rollup.name] = self._refresh_one(cur, rollup, force)
+                        conn.commit()
+            except Exception as e:
+                self.last_error = str(e).strip()
+                raise
+            self.ready = True
+            self.last_error = None
+            self.last_refresh = results
+            return results
+
+    def start(self):
+        """Refresh now and then every ``refresh_interval`` seconds in a daemon thread (if enabled)"""
+        with self._lock:
+            if self._thread is not None or not self.enabled:
+                return
+            self._thread = threading.Thread(target=self._run, name="rollup-refresh", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                pass  # kept in last_error; charts fall back to raw aggregates
+            time.sleep(self.refresh_interval)
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "refresh_interval_s": self.refresh_interval,
+            "last_refresh": self.last_refresh,
+            "last_error": self.last_error,
+        }
+
+
+_managers: Dict[Tuple, RollupManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_rollups(pool: ConnectionPool, schema: str = "public", rollups: Sequence[Rollup] = ROLLUPS) -> RollupManager:
+    """Process-wide rollup manager for a primary pool, with its refresh thread running if ``ROLLUPS_ENABLED``"""
+    key = (pool, schema, tuple(r.name for r in rollups))
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = RollupManager(pool, schema, rollups)
+    manager.start()
+    return manager
+
+
+def feedback_trend(freq: str = "day") -> Aggregate:
+    """Feedback count, average rating and positive/negative counts per ``date_trunc(freq)``"""
+    return Aggregate(
+        FEEDBACK_HOURLY.name,
+        [("bucket", f"date_trunc('{freq}', bucket)")],
+        [
+            ("count", "SUM(feedback_count)::bigint"),
+            ("avg_rating", "(SUM(rating_sum)::float8 / NULLIF(SUM(rating_count), 0))"),
+            ("positive_count", "SUM(positive_count)::bigint"),
+            ("negative_count", "SUM(negative_count)::bigint"),
+        ],
+        ts_col="bucket",
+    )
+
+
+def otp_trend(freq: str = "day") -> Aggregate:
+    """Generated vs used OTPs per ``date_trunc(freq)``; same columns as ``otp_daily_usage``"""
+    return Aggregate(
+        OTP_HOURLY.name,
+        [("date", f"date_trunc('{freq}', bucket)")],
+        [
+            ("used_count", "SUM(used_count)::bigint"),
+            ("total_count", "SUM(otp_count)::bigint"),
+            ("usage_rate", "(SUM(used_count)::float8 / NULLIF(SUM(otp_count), 0))"),
+        ],
+        ts_col="bucket",
+    )
@@ -0,0 +1,254 @@
+"""Route read-only dashboard queries to streaming replicas.
+
+The dashboards only read, yet every query used to land on the primary the
+chatbot writes to. :class:`ReplicaRouter` hands out connections from a set
+of replica pools in round-robin order, skipping replicas that are down or
+whose replay lag exceeds a limit, and falls back to the primary when no
+replica qualifies. It exposes the same ``acquire``/``connection``/``stats``
+surface as :class:`utils.db.ConnectionPool`, so it can stand in for a pool
+wherever only reads happen.
+
+Replicas are configured with ``DB_REPLICA_HOSTS``: a comma-separated list
+of ``host[:port]`` entries (credentials and database taken from the
+primary) or full ``postgresql://`` URLs.
+"""
+
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import psycopg2
+
+from utils.db import ConnectionPool, PoolTimeout, PooledConnection, _pool_key, connect_kwargs_from_url, get_pool
+
+DEFAULT_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "30"))
+DEFAULT_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "15"))
+DEFAULT_RETRY_AFTER = float(os.getenv("DB_REPLICA_RETRY_AFTER", "60"))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.getenv("DB_REPLICA_ACQUIRE_TIMEOUT", "0"))
+
+# Whether WAL is streaming in, and seconds of replay lag: 0 on a primary or
+# when everything received is replayed (an idle primary otherwise makes
+# pg_last_xact_replay_timestamp look stale). Received = replayed says nothing
+# once the WAL receiver is gone, so a standby without a streaming receiver
+# is reported as not streaming. Without pg_read_all_stats the status column
+# reads NULL; the receiver's row still shows it is running.
+_LAG_SQL = """
+    SELECT
+        NOT pg_is_in_recovery()
+            OR EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming'),
+        CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END::float8
+"""
+
+
+def replica_configs_from_env(primary: Dict[str, object], value: Optional[str] = None) -> List[Dict[str, object]]:
+    """Connection kwargs for each ``DB_REPLICA_HOSTS`` entry"""
+    value = os.getenv("DB_REPLICA_HOSTS", "") if value is None else value
+    replicas = []
+    for entry in (e.strip() for e in value.split(",")):
+        if not entry:
+            continue
+        if "://" in entry:
+            replicas.append(connect_kwargs_from_url(entry))
+            continue
+        host, _, port = entry.partition(":")
+        config = dict(primary, host=host)
+        if port:
+            config["port"] = int(port)
+        replicas.append(config)
+    return replicas
+
+
+class _Replica:
+    """Health and lag bookkeeping for one replica pool"""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.lag: Optional[float] = None
+        self.streaming = True
+        self.checked = 0.0
+        self.down_until = 0.0
+        self.error: Optional[str] = None
+        self.checkouts = 0
+
+
+class ReplicaRouter:
+    """Pool-like source of read-only connections spread across replicas"""
+
+    def __init__(
+        self,
+        primary: Dict[str, object],
+        replicas: Sequence[Dict[str, object]] = (),
+        max_lag: float = DEFAULT_MAX_LAG,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+        retry_after: float = DEFAULT_RETRY_AFTER,
+        acquire_timeout: float = DEFAULT_ACQUIRE_TIMEOUT,
+        **pool_options,
+    ):
+        self.primary = get_pool(primary, **pool_options)
+        self.replicas = [_Replica(get_pool(r, **pool_options)) for r in replicas]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.acquire_timeout = acquire_timeout
+        self._rotation = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {"replica_checkouts": 0, "primary_checkouts": 0, "failovers": 0, "lag_exclusions": 0}
+
+    def _candidates(self) -> List[_Replica]:
+        """Usable replicas, rotated so consecutive checkouts spread across them"""
+        if not self.replicas:
+            return []
+        now = time.monotonic()
+        start = next(self._rotation) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        usable = []
+        for replica in ordered:
+            if replica.down_until > now:
+                continue
+            if not self._current(replica) and now - replica.checked < self.check_interval:
+                continue
+            usable.append(replica)
+        return usable
+
+    def _current(self, replica: _Replica) -> bool:
+        """Whether the last reading had the replica streaming and within ``max_lag``"""
+        return replica.streaming and (replica.lag is None or replica.lag <= self.max_lag)
+
+    def _mark_down(self, replica: _Replica, error: Exception):
+        with self._lock:
+            replica.down_until = time.monotonic() + self.retry_after
+            replica.error = str(error).strip()
+            self._stats["failovers"] += 1
+
+    def _within_lag(self, replica: _Replica, conn: PooledConnection) -> bool:
+        """Re-measure replay lag on ``conn`` when the last reading is stale"""
+        if time.monotonic() - replica.checked < self.check_interval:
+            return self._current(replica)
+        with conn.cursor() as cur:
+            cur.execute(_LAG_SQL)
+            streaming, lag = cur.fetchone()
+        conn.rollback()
+        with self._lock:
+            replica.streaming = bool(streaming)
+            replica.lag = float(lag)
+            replica.checked = time.monotonic()
+            replica.error = None if replica.streaming else "WAL receiver is not streaming"
+            current = self._current(replica)
+            if not current:
+                self._stats["lag_exclusions"] += 1
+        return current
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Connection from the next healthy replica, else from the primary
+
+        Replica pools are only waited on for ``acquire_timeout`` (by default
+        not at all), so a saturated replica passes the checkout on instead of
+        holding it for the full pool timeout; ``timeout`` applies to the primary.
+        """
+        for replica in self._candidates():
+            try:
+                conn = replica.pool.acquire(self.acquire_timeout)
+            except PoolTimeout:
+                continue  # busy, not broken: try the next one
+            except psycopg2.OperationalError as e:
+                self._mark_down(replica, e)
+                continue
+            try:
+                usable = self._within_lag(replica, conn)
+            except psycopg2.Error as e:
+                conn.close()
+                self._mark_down(replica, e)
+                continue
+            if not usable:
+                conn.close()
+                continue
+            with self._lock:
+                replica.checkouts += 1
+                self._stats["replica_checkouts"] += 1
+            return conn
+        conn = self.primary.acquire(timeout)
+        with self._lock:
+            self._stats["primary_checkouts"] += 1
+        return conn
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[PooledConnection]:
+        """Context manager counterpart of :meth:`acquire`"""
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            if conn._pool is not None:
+                conn.close()
+
+    def pick(self) -> ConnectionPool:
+        """The pool the next read would use, for callers that must stay on one server"""
+        candidates = [r for r in self._candidates() if self._current(r)]
+        return candidates[0].pool if candidates else self.primary
+
+    def closeall(self):
+        self.primary.closeall()
+        for replica in self.replicas:
+            replica.pool.closeall()
+
+    def stats(self) -> Dict[str, object]:
+        """Routing counters plus per-server pool usage and replica lag"""
+        now = time.monotonic()
+        with self._lock:
+            snapshot: Dict[str, object] = dict(self._stats)
+            servers = []
+            for replica in self.replicas:
+                if replica.down_until > now:
+                    status = "down"
+                elif not replica.streaming:
+                    status = "disconnected"
+                else:
+                    status = "lagging" if replica.lag is not None and replica.lag > self.max_lag else "ok"
+                servers.append({
+                    "host": replica.pool.connect_kwargs.get("host"),
+                    "status": status,
+                    "lag_s": replica.lag,
+                    "checkouts": replica.checkouts,
+                    "error": replica.error,
+                })
+        snapshot["max_lag_s"] = self.max_lag
+        snapshot["replicas"] = servers
+        snapshot["primary"] = self.primary.stats()
+        return snapshot
+
+
+_routers: Dict[tuple, ReplicaRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_router(primary: Dict[str, object], replicas: Optional[Sequence[Dict[str, object]]] = None,
+               **options) -> ReplicaRouter:
+    """Process-wide router for a primary; replicas default to ``DB_REPLICA_HOSTS``"""
+    if replicas is None:
+        replicas = replica_configs_from_env(primary)
+    key = (_pool_key(primary),) + tuple(_pool_key(r) for r in replicas)
+    with _routers_lock:
+        router = _routers.get(key)
+        if router is None:
+            router = _routers[key] = ReplicaRouter(primary, replicas, **options)
+        return router
+
+
+def create_routed_engine(conn_url: str, replicas: Optional[Sequence[Dict[str, object]]] = None):
+    """Read-only SQLAlchemy engine drawing connections from :func:`get_router`.
+
+    Like :func:`utils.db.create_pooled_engine`, but each checkout may come
+    from a replica; use it only for code that never writes.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+
+    router = get_router(connect_kwargs_from_url(conn_url), replicas)
+    return create_engine(conn_url, creator=router.acquire, poolclass=NullPool)
@@ -0,0 +1,73 @@
+"""Representative row samples for table EDA.
+
+``ORDER BY 1 DESC LIMIT n`` sorts the whole table and only ever shows the
+newest rows. :func:`plan_sample` picks a query whose cost follows the
+sample size instead:
+
+- ``system``: ``TABLESAMPLE SYSTEM`` reads a random subset of pages. It is
+  the cheapest option, but rows sharing a page come together, so clustered
+  data is less evenly covered.
+- ``bernoulli``: ``TABLESAMPLE BERNOULLI`` keeps each row independently.
+  Every page is read but nothing is sorted, and the sample is unbiased.
+- ``reservoir``: streams the table through a server-side cursor into
+  :func:`utils.eda.reservoir_sample_chunked`. It is exact and uniform even
+  without table statistics, at the price of one full pass.
+- ``latest``: the previous newest-rows behaviour.
+
+The TABLESAMPLE variants ask for slightly more than ``n`` rows, based on
+the row estimate, and trim the excess in a seeded random order. With
+``REPEATABLE`` the same seed always gives the same sample.
+"""
+
+from typing import Dict, Optional, Tuple
+
+SAMPLING_METHODS: Dict[str, str] = {
+    "system": "TABLESAMPLE SYSTEM (random pages, fastest)",
+    "bernoulli": "TABLESAMPLE BERNOULLI (random rows, unbiased)",
+    "reservoir": "Reservoir over a streamed cursor (exact uniform, full pass)",
+    "latest": "Most recent rows (ORDER BY 1 DESC)",
+}
+# Requested percentage is padded so the sample rarely falls short of n
+OVERSAMPLE = 1.25
+
+
+def sample_percent(n: int, estimated_rows: int) -> float:
+    """TABLESAMPLE percentage expected to return a little over ``n`` rows"""
+    return min(100.0, 100.0 * n * OVERSAMPLE / max(estimated_rows, 1))
+
+
+def plan_sample(
+    schema: str,
+    table: str,
+    method: str,
+    n: int,
+    estimated_rows: Optional[int],
+    seed: int = 0,
+    exact: bool = False,
+) -> Tuple[str, str, str]:
+    """(effective method, SQL, caption text) for an ``n``-row sample of ``schema.table``.
+
+    A table is read whole only when ``exact`` says ``estimated_rows`` is a
+    real count that fits in the sample; planner estimates can be stale.
+    Without a usable row estimate a TABLESAMPLE percentage cannot be chosen,
+    so those methods fall back to ``reservoir``. The SQL for ``reservoir``
+    is the full scan to stream.
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling method: {method}")
+    n, seed = int(n), int(seed)
+    source = f'"{schema}"."{table}"'
+    if method == "latest":
+        return method, f"SELECT * FROM {source} ORDER BY 1 DESC LIMIT {n}", f"the {n:,} most recent rows (ORDER BY 1 DESC)"
+    if exact and estimated_rows is not None and estimated_rows <= n:
+        return "full", f"SELECT * FROM {source} LIMIT {n}", f"the whole table ({estimated_rows:,} rows fit in the sample)"
+    if method == "reservoir" or not estimated_rows:
+        # A zero estimate is typical of a table not analysed since it was filled
+        why = "" if method == "reservoir" else ", as the table has no row estimate for TABLESAMPLE"
+        return ("reservoir", f"SELECT * FROM {source}",
+                f"reservoir sampling over a streamed full scan (seed {seed}{why})")
+    kind = method.upper()
+    percent = sample_percent(n, estimated_rows)
+    sql = (f"SELECT * FROM {source} TABLESAMPLE {kind} ({percent:.6f}) REPEATABLE ({seed}) "
+           f"ORDER BY md5(ctid::text || '{seed}') LIMIT {n}")
+    return method, sql, f"TABLESAMPLE {kind} ({percent:.4g}%) REPEATABLE ({seed})"